@@ -93,6 +93,38 @@ class ACSEServiceProvider(object):
         bool
             True if the Association was accepted, False if rejected or aborted
         """
+        assoc_rq = self._build_associate_rq(local_ae, peer_ae, max_pdu_size, 
+                                            pcdl, userspdu)
+
+        # Send the A-ASSOCIATE request primitive to the peer via the 
+        #   DICOM UL service
+        logger.info("Requesting Association")
+        self.DUL.Send(assoc_rq)
+
+
+        ## Receive the response from the peer
+        #   This may be an A-ASSOCIATE confirmation primitive or an
+        #   A-ABORT or A-P-ABORT request primitive
+        #
+        if self.acse_timeout == 0:
+            # No timeout
+            assoc_rsp = self.DUL.Receive(True, None)
+        else:
+            assoc_rsp = self.DUL.Receive(True, self.acse_timeout)
+
+        return self._check_associate_rsp(assoc_rsp, pcdl)
+
+    def _build_associate_rq(self, local_ae, peer_ae, max_pdu_size, pcdl, 
+                                                                userspdu=None):
+        """
+        Build the A-ASSOCIATE request primitive for Request(), see Request()
+        for the parameters
+
+        Returns
+        -------
+        pynetdicom3.primitives.A_ASSOCIATE
+            The A-ASSOCIATE request primitive
+        """
         self.LocalAE = local_ae
         self.RemoteAE = peer_ae
         
@@ -146,24 +178,27 @@ class ACSEServiceProvider(object):
         assoc_rq.presentation_context_definition_list = pcdl
         #
         ## A-ASSOCIATE request primitive is now complete
+        
+        return assoc_rq
 
-
-        # Send the A-ASSOCIATE request primitive to the peer via the 
-        #   DICOM UL service
-        logger.info("Requesting Association")
-        self.DUL.Send(assoc_rq)
-
-
-        ## Receive the response from the peer
-        #   This may be an A-ASSOCIATE confirmation primitive or an
-        #   A-ABORT or A-P-ABORT request primitive
-        #
-        if self.acse_timeout == 0:
-            # No timeout
-            assoc_rsp = self.DUL.Receive(True, None)
-        else:
-            assoc_rsp = self.DUL.Receive(True, self.acse_timeout)
-
+    def _check_associate_rsp(self, assoc_rsp, pcdl):
+        """
+        Process the peer's response to an A-ASSOCIATE request
+        
+        Parameters
+        ----------
+        assoc_rsp - pynetdicom3.primitives.A_ASSOCIATE, A_ABORT, A_P_ABORT or
+        None
+            The response received from the DUL, None if there was no response
+        pcdl - list of pynetdicom3.utils.PresentationContext
+            The proposed Presentation Contexts for the association
+        
+        Returns
+        -------
+        bool, primitive
+            True if the Association was accepted, False if rejected or aborted, 
+            and the response
+        """
         # Association accepted or rejected
         if isinstance(assoc_rsp, A_ASSOCIATE):
             # Accepted
@@ -359,7 +394,10 @@ class ACSEServiceProvider(object):
             raise ValueError("ACSE.Abort() invalid source '%s'" %source)
 
         self.DUL.Send(assoc_abort)
-        time.sleep(0.5)
+        
+        # An engine loop only sends the A-ABORT once we return to it
+        if self.DUL.engine is None:
+            time.sleep(0.5)
 
     def CheckRelease(self):
         """Checks for release request from the remote AE. Upon reception of
@@ -2,19 +2,17 @@
 from io import BytesIO
 import itertools
 import logging
-from struct import pack, unpack
+from struct import pack, unpack, Struct
 
 from pydicom.dataset import Dataset
 from pydicom.tag import Tag
 from pydicom._dicom_dict import DicomDictionary as dcm_dict
 from pydicom.uid import ImplicitVRLittleEndian
-# Temporary fix while waiting for pydicom upstream
-from pydicom.datadict import dictionary_has_tag, dictionary_keyword
 
 from pynetdicom3.DIMSEparameters import *
 from pynetdicom3.dsutils import encode_element, encode, decode
 from pynetdicom3.primitives import P_DATA
-from pynetdicom3.utils import fragment
+from pynetdicom3.utils import fragment, fragment_file
 
 logger = logging.getLogger('pynetdicom.dimse')
 
@@ -77,6 +75,177 @@ command_set_elem = {'C-ECHO-RQ'   : [0x00000000,  # CommandGroupLength
                     'N-DELETE-RSP' : [0x00000000, 0x00000002, 0x00000100, 0x00000120, 0x00000800, 0x00000900, 0x00001000]}
 
 
+# The primitive used by each DIMSE service, C-CANCEL-RQ is converted to a
+#   C-FIND primitive as there's no way to tell which service it cancels
+message_primitive = {'C-ECHO' : C_ECHO_ServiceParameters,
+                     'C-STORE' : C_STORE_ServiceParameters,
+                     'C-FIND' : C_FIND_ServiceParameters,
+                     'C-CANCEL' : C_FIND_ServiceParameters,
+                     'C-GET' : C_GET_ServiceParameters,
+                     'C-MOVE' : C_MOVE_ServiceParameters,
+                     'N-EVENT-REPORT' : N_EVENT_REPORT_ServiceParameters,
+                     'N-GET' : N_GET_ServiceParameters,
+                     'N-SET' : N_SET_ServiceParameters,
+                     'N-ACTION' : N_ACTION_ServiceParameters,
+                     'N-CREATE' : N_CREATE_ServiceParameters,
+                     'N-DELETE' : N_DELETE_ServiceParameters}
+
+# The primitive parameter that holds the Data Set for each message type that
+#   can have one
+message_data_set = {'C-STORE-RQ' : 'DataSet',
+                    'C-FIND-RQ' : 'Identifier', 'C-FIND-RSP' : 'Identifier',
+                    'C-GET-RQ' : 'Identifier', 'C-GET-RSP' : 'Identifier',
+                    'C-MOVE-RQ' : 'Identifier', 'C-MOVE-RSP' : 'Identifier',
+                    'N-EVENT-REPORT-RQ' : 'EventInformation',
+                    'N-EVENT-REPORT-RSP' : 'EventReply',
+                    'N-GET-RSP' : 'AttributeList',
+                    'N-SET-RQ' : 'ModificationList',
+                    'N-SET-RSP' : 'AttributeList',
+                    'N-ACTION-RQ' : 'ActionInformation',
+                    'N-ACTION-RSP' : 'ActionReply',
+                    'N-CREATE-RQ' : 'AttributeList',
+                    'N-CREATE-RSP' : 'AttributeList'}
+
+# The VR of each Command Set element, used by the Command Set codec. The 
+#   Status detail elements (PS3.7 Annex C) aren't in any of the message
+#   templates but may be present in a received -RSP
+command_set_vr = {}
+for _tags in list(command_set_elem.values()) + [[0x00000901,   # OffendingElement
+                                                 0x00000902,   # ErrorComment
+                                                 0x00000903]]: # ErrorID
+    for _tag in _tags:
+        command_set_vr[_tag] = dcm_dict[_tag][0]
+
+# Implicit VR Little Endian element header: group, element, value length
+_ELEMENT_HEADER = Struct('<HHI')
+_US = Struct('<H')
+_UL = Struct('<I')
+_AT = Struct('<HH')
+
+def _encode_str(value, padding):
+    """ Encode a text value, padded to an even length with `padding` """
+    if value is None:
+        return b''
+    
+    if isinstance(value, str):
+        value = value.encode('ascii')
+    
+    if len(value) % 2:
+        value += padding
+    
+    return value
+
+def _encode_at(value):
+    """ Encode one or more tags """
+    if value is None:
+        return b''
+    
+    if isinstance(value, int):
+        value = [value]
+    
+    return b''.join([_AT.pack(tag >> 16, tag & 0xFFFF) for tag in value])
+
+def _decode_at(value):
+    """ Decode one or more tags """
+    tags = [Tag(group, elem) for group, elem in _AT.iter_unpack(value)]
+    if len(tags) == 1:
+        return tags[0]
+    
+    return tags
+
+_ENCODERS = {'US' : lambda value: b'' if value is None else _US.pack(value),
+             'UL' : lambda value: b'' if value is None else _UL.pack(value),
+             'UI' : lambda value: _encode_str(value, b'\x00'),
+             'AE' : lambda value: _encode_str(value, b' '),
+             'LO' : lambda value: _encode_str(value, b' '),
+             'AT' : _encode_at}
+
+_DECODERS = {'US' : lambda value: _US.unpack(value)[0] if value else None,
+             'UL' : lambda value: _UL.unpack(value)[0] if value else None,
+             'UI' : lambda value: value.decode('ascii').rstrip('\x00 '),
+             'AE' : lambda value: value.decode('ascii').strip(),
+             'LO' : lambda value: value.decode('ascii').strip(),
+             'AT' : _decode_at}
+
+def encode_command_set(command_set):
+    """
+    Encode a Command Set as Implicit VR Little Endian without going through
+    pydicom's write_dataset()
+    
+    The (0000,0000) CommandGroupLength element is always written with the
+    correct value, whatever its current value in `command_set`. Elements 
+    with a VR the codec doesn't handle are encoded by pydicom
+    
+    Parameters
+    ----------
+    command_set : pydicom.dataset.Dataset
+        The Command Set to encode
+    
+    Returns
+    -------
+    bytes
+        The encoded Command Set
+    """
+    encoded = []
+    for elem in command_set:
+        if elem.tag == 0x00000000:
+            continue
+        
+        try:
+            value = _ENCODERS[elem.VR](elem.value)
+        except KeyError:
+            encoded.append(encode_element(elem, True, True))
+            continue
+        
+        encoded.append(_ELEMENT_HEADER.pack(0x0000, elem.tag & 0xFFFF, 
+                                            len(value)))
+        encoded.append(value)
+    
+    encoded = b''.join(encoded)
+    
+    # (0000,0000) CommandGroupLength, UL
+    return _ELEMENT_HEADER.pack(0x0000, 0x0000, 4) + \
+           _UL.pack(len(encoded)) + encoded
+
+def decode_command_set(b):
+    """
+    Decode an Implicit VR Little Endian encoded Command Set without going
+    through pydicom's read_dataset()
+    
+    If the Command Set contains any elements the codec doesn't know about
+    then it's decoded by pydicom instead
+    
+    Parameters
+    ----------
+    b : bytes
+        The encoded Command Set
+    
+    Returns
+    -------
+    pydicom.dataset.Dataset
+        The decoded Command Set
+    """
+    command_set = Dataset()
+    
+    offset = 0
+    length = len(b)
+    while offset < length:
+        group, elem, value_length = _ELEMENT_HEADER.unpack_from(b, offset)
+        offset += 8
+        
+        tag = group << 16 | elem
+        try:
+            vr = command_set_vr[tag]
+            value = _DECODERS[vr](b[offset:offset + value_length])
+        except KeyError:
+            return decode(BytesIO(b), True, True)
+        
+        command_set.add_new(tag, vr, value)
+        offset += value_length
+    
+    return command_set
+
+
 class DIMSEMessage(object):
     """
     Represents a DIMSE *Message*.
@@ -103,8 +272,20 @@ class DIMSEMessage(object):
 
     Attributes
     ----------
+    command_field : int
+        The message's (0000,0100) CommandField value, set on the subclasses
+        by _build_message_classes()
     command_set : pydicom.dataset.Dataset
         The message Command Set information (PS3.7 6.3)
+    data_set_attribute : str or None
+        The name of the primitive parameter holding the Data Set, None if
+        the message type has no Data Set. Set on the subclasses.
+    parameters : tuple of (int, str, str)
+        The (tag, VR, primitive parameter name) of each Command Set element
+        taken from the primitive. Set on the subclasses.
+    primitive_class : class
+        The DIMSE service parameters primitive the message converts to. Set
+        on the subclasses.
     data_set : pydicom.dataset.Dataset
         The message Data Set (PS3.7 6.3)
     encoded_command_set : BytesIO
@@ -118,17 +299,26 @@ class DIMSEMessage(object):
         self.ID = None
         
         # Required to save command set data from multiple fragments
-        # self.command_set is added by _build_message_classes()
         self.encoded_command_set = BytesIO()
+        self.command_set = Dataset()
         self.data_set = BytesIO()
+        
+        # The PDVs following the end of the message in the last P-DATA 
+        #   decoded, which belong to the next message
+        self.remaining_pdvs = []
 
     def Encode(self, context_id, max_pdu):
         """
-        Encode the DIMSE Message as one or more P-DATA service primitives
+        Encode the DIMSE Message as one or more P-DATA service primitives,
+        produced one at a time as they're consumed so that they can be sent
+        as soon as they're ready
         
         PS3.7 6.3.1
         The encoding of the Command Set shall be Little Endian Implicit VR
         
+        If the Data Set is a file object rather than a BytesIO then it's read
+        one fragment at a time, so it never has to be held in memory in full
+        
         Parameters
         ----------
         context_id : int
@@ -137,60 +327,68 @@ class DIMSEMessage(object):
         max_pdu_length : int
             The maximum PDU length in bytes
             
-        Returns
-        -------
-        p_data_list : list of pynetdicom3.primitives.P_DATA
-            A list of one or more P-DATA service primitives
+        Yields
+        ------
+        pdata : pynetdicom3.primitives.P_DATA
+            The next P-DATA service primitive
         """
         self.ID = context_id
-        p_data_list = []
         
         # The Command Set is always Little Endian Implicit VR (PS3.7 6.3.1)
-        #   encode(dataset, is_implicit_VR, is_little_endian)
-        encoded_command_set = encode(self.command_set, True, True)
+        encoded_command_set = encode_command_set(self.command_set)
 
         ## COMMAND SET
         # Split the command set into framents with maximum size max_pdu
-        pdvs = fragment(max_pdu, encoded_command_set)
+        pdvs = list(fragment(max_pdu, encoded_command_set))
         
         # First to (n - 1)th command data fragment - b XXXXXX01
         for ii in pdvs[:-1]:
             pdata = P_DATA()
             pdata.presentation_data_value_list = [[self.ID, pack('b', 1) + ii]]
             
-            p_data_list.append(pdata)
+            yield pdata
         
         # Nth command data fragment - b XXXXXX11
         pdata = P_DATA()
         pdata.presentation_data_value_list = [[self.ID, pack('b', 3) + pdvs[-1]]]
        
-        p_data_list.append(pdata)
+        yield pdata
 
         ## DATASET (if available)
         # Split out dataset up into fragment with maximum size of max_pdu
         #   Check that the Data Set is not empty
         if self.data_set is None:
-            pass
-        elif self.data_set.getvalue() != b'':
+            return
+        elif isinstance(self.data_set, BytesIO):
+            if self.data_set.getbuffer().nbytes == 0:
+                return
+            
             # Technically these are APDUs, not PDVs
             pdvs = fragment(max_pdu, self.data_set)
+        else:
+            pdvs = fragment_file(max_pdu, self.data_set)
 
+        # Hold back each fragment until we know whether or not it's the last
+        previous = None
+        for ii in pdvs:
             # First to (n - 1)th dataset fragment - b XXXXXX00
-            for ii in pdvs[:-1]:
+            if previous is not None:
                 pdata = P_DATA()
-                pdata.presentation_data_value_list = [[self.ID, pack('b', 0) + ii]]
-                p_data_list.append(pdata)
+                pdata.presentation_data_value_list = \
+                                        [[self.ID, pack('b', 0) + previous]]
+                yield pdata
             
-            # Nth dataset fragment - b XXXXXX10
+            previous = ii
+        
+        # Nth dataset fragment - b XXXXXX10
+        if previous is not None:
             pdata = P_DATA()
             pdata.presentation_data_value_list = \
-                                        [[self.ID, pack('b', 2) + pdvs[-1]]]
+                                        [[self.ID, pack('b', 2) + previous]]
             
-            p_data_list.append(pdata)
-
-        return p_data_list
+            yield pdata
 
-    def Decode(self, pdata):
+    def Decode(self, pdata, data_set_sink=None):
         """ Converts a series of P-DATA primitives into data for the DIMSE
         Message
         
@@ -209,6 +407,10 @@ class DIMSEMessage(object):
         ----------
         pdata : pynetdicom3.DULparameters.P_DATA_ServiceParameters
             The P-DATA service primitive to be decoded into a DIMSE message
+        data_set_sink : callable, optional
+            Called with the decoded Command Set once it's complete, if the
+            message has a Data Set. If it returns an object other than None 
+            the Data Set fragments are written to it instead of to a BytesIO
         
         Returns
         -------
@@ -219,9 +421,14 @@ class DIMSEMessage(object):
         if pdata.__class__ != P_DATA or pdata is None:
             return False
         
-        for pdv_item in pdata.presentation_data_value_list:
+        pdvs = pdata.presentation_data_value_list
+        for index, pdv_item in enumerate(pdvs):
             # Presentation Context ID
             self.ID = pdv_item[0]
+            
+            # Slicing the view doesn't copy the fragment, it's only copied
+            #   when written to the command or data set
+            fragment_view = memoryview(pdv_item[1])
 
             # The first byte of the P-DATA is the Message Control Header
             #   See PS3.8 Annex E.2
@@ -241,14 +448,13 @@ class DIMSEMessage(object):
                 #   of fragments and we need to remember the elements
                 #   from previous fragments, hence the encoded_command_set
                 #   class attribute
-                self.encoded_command_set.write(pdv_item[1][1:])
+                self.encoded_command_set.write(fragment_view[1:])
 
                 # The P-DATA fragment is the last one (xxxxxx11)
                 if control_header_byte & 2:
                     # Command Set is always encoded Implicit VR Little Endian
-                    #   decode(dataset, is_implicit_VR, is_little_endian)
-                    self.command_set = decode(self.encoded_command_set, 
-                                              True, True)
+                    self.command_set = decode_command_set(
+                                        self.encoded_command_set.getvalue())
 
                     # Determine which DIMSE Message class to use
                     self.__class__ = MessageType[self.command_set.CommandField]
@@ -257,16 +463,23 @@ class DIMSEMessage(object):
                     #   if value is 0101H no dataset present
                     #   otherwise a dataset is included in the Message
                     if self.command_set.CommandDataSetType == 0x0101:
+                        self.remaining_pdvs = pdvs[index + 1:]
                         return True
+                    
+                    if data_set_sink is not None:
+                        sink = data_set_sink(self.command_set)
+                        if sink is not None:
+                            self.data_set = sink
 
             ## DATA SET
             # P-DATA fragment contains Message Dataset information 
             #   (control_header_byte is xxxxxx00 or xxxxxx10)
             else:
-                self.data_set.write(pdv_item[1][1:])
+                self.data_set.write(fragment_view[1:])
 
                 # The P-DATA fragment is the last one (xxxxxx10)
                 if control_header_byte & 2 != 0:
+                    self.remaining_pdvs = pdvs[index + 1:]
                     return True
 
         return False
@@ -277,18 +490,10 @@ class DIMSEMessage(object):
         this should be called to set the CommandGroupLength element value 
         correctly.
         """
-        length = 0
+        # The encoded CommandGroupLength element itself is 12 bytes long and
+        #   isn't included in the group length
+        length = len(encode_command_set(self.command_set)) - 12
         
-        # Remove CommandGroupLength from dataset to prevent it from messing
-        #   with our length calculation.
-        # We have to use the tag value due to a bug in pydicom 1.0.0
-        del self.command_set[0x00000000]
-        for ii in list(self.command_set.values()):
-            #   encode_element(elem, is_implicit_VR, is_little_endian)
-            length += len(encode_element(ii, True, True))
-        
-        # Add the CommandGroupLength element back to the dataset with the
-        #   correct value
         self.command_set.CommandGroupLength = length
 
     def primitive_to_message(self, primitive):
@@ -302,95 +507,31 @@ class DIMSEMessage(object):
             The primitive to convert to the current DIMSE Message object
         """
         ## Command Set
-        for elem in self.command_set:
-            # Use the short version of the element names as these should
-            #   match the parameter names in the primitive
-            #
-            # Nope, there's no guarantee that this will be the case
-            #   I think I'll add a keyword parameter to the pydicom Element
-            #   class and push upstream
-            # elem_name = elem.keyword
-            #   
-            # In the meantime we can add a workaround
-            if dictionary_has_tag(elem.tag):
-                elem_name = dictionary_keyword(elem.tag)
-            else:
-                elem_name = elem.name.replace(' ', '')
-            
-            # Old method
-            if elem_name in primitive.__dict__.keys():
-                
-                if primitive.__dict__[elem_name] is not None:
-                    elem.value = primitive.__dict__[elem_name]
-                else:
-                    del self.command_set[elem.tag]
-            
-            # New method
-            elif hasattr(primitive, elem_name):
-                # If value hasn't been set for a parameter then delete
-                #   the corresponding element
-                attr = getattr(primitive, elem_name)
-                if attr is not None:
-                    elem.value = attr
-                else:
-                    del self.command_set[elem.tag]
+        # Parameters that haven't been set are left out of the Command Set
+        command_set = Dataset()
+        for tag, vr, keyword in self.parameters:
+            value = getattr(primitive, keyword, None)
+            if value is not None:
+                command_set.add_new(tag, vr, value)
         
-        # Theres a one-to-one relationship in the message_type dict, so invert
-        #   it for convenience
-        rev_type = {}
-        for value in message_type.keys():
-            rev_type[message_type[value]]  = value
-        
-        cls_type_name = self.__class__.__name__.replace('_', '-')
-        self.command_set.CommandField = rev_type[cls_type_name]
+        command_set.add_new(0x00000100, 'US', self.command_field)
         
         ## Data Set
         # Default to no Data Set
         self.data_set = BytesIO()
-        self.command_set.CommandDataSetType = 0x0101
-
-        # These message types should (except for C-FIND-RSP) always have
-        #   a Data Set
-        cls_type_name = self.__class__.__name__
-        if cls_type_name == 'C_STORE_RQ':
-            self.data_set = primitive.DataSet
-            self.command_set.CommandDataSetType = 0x0001
-        elif cls_type_name in ['C_FIND_RQ', 'C_GET_RQ', 'C_GET_RSP',
-                                 'C_MOVE_RQ', 'C_MOVE_RSP']:
-            self.data_set = primitive.Identifier
-            self.command_set.CommandDataSetType = 0x0001
-        # C-FIND-RSP only has a Data Set when the Status is pending (0x0001)
-        elif cls_type_name == 'C_FIND_RSP' and \
-                        self.command_set.Status in [0xFF00, 0xFF01]:
-            self.data_set = primitive.Identifier
-            self.command_set.CommandDataSetType = 0x0001
-        elif cls_type_name == 'N_EVENT_REPORT_RQ':
-            self.data_set = primitive.EventInformation
-            self.command_set.CommandDataSetType = 0x0001
-        elif cls_type_name == 'N_EVENT_REPORT_RSP':
-            self.data_set = primitive.EventReply
-            self.command_set.CommandDataSetType = 0x0001
-        elif cls_type_name in ['N_GET_RSP', 'N_SET_RSP',
-                                 'N_CREATE_RQ', 'N_CREATE_RSP']:
-            self.data_set = primitive.AttributeList
-            self.command_set.CommandDataSetType = 0x0001
-        elif cls_type_name == 'N_SET_RQ':
-            self.data_set = primitive.ModificationList
-            self.command_set.CommandDataSetType = 0x0001
-        elif cls_type_name == 'N_ACTION_RQ':
-            self.data_set = primitive.ActionInformation
-            self.command_set.CommandDataSetType = 0x0001
-        elif cls_type_name == 'N_ACTION_RSP':
-            self.data_set = primitive.ActionReply
-            self.command_set.CommandDataSetType = 0x0001
-        elif cls_type_name in ['C_ECHO_RQ', 'C_ECHO_RSP', 'N_DELETE_RQ', 
-                                'C_STORE_RSP', 'C_CANCEL_RQ',
-                                'N_DELETE_RSP', 'C_FIND_RSP']:
-            pass
-        else:
-            logger.error("DIMSE - Can't convert primitive to message for "
-                "unknown message type '%s'" %cls_type_name)
-    
+        data_set_type = 0x0101
+        
+        # C-FIND-RSP only has a Data Set when the Status is pending
+        if self.data_set_attribute is not None and \
+                (self.command_field != 0x8020 or 
+                 primitive.Status in [0xFF00, 0xFF01]):
+            self.data_set = getattr(primitive, self.data_set_attribute)
+            data_set_type = 0x0001
+        
+        command_set.add_new(0x00000800, 'US', data_set_type)
+        
+        self.command_set = command_set
+        
         # Set the Command Set length
         self._set_command_group_length()
         
@@ -404,65 +545,21 @@ class DIMSEMessage(object):
         primitive : pynetdicom3.DIMSEparameters DIMSE service primitive
             The primitive generated from the current DIMSE Message
         """
-        cls_type_name = self.__class__.__name__
-        if 'C_ECHO' in cls_type_name:
-            primitive = C_ECHO_ServiceParameters()
-        elif 'C_STORE' in cls_type_name:
-            primitive = C_STORE_ServiceParameters()
-        elif 'C_FIND' in cls_type_name:
-            primitive = C_FIND_ServiceParameters()
-        elif 'C_GET' in cls_type_name:
-            primitive = C_GET_ServiceParameters()
-        elif 'C_MOVE' in cls_type_name:
-            primitive = C_MOVE_ServiceParameters()
-        elif 'N_EVENT' in cls_type_name:
-            primitive = N_EVENT_REPORT_ServiceParameters()
-        elif 'N_GET' in cls_type_name:
-            primitive = N_GET_ServiceParameters()
-        elif 'N_SET' in cls_type_name:
-            primitive = N_SET_ServiceParameters()
-        elif 'N_ACTION' in cls_type_name:
-            primitive = N_ACTION_ServiceParameters()
-        elif 'N_CREATE' in cls_type_name:
-            primitive = N_CREATE_ServiceParameters()
-        elif 'N_DELETE' in cls_type_name:
-            primitive = N_DELETE_ServiceParameters()
+        primitive = self.primitive_class()
         
         ## Command Set
         # For each parameter in the primitive, set the appropriate value
         #   from the Message's Command Set
-        for elem in self.command_set:
-            if dictionary_has_tag(elem.tag):
-                elem_name = dictionary_keyword(elem.tag)
-            else:
-                elem_name = elem.name.replace(' ', '')
-            
-            if hasattr(primitive, elem_name):
+        for tag, _, keyword in self.parameters:
+            if tag in self.command_set:
                 try:
-                    setattr(primitive, elem_name, self.command_set.__getattr__(elem_name))
+                    setattr(primitive, keyword, self.command_set[tag].value)
                 except:
                     logger.error('DIMSE failed to convert message to primitive')
 
         ## Datasets
-        if cls_type_name == 'C_STORE_RQ':
-            setattr(primitive, 'DataSet', self.data_set)
-        elif cls_type_name in ['C_FIND_RQ', 'C_FIND_RSP',
-                                'C_GET_RQ',  'C_GET_RSP',
-                                'C_MOVE_RQ', 'C_MOVE_RSP']:
-            setattr(primitive, 'Identifier', self.data_set)
-        elif cls_type_name == 'N_EVENT_REPORT_RQ':
-            setattr(primitive, 'EventInformation', self.data_set)
-        elif cls_type_name == 'N_EVENT_REPORT_RSP':
-            setattr(primitive, 'EventReply', self.data_set)
-        elif cls_type_name in ['N_GET_RSP',   'N_SET_RSP',
-                                'N_CREATE_RQ', 'N_CREATE_RSP']:
-            setattr(primitive, 'AttributeList', self.data_set)
-        elif cls_type_name == 'N_SET_RQ':
-            setattr(primitive, 'ModificationList', self.data_set)
-        elif cls_type_name == 'N_ACTION_RQ':
-            setattr(primitive, 'ActionInformation', self.data_set)
-        elif cls_type_name == 'N_ACTION_RSP':
-            setattr(primitive, 'ActionReply', self.data_set)
+        if self.data_set_attribute is not None:
+            setattr(primitive, self.data_set_attribute, self.data_set)
 
         return primitive
 
@@ -500,16 +597,29 @@ def _build_message_classes(message_name):
         * N-DELETE-RQ
         * N-DELETE-RSP
     """
-    def __init__(self):
-        DIMSEMessage.__init__(self)
-
     # Create new subclass of DIMSE Message using the supplied name
     #   but replace hyphens with underscores
-    cls = type(message_name.replace('-', '_'), 
-                (DIMSEMessage,), 
-                {"__init__": __init__})
+    cls = type(message_name.replace('-', '_'), (DIMSEMessage,), {})
 
-    # Create a new Dataset object for the command_set attributes
+    # Precompute everything primitive_to_message() and message_to_primitive()
+    #   need so they don't have to look it up for each message
+    for command_field, name in message_type.items():
+        if name == message_name:
+            cls.command_field = command_field
+    
+    cls.primitive_class = message_primitive[message_name.rsplit('-', 1)[0]]
+    cls.data_set_attribute = message_data_set.get(message_name)
+    
+    # (tag, VR, primitive parameter name) for each Command Set element that
+    #   corresponds to a parameter of the primitive. CommandGroupLength, 
+    #   CommandField and CommandDataSetType are set by the message itself
+    cls.parameters = tuple([(tag, dcm_dict[tag][0], dcm_dict[tag][4])
+                            for tag in command_set_elem[message_name]
+                            if tag not in [0x00000000, 0x00000100, 
+                                           0x00000800]])
+
+    # The Command Set elements of the message as an (empty) Dataset, for
+    #   reference only
     d = Dataset()
     for elem_tag in command_set_elem[message_name]:
         tag = Tag(elem_tag)
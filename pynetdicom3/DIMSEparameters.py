@@ -1,10 +1,11 @@
 
-from io import BytesIO
+from io import BytesIO, BufferedIOBase, RawIOBase
 import logging
 
 from pydicom.uid import UID
 from pydicom.dataset import Dataset
 
+from pynetdicom3.dsutils import SpooledDataset
 from pynetdicom3.utils import validate_ae_title
 
 
@@ -255,12 +256,27 @@ class C_STORE_ServiceParameters:
         
     @DataSet.setter
     def DataSet(self, value):
+        """
+        Set the encoded Data Set
+        
+        Parameters
+        ----------
+        value : io.BytesIO, binary file object or 
+        pynetdicom3.dsutils.SpooledDataset
+            The encoded Data Set. A file object opened in binary mode and
+            positioned at the start of the encoded Data Set is read one
+            fragment at a time as it's sent (C-STORE requests only). A 
+            SpooledDataset is a received Data Set that has been written to 
+            file
+        """
         if value is None:
             self._dataset = value
-        elif isinstance(value, BytesIO):
+        elif isinstance(value, (BytesIO, BufferedIOBase, RawIOBase, 
+                                SpooledDataset)):
             self._dataset = value
         else:
-            raise TypeError("DataSet must be a BytesIO object")
+            raise TypeError("DataSet must be a BytesIO, binary file object "
+                            "or SpooledDataset")
     
     @property
     def Status(self):
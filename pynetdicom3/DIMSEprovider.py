@@ -1,13 +1,19 @@
 
 import logging
-import time
+import threading
 
 from pynetdicom3.DIMSEmessages import *
 from pynetdicom3.DIMSEparameters import *
+from pynetdicom3.DULprovider import WAIT_INTERVAL
 from pynetdicom3.primitives import P_DATA
+from pynetdicom3.utils import pdata_length
 
 logger = logging.getLogger('pynetdicom.dimse')
 
+# The maximum number of P-DATA primitives waiting to be sent by the DUL thread
+#   before Send() waits for it to catch up
+STREAM_QUEUE_DEPTH = 4
+
 class DIMSEServiceProvider(object):
     """
     PS3.7 6.2
@@ -106,11 +112,38 @@ class DIMSEServiceProvider(object):
         self.DUL = DUL
         self.message = None
         self.dimse_timeout = None
+        
+        # Called with the Command Set of incoming messages that have a Data 
+        #   Set, may return a file-like object to write the Data Set to
+        self.data_set_sink = None
+        
+        # The P-DATA being filled with PDVs before it's sent and the length
+        #   of its PDV items, see _pack()
+        self._pending = None
+        self._pending_length = 0
+        # Sends the pending P-DATA if it's been held back too long, see Send()
+        self._flush_timer = None
+        # Guards the pending P-DATA against the flush timer
+        self._send_lock = threading.RLock()
+        
+        # A P-DATA holding the PDVs received after the end of the last
+        #   message, which are decoded before anything else from the DUL
+        self._received = None
+        
+        # The length of the P-DATA received from the DUL that's still counted
+        #   against the local AE's memory budget, see _release_memory()
+        self._charged = 0
+        # The length released once the last message was complete
+        self._message_length = 0
 
-    def Send(self, primitive, context_id, max_pdu):
+    def Send(self, primitive, context_id, max_pdu, flush=True, delay=None):
         """
         Send a DIMSE-C or DIMSE-N message to the peer AE
         
+        The PDVs of the message are packed into as few P-DATA-TF PDUs as
+        the peer's maximum PDU length allows, so the Command Set and a small
+        Data Set are sent together
+        
         Parameters
         ----------
         primitive : pynetdicom3.DIMSEparameters
@@ -119,6 +152,14 @@ class DIMSEServiceProvider(object):
             The ID of the presentation context to be sent under
         max_pdu : int
             The maximum send PDV size acceptable by the peer AE
+        flush : bool, optional
+            If False then the last P-DATA-TF PDU of the message is held back
+            so the PDVs of the next message can be packed into it, either
+            the next Send() with `flush` True or flush() must then be called
+            to send it (default: True)
+        delay : float, optional
+            If `flush` is False, the longest time in seconds the P-DATA-TF 
+            PDU is held back before it's sent anyway (default: no limit)
         """
         if primitive.__class__ == C_ECHO_ServiceParameters:
             if primitive.MessageID is not None:
@@ -201,9 +242,128 @@ class DIMSEServiceProvider(object):
         # Split the full messages into P-DATA chunks, each below the max_pdu size
         pdvs = dimse_msg.Encode(context_id, max_pdu)
 
-        # Send each of the P-DATA to the peer via the DUL provider
-        for pp in pdvs:
-            self.DUL.Send(pp)
+        # Send each of the P-DATA to the peer via the DUL provider. The
+        #   fragments of the Data Set are only generated as fast as the DUL
+        #   thread sends them, otherwise they'd all end up in the queue
+        with self._send_lock:
+            for pp in pdvs:
+                self._pack(pp, max_pdu)
+                
+                queue_ = self.DUL.to_provider_queue
+                while self.DUL.is_alive() and \
+                    not queue_.wait_below(STREAM_QUEUE_DEPTH, WAIT_INTERVAL):
+                    pass
+            
+            if flush:
+                self.flush()
+            elif delay is not None and self._pending is not None and \
+                                                self._flush_timer is None:
+                self._flush_timer = threading.Timer(delay, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def flush(self):
+        """ Send the P-DATA held back by Send() to the peer, if there is one """
+        with self._send_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            
+            if self._pending is not None:
+                self.DUL.Send(self._pending)
+                self._pending = None
+                self._pending_length = 0
+
+    def _pack(self, pdata, max_pdu):
+        """
+        Add the PDVs of `pdata` to the pending P-DATA, sending the pending
+        P-DATA first if they won't fit within `max_pdu` and afterwards if 
+        there's no room left for any more
+        
+        Parameters
+        ----------
+        pdata : pynetdicom3.primitives.P_DATA
+            The P-DATA primitive with the PDVs to add
+        max_pdu : int
+            The maximum length of the PDV items in a P-DATA-TF PDU, 0 for
+            no maximum
+        """
+        for pdv in pdata.presentation_data_value_list:
+            # Each PDV item also has a 4 byte length and 1 byte context ID
+            length = len(pdv[1]) + 5
+            if max_pdu and self._pending_length + length > max_pdu:
+                self.flush()
+            
+            if self._pending is None:
+                self._pending = P_DATA()
+                self._pending.presentation_data_value_list = []
+            
+            self._pending.presentation_data_value_list.append(pdv)
+            self._pending_length += length
+        
+        # The smallest PDV item has a 1 byte header and 1 byte of data
+        if max_pdu and self._pending_length + 7 > max_pdu:
+            self.flush()
+
+    def _next_pdata(self, wait, dimse_timeout):
+        """
+        Return the P-DATA holding the PDVs left over from the last message, 
+        otherwise the next primitive from the DUL
+        """
+        if self._received is not None:
+            pdata, self._received = self._received, None
+            return pdata
+        
+        pdata = self.DUL.Receive(wait, dimse_timeout)
+        if pdata.__class__ is P_DATA:
+            self._charged += pdata_length(pdata)
+        
+        return pdata
+
+    def _keep_remaining(self, message):
+        """
+        Keep any PDVs received in the same P-DATA after the end of `message`
+        so they can be decoded as the start of the next message
+        """
+        if message.remaining_pdvs:
+            self._received = P_DATA()
+            self._received.presentation_data_value_list = \
+                                                    message.remaining_pdvs
+            message.remaining_pdvs = []
+
+    def _release_memory(self, message, complete):
+        """
+        Let the DUL release the memory counted for the P-DATA decoded into
+        `message` once it's complete, or as it's decoded if the Data Set is 
+        being written to a sink rather than held in memory. PDVs left over 
+        for the next message stay counted
+        """
+        if not complete and isinstance(message.data_set, BytesIO):
+            return
+        
+        remaining = 0
+        if self._received is not None:
+            remaining = pdata_length(self._received)
+        
+        released = max(self._charged - remaining, 0)
+        if released:
+            self.DUL.release_memory(released)
+            self._charged = remaining
+        
+        if complete:
+            self._message_length = released
+
+    def is_receiving(self):
+        """
+        Return True if part of a DIMSE message has been received from the 
+        peer but not all of it
+        """
+        message = self.message
+        if message is None:
+            return False
+        
+        return message.encoded_command_set.tell() > 0 or \
+                                            message.data_set.tell() > 0
 
     def Receive(self, wait=False, dimse_timeout=None):
         """
@@ -215,7 +375,8 @@ class DIMSEServiceProvider(object):
         wait : bool, optional
             Wait until a response has been received (default: False)
         dimse_timeout : int, optional
-            Wait `dimse_timeout` seconds for a response (default: no timeout)
+            Wait `dimse_timeout` seconds for a response, 0 or None for no 
+            timeout (default: no timeout)
             
         Returns
         -------
@@ -227,21 +388,24 @@ class DIMSEServiceProvider(object):
             self.message = DIMSEMessage()
 
         if wait:
+            # The AE's default DIMSE timeout of 0 means no timeout
+            dimse_timeout = dimse_timeout or None
+            
             # Loop until complete DIMSE message is received
             #   message may be split into 1 or more fragments
             while 1:
-                time.sleep(0.001)
-                
-                nxt = self.DUL.Peek()
-                if nxt is None:
-                    continue
-                
-                if nxt.__class__ is not P_DATA:
-                    return None, None
+                if self._received is None:
+                    # Block until the DUL passes something up
+                    nxt = self.DUL.WaitForPrimitive(dimse_timeout)
+                    if nxt is None or nxt.__class__ is not P_DATA:
+                        return None, None
                 
-                primitive = self.DUL.Receive(wait, dimse_timeout)
+                primitive = self._next_pdata(wait, dimse_timeout)
 
-                if self.message.Decode(primitive):
+                if self.message.Decode(primitive, self.data_set_sink):
+                    self._keep_remaining(self.message)
+                    self._release_memory(self.message, True)
+                    
                     # Callback
                     self.on_receive_dimse_message(self.message)
                     dimse_msg = self.message
@@ -256,16 +420,20 @@ class DIMSEServiceProvider(object):
                     
                     return dimse_msg, context_id
                 else:
+                    self._release_memory(self.message, False)
                     return None, None
         
         else:
             cls = self.DUL.Peek().__class__
-            if cls not in (type(None), P_DATA):
+            if self._received is None and cls not in (type(None), P_DATA):
                 return None, None
 
-            primitive = self.DUL.Receive(wait, dimse_timeout)
+            primitive = self._next_pdata(wait, dimse_timeout)
 
-            if self.message.Decode(primitive):
+            if self.message.Decode(primitive, self.data_set_sink):
+                self._keep_remaining(self.message)
+                self._release_memory(self.message, True)
+                
                 # Callback
                 self.on_receive_dimse_message(self.message)
                 
@@ -281,6 +449,7 @@ class DIMSEServiceProvider(object):
 
                 return dimse_msg, context_id
             else:
+                self._release_memory(self.message, False)
                 return None, None
 
 
@@ -393,7 +562,8 @@ class DIMSEServiceProvider(object):
         priority = priority_str[d.Priority]
 
         dataset = 'None'
-        if dimse_msg.data_set.getvalue() != b'':
+        if not isinstance(dimse_msg.data_set, BytesIO) or \
+                                    dimse_msg.data_set.getvalue() != b'':
             dataset = 'Present'
 
         if d.AffectedSOPClassUID.name == 'CT Image Storage':
@@ -676,7 +846,8 @@ class DIMSEServiceProvider(object):
         priority = priority_str[d.Priority]
 
         dataset = 'None'
-        if dimse_msg.data_set.getvalue() != b'':
+        if not isinstance(dimse_msg.data_set, BytesIO) or \
+                                    dimse_msg.data_set.getvalue() != b'':
             dataset = 'Present'
         
         logger.info('Received Store Request')
@@ -8,9 +8,10 @@ import logging
 import os
 import queue
 import select
+import selectors
 import socket
-from struct import unpack
-from threading import Thread
+from struct import unpack, unpack_from
+from threading import Condition, Lock, Thread
 import time
 
 from pynetdicom3.exceptions import InvalidPrimitive
@@ -18,37 +19,342 @@ from pynetdicom3.fsm import StateMachine
 from pynetdicom3.PDU import *
 from pynetdicom3.timer import Timer
 from pynetdicom3.primitives import A_ASSOCIATE, A_RELEASE, A_ABORT, P_DATA
+from pynetdicom3.utils import SelectorWakeup, pdata_length
 
 
 logger = logging.getLogger('pynetdicom.dul')
 
+# The largest PDU length (excluding the 6 byte header) accepted from a peer
+#   for PDUs other than P-DATA-TF, which are limited by the local maximum PDU
+#   length instead
+MAXIMUM_OTHER_PDU_LENGTH = 1024 * 1024
 
-def recvn(sock, n):
+# The largest P-DATA-TF PDU length accepted when the local maximum PDU length
+#   is 0 (unlimited)
+MAXIMUM_UNLIMITED_PDU_LENGTH = 64 * 1024 * 1024
+
+# The longest time (in seconds) the service user blocks waiting on a queue
+#   before checking whether the DUL or association has stopped
+WAIT_INTERVAL = 0.5
+
+
+def pdu_length_allowed(pdu_type, length, max_pdu):
+    """
+    Return True if a PDU of `pdu_type` with a header length of `length` bytes
+    may be received, otherwise the peer should be aborted rather than a buffer
+    allocated for it
+
+    Parameters
+    ----------
+    pdu_type - int
+        The PDU type, the first byte of its header
+    length - int
+        The PDU length from its header, which excludes the header itself
+    max_pdu - int or None
+        The local maximum PDU length, 0 or None for unlimited
+    """
+    if pdu_type != 0x04:
+        return length <= MAXIMUM_OTHER_PDU_LENGTH
+
+    return length <= (max_pdu or MAXIMUM_UNLIMITED_PDU_LENGTH)
+
+
+class ReceiveBuffer(object):
     """
-    Read n bytes from a socket
+    Buffers the data received on a transport connection so that PDUs are read
+    with as few large recv_into() calls as possible rather than with separate
+    reads for the PDU type, length and body. A single read may contain the
+    end of one PDU and the start of the next, or several complete PDUs.
+
+    PDUs that fit in the buffer are sliced out of it, a PDU too large to fit
+    is read straight into a bytearray of its own once its header has arrived.
+    No room is made for a PDU longer than pdu_length_allowed() permits, use
+    is_oversized() to check for one.
+
+    P-DATA-TF PDUs are returned as memoryviews of the buffer so that their
+    PDVs are never copied before being added to their DIMSE messages. The 
+    part of the buffer they occupy isn't reused until every view of it has
+    been released, if there's still one in use when the buffer needs to be 
+    compacted then a new buffer is allocated instead.
     
     Parameters
     ----------
-    sock - socket.socket
-        The socket to read from
-    n - int
-        The number of bytes to read
+    size - int, optional
+        The size of the buffer in bytes (default: 32768)
+    
+    Attributes
+    ----------
+    max_pdu - int
+        The local maximum PDU length, 0 for unlimited (default: 0)
     """
-    ret = b''
-    read_length = 0
-    while read_length < n:
-        tmp = sock.recv(n - read_length)
+    def __init__(self, size=32768):
+        self.max_pdu = 0
+        self._buffer = bytearray(size)
+        self._view = memoryview(self._buffer)
+        # The unread data is self._buffer[self._start:self._end]
+        self._start = 0
+        self._end = 0
+        # True if views of the buffer have been returned by next_pdu() since
+        #   it was last compacted
+        self._lent = False
         
-        if len(tmp)==0:
-            return ret
+        # A PDU too large for the buffer and the number of bytes of it read
+        self._pdu = None
+        self._pdu_view = None
+        self._pdu_received = 0
+
+    @property
+    def pdu_type(self):
+        """ The type of the next PDU, None if no data is waiting """
+        if self._pdu is not None:
+            return self._pdu[0]
         
-        ret += tmp
-        read_length += len(tmp)
-    
-    if read_length != n:
-        raise #"Low level Network ERROR: "
+        if self._start == self._end:
+            return None
+        
+        return self._buffer[self._start]
+
+    def has_pdu(self):
+        """ Return True if a complete PDU is waiting to be read """
+        if self._pdu is not None:
+            return self._pdu_received == len(self._pdu)
+        
+        length = self._next_length()
+        return length is not None and self._end - self._start >= length
+
+    def next_pdu(self):
+        """
+        Return the next complete PDU
+        
+        Returns
+        -------
+        bytes, bytearray, memoryview or None
+            The encoded PDU, including its header, or None if the PDU hasn't 
+            been completely received. A P-DATA-TF PDU is a view of the buffer
+            that must be released before that part of it can be reused
+        """
+        if not self.has_pdu():
+            return None
+        
+        if self._pdu is not None:
+            pdu = self._pdu
+            self._pdu_view.release()
+            self._pdu = None
+            self._pdu_view = None
+            return pdu
+        
+        end = self._start + self._next_length()
+        pdu = self._view[self._start:end]
+        if pdu[0] == 0x04:
+            self._lent = True
+        else:
+            pdu = bytes(pdu)
+        
+        self._start = end
+        if self._start == self._end and not self._lent:
+            self._start = self._end = 0
+        
+        return pdu
+
+    def is_oversized(self):
+        """ Return True if the next PDU is too long to be received """
+        if self._pdu is not None:
+            return False
+        
+        length = self._next_length()
+        if length is None:
+            return False
+        
+        return not pdu_length_allowed(self._buffer[self._start], length - 6,
+                                      self.max_pdu)
+
+    def recv(self, sock):
+        """
+        Read the data waiting on `sock` into the buffer, should only be called
+        once any complete PDUs have been read with next_pdu()
+        
+        Parameters
+        ----------
+        sock - socket.socket
+            The connection to read from
+        
+        Returns
+        -------
+        int
+            The number of bytes read, 0 if the peer has closed the connection
+        
+        Raises
+        ------
+        socket.error
+            If the read failed
+        """
+        if self._pdu is None:
+            self._make_room()
+        
+        if self._pdu is not None:
+            nbytes = sock.recv_into(self._pdu_view[self._pdu_received:])
+            self._pdu_received += nbytes
+        else:
+            nbytes = sock.recv_into(self._view[self._end:])
+            self._end += nbytes
+        
+        return nbytes
+
+    def clear(self):
+        """ Discard any buffered data """
+        self._start = self._end
+        self._compact()
+        if self._pdu is not None:
+            self._pdu_view.release()
+        
+        self._pdu = None
+        self._pdu_view = None
+
+    def _next_length(self):
+        """ Return the length of the next PDU, None if its header is partial """
+        if self._end - self._start < 6:
+            return None
+        
+        # Bytes 3-6 are the length of the rest of the PDU
+        return 6 + unpack_from('>L', self._buffer, self._start + 2)[0]
+
+    def _make_room(self):
+        """ Make room in the buffer for the rest of the next PDU """
+        waiting = self._end - self._start
+        length = self._next_length()
+        
+        # The peer will be aborted
+        if self.is_oversized():
+            return
+        
+        # Too large for the buffer, so move what we have of it to a bytearray
+        #   of its own and read the rest straight into that
+        if length is not None and length > len(self._buffer):
+            self._pdu = bytearray(length)
+            self._pdu_view = memoryview(self._pdu)
+            self._pdu_view[:waiting] = self._view[self._start:self._end]
+            self._pdu_received = waiting
+            self._start = self._end
+            self._compact()
+            return
+        
+        # Move the partial PDU to the start of the buffer if it won't fit 
+        #   where it is
+        if self._start + (length or 6) > len(self._buffer):
+            self._compact()
+
+    def _compact(self):
+        """
+        Move the unread data to the start of the buffer. If a P-DATA-TF PDU
+        returned by next_pdu() is still using the buffer then the data is
+        moved to a new buffer instead
+        """
+        waiting = self._end - self._start
+        if self._lent:
+            self._lent = False
+            unread = bytes(self._view[self._start:self._end])
+            
+            # A bytearray can't be resized while anything else has a view of
+            #   it, including our own
+            self._view.release()
+            try:
+                self._buffer.append(0)
+                self._buffer.pop()
+            except BufferError:
+                self._buffer = bytearray(len(self._buffer))
+            
+            self._view = memoryview(self._buffer)
+            self._view[:waiting] = unread
+        else:
+            self._view[:waiting] = self._view[self._start:self._end]
+        
+        self._start = 0
+        self._end = waiting
+
+
+class PrimitiveQueue(queue.Queue):
+    """
+    A queue of primitives passed between the DUL service provider and the
+    service user. Besides the usual queue.Queue methods either side can 
+    block until the queue changes, rather than polling it, while leaving the
+    primitive at its head for whoever consumes it.
     
-    return ret
+    Attributes
+    ----------
+    changes - int
+        The number of times an item has been put in or taken out of the
+        queue, read before checking the queue and passed to wait()
+    """
+    def __init__(self):
+        queue.Queue.__init__(self)
+        self.changes = 0
+        # Shares the queue's mutex like the not_empty and not_full conditions
+        self._changed = Condition(self.mutex)
+
+    def _put(self, item):
+        queue.Queue._put(self, item)
+        self._notify()
+
+    def _get(self):
+        item = queue.Queue._get(self)
+        self._notify()
+        return item
+
+    def _notify(self):
+        """ Wake every waiting thread, the mutex must be held """
+        self.changes += 1
+        self._changed.notify_all()
+
+    def interrupt(self):
+        """ Wake every waiting thread without changing the queue """
+        with self.mutex:
+            self._notify()
+
+    def wait(self, changes, timeout=None):
+        """
+        Block until the queue has changed since `changes` was read from the
+        `changes` attribute, or until interrupted
+        
+        Parameters
+        ----------
+        changes - int
+            The value of the `changes` attribute when the queue was checked
+        timeout - float, optional
+            Block for at most `timeout` seconds (default: no timeout)
+        
+        Returns
+        -------
+        bool
+            True if the queue changed or was interrupted, False if timed out
+        """
+        with self.mutex:
+            if self.changes == changes:
+                self._changed.wait(timeout)
+            
+            return self.changes != changes
+
+    def wait_below(self, size, timeout=None):
+        """
+        Block until the queue holds fewer than `size` items, the queue
+        changes or it's interrupted
+        
+        Parameters
+        ----------
+        size - int
+            The number of items the queue must hold fewer than
+        timeout - float, optional
+            Block for at most `timeout` seconds (default: no timeout)
+        
+        Returns
+        -------
+        bool
+            True if the queue holds fewer than `size` items, False otherwise
+        """
+        with self.mutex:
+            if self._qsize() >= size:
+                self._changed.wait(timeout)
+            
+            return self._qsize() < size
 
 
 class DULServiceProvider(Thread):
@@ -59,6 +365,11 @@ class DULServiceProvider(Thread):
     - If a socket is given, the DUL will use this socket as the client socket. 
     - If neither is given, the DUL will not be able to accept connections (but 
       will be able to initiate them.)
+
+    The provider's thread must be started with start() once its Association
+    has set up the ACSE and DIMSE providers. Alternatively, if `engine` is
+    given then the thread is never started and the engine loop drives the
+    state machine by calling _run_once() whenever there's work to do.
     
     Parameters
     ----------
@@ -74,6 +385,10 @@ class DULServiceProvider(Thread):
         The local AE instance
     assoc : pynetdicom3.association.Association
         The DUL's current Association
+    engine : pynetdicom3.engine.EngineLoop or pynetdicom3.aio.AsyncAssociation
+    optional
+        The engine loop or asyncio association that drives the DUL instead of
+        its own thread
         
     Attributes
     ----------
@@ -94,9 +409,14 @@ class DULServiceProvider(Thread):
         local AE to the peer AE SCP
     state_machine : pynetdicom3.fsm.StateMachine
         The DICOM Upper Layer's State Machine
+
+    The run loop blocks on a selector until there is incoming network data,
+    a primitive from the service user (signalled through a wakeup socket
+    pair by Send() and Kill()) or the ARTIM timer is due to expire.
     """
     def __init__(self, Socket=None, Port=None, Name='', dul_timeout=None, 
-                        acse_timeout=30, local_ae=None, assoc=None):
+                        acse_timeout=30, local_ae=None, assoc=None,
+                        engine=None):
         
         if Socket and Port:
             raise ValueError("DULServiceProvider can't be instantiated with "
@@ -105,6 +425,7 @@ class DULServiceProvider(Thread):
         # The local AE
         self.local_ae = local_ae
         self.association = assoc
+        self.engine = engine
 
         Thread.__init__(self, name=Name)
 
@@ -120,11 +441,11 @@ class DULServiceProvider(Thread):
         #   user and the DUL service provider. 
         # An event occurs when the DUL service user adds to 
         #   the to_provider_queue
-        self.to_provider_queue = queue.Queue()
+        self.to_provider_queue = PrimitiveQueue()
         
         # A primitive is sent to the service user when the DUL service provider
         # adds to the to_user_queue.
-        self.to_user_queue = queue.Queue()
+        self.to_user_queue = PrimitiveQueue()
 
         # Setup the idle timer, ARTIM timer and finite state machine
         self._idle_timer = None
@@ -134,6 +455,16 @@ class DULServiceProvider(Thread):
         # ARTIM timer
         self.artim_timer = Timer(acse_timeout)
         
+        # Incoming data from the peer, read by CheckIncomingPDU()
+        self._recv_buffer = ReceiveBuffer()
+        
+        # The length of the P-DATA primitives passed up to the service user
+        #   that are still counted against the local AE's memory budget
+        self._memory_charged = 0
+        self._memory_lock = Lock()
+        # Set once the association has ended, after which nothing is counted
+        self._memory_closed = False
+        
         # State machine - PS3.8 Section 9.2
         self.state_machine = StateMachine(self)
 
@@ -178,13 +509,28 @@ class DULServiceProvider(Thread):
             self.scu_socket = None
             self.peer_address = None
 
+        # Used by the run loop to block until there's something to do
+        #   The wakeup socket pair lets other threads interrupt the wait
+        #   When driven by an engine loop the engine's selector is used instead
+        self._selector = None
+        self._waker = None
+        if engine is None:
+            self._selector = selectors.DefaultSelector()
+            self._waker = SelectorWakeup(self._selector)
+        elif self._idle_timer is not None:
+            # No run() so start the idle timer now
+            self._idle_timer.start()
+        # The transport socket currently registered with the selector
+        self._selected_socket = None
+
         self.kill = False
         self.daemon = False
-        self.start()
 
     def Kill(self):
         """Immediately interrupts the thread"""
         self.kill = True
+        self._wakeup()
+        self.to_user_queue.interrupt()
 
     def Stop(self):
         """
@@ -197,6 +543,7 @@ class DULServiceProvider(Thread):
         """
         if self.state_machine.current_state == 'Sta1':
             self.kill = True
+            self._wakeup()
             # Fix for Issue 39
             # Give the DUL thread time to exit
             while self.is_alive():
@@ -215,6 +562,7 @@ class DULServiceProvider(Thread):
             The parameters to put on FromServiceUser [FIXME]
         """
         self.to_provider_queue.put(params)
+        self._wakeup()
 
     def Receive(self, Wait=False, Timeout=None):
         """
@@ -251,79 +599,200 @@ class DULServiceProvider(Thread):
         except:
             return None
 
-    def CheckIncomingPDU(self):
+    def WaitForPrimitive(self, timeout=None):
         """
-        Converts an incoming PDU from the peer AE back into a primitive (ie one
-        of the following: A-ASSOCIATE, A-RELEASE, A-ABORT, P-DATA, A-P-ABORT)
+        Block until there's an item in the to_user_queue, the provider is 
+        stopped or `timeout` seconds have passed, then look at the next item
+        without removing it
+        
+        Parameters
+        ----------
+        timeout - float, optional
+            The most time (in seconds) to wait (default: no timeout)
+        
+        Returns
+        -------
+        queue_item
+            The next object in the to_user_queue
+        None
+            If the queue is still empty
         """
-        bytestream = bytes()
+        end = None
+        if timeout is not None:
+            end = time.time() + timeout
         
-        # Try and read data from the socket
-        try:
-            # Get the data from the socket
-            bytestream = self.scu_socket.recv(1)
-        except socket.error:
-            self.event_queue.put('Evt17')
-            self.scu_socket.close()
-            self.scu_socket = None
-            logger.error('DUL: Error reading data from the socket')
-            return
+        while True:
+            changes = self.to_user_queue.changes
+            primitive = self.Peek()
+            if primitive is not None or self.kill:
+                return primitive
+            
+            remaining = None
+            if end is not None:
+                remaining = end - time.time()
+                if remaining <= 0:
+                    return None
+            
+            self.to_user_queue.wait(changes, remaining)
 
-        # Remote port has been closed
-        if bytestream == bytes():
-            self.event_queue.put('Evt17')
-            self.scu_socket.close()
-            self.scu_socket = None
-            logger.error('Peer has closed transport connection')
+    def charge_memory(self, primitive):
+        """
+        Count a P-DATA primitive passed up to the service user against the
+        local AE's memory budget, until released by release_memory()
+
+        Parameters
+        ----------
+        primitive - pynetdicom3.primitives.P_DATA
+            The primitive being passed up
+        """
+        if self.local_ae is None:
             return
 
-        # Incoming data is OK
-        else:
-            # First byte is always PDU type
-            #   0x01 - A-ASSOCIATE-RQ   1, 2, 3-6
-            #   0x02 - A-ASSOCIATE-AC   1, 2, 3-6
-            #   0x03 - A-ASSOCIATE-RJ   1, 2, 3-6
-            #   0x04 - P-DATA-TF        1, 2, 3-6
-            #   0x05 - A-RELEASE-RQ     1, 2, 3-6
-            #   0x06 - A-RELEASE-RP     1, 2, 3-6
-            #   0x07 - A-ABORT          1, 2, 3-6
-            
-            # We do all this just to get the length of the PDU
-            # Byte 1 is PDU type
-            #   (value, )
-            pdu_type = unpack('B', bytestream)
-            
-            # Unrecognised PDU type - Evt19 in the State Machine
-            if pdu_type[0] not in [0x01, 0x02, 0x03, 0x04, 0x05, 0x06, 0x07]:
-                logger.error("Unrecognised PDU type: 0x%s" %pdu_type)
-                self.event_queue.put('Evt19')
+        nbytes = pdata_length(primitive)
+        with self._memory_lock:
+            if self._memory_closed:
                 return
-            
-            # Byte 2 is Reserved
-            result = recvn(self.scu_socket, 1)
-            bytestream += result
-            
-            # Bytes 3-6 is the PDU length
-            result = unpack('B', result)
-            length = recvn(self.scu_socket, 4)
-            
-            bytestream += length
-            length = unpack('>L', length)
-            
-            # Bytes 7-xxxx is the rest of the PDU
-            result = recvn(self.scu_socket, length[0])
-            bytestream += result
-            
-            # Determine the type of PDU coming on remote port, then decode
-            # the raw bytestream to the corresponding PDU class
-            self.pdu = Socket2PDU(bytestream, self)
-            
-            # Put the event corresponding to the incoming PDU on the queue
-            self.event_queue.put(PDU2Event(self.pdu))
 
-            # Convert the incoming PDU to a corresponding ServiceParameters 
-            #   object
-            self.primitive = self.pdu.ToParams()
+            self._memory_charged += nbytes
+
+        self.local_ae._reserve_memory(nbytes)
+
+    def release_memory(self, nbytes=None):
+        """
+        Stop counting `nbytes` of the P-DATA primitives passed up to the
+        service user against the local AE's memory budget
+
+        Parameters
+        ----------
+        nbytes - int or None, optional
+            The number of bytes to release, None to release everything and
+            stop counting, which is done once the association has ended
+        """
+        if self.local_ae is None:
+            return
+
+        with self._memory_lock:
+            if nbytes is None:
+                self._memory_closed = True
+                nbytes = self._memory_charged
+
+            nbytes = min(nbytes, self._memory_charged)
+            self._memory_charged -= nbytes
+
+        if nbytes:
+            self.local_ae._release_memory(nbytes)
+
+    def _reading_paused(self):
+        """
+        Return True if the DUL should stop reading from the peer until the
+        local AE's memory budget has been freed up. TCP flow control then
+        holds the peer back
+
+        Only data transfer is paused, and a DUL whose service user is part
+        way through receiving a DIMSE message keeps reading so that the
+        message can be completed and its memory released.
+        """
+        if self.local_ae is None or not self.local_ae._memory_exhausted():
+            return False
+
+        if self.state_machine.current_state != 'Sta6':
+            return False
+
+        dimse = getattr(self.association, 'dimse', None)
+        return dimse is None or not dimse.is_receiving()
+
+    def CheckIncomingPDU(self):
+        """
+        Reads the data waiting on the connection and converts the next complete
+        PDU from the peer AE back into a primitive (ie one of the following: 
+        A-ASSOCIATE, A-RELEASE, A-ABORT, P-DATA, A-P-ABORT)
+        
+        Returns
+        -------
+        bool
+            True if an event has been added, False if the rest of the PDU
+            hasn't arrived yet
+        """
+        self._recv_buffer.max_pdu = getattr(self.association,
+                                            'local_max_pdu', 0)
+        
+        # Only read from the socket if there isn't a complete PDU waiting
+        if self._recv_buffer.is_oversized():
+            pass
+        elif not self._recv_buffer.has_pdu():
+            try:
+                nbytes = self._recv_buffer.recv(self.scu_socket)
+            except (BlockingIOError, InterruptedError):
+                # A non-blocking connection with nothing to read after all
+                return False
+            except socket.error:
+                self.event_queue.put('Evt17')
+                self.scu_socket.close()
+                self.scu_socket = None
+                logger.error('DUL: Error reading data from the socket')
+                return True
+
+            # Remote port has been closed
+            if nbytes == 0:
+                self.event_queue.put('Evt17')
+                self.scu_socket.close()
+                self.scu_socket = None
+                logger.error('Peer has closed transport connection')
+                return True
+
+        # First byte is always PDU type
+        #   0x01 - A-ASSOCIATE-RQ   1, 2, 3-6
+        #   0x02 - A-ASSOCIATE-AC   1, 2, 3-6
+        #   0x03 - A-ASSOCIATE-RJ   1, 2, 3-6
+        #   0x04 - P-DATA-TF        1, 2, 3-6
+        #   0x05 - A-RELEASE-RQ     1, 2, 3-6
+        #   0x06 - A-RELEASE-RP     1, 2, 3-6
+        #   0x07 - A-ABORT          1, 2, 3-6
+        pdu_type = self._recv_buffer.pdu_type
+        
+        # Unrecognised PDU type - Evt19 in the State Machine
+        if pdu_type not in [0x01, 0x02, 0x03, 0x04, 0x05, 0x06, 0x07]:
+            logger.error("Unrecognised PDU type: 0x%02x" %pdu_type)
+            self._recv_buffer.clear()
+            self.event_queue.put('Evt19')
+            return True
+        
+        # Longer than the local maximum PDU length - Evt19, rather than 
+        #   allocating whatever length the peer asks for
+        if self._recv_buffer.is_oversized():
+            logger.error("Received a PDU longer than the local maximum PDU "
+                         "length, aborting the association")
+            self._recv_buffer.clear()
+            self.event_queue.put('Evt19')
+            return True
+        
+        bytestream = self._recv_buffer.next_pdu()
+        if bytestream is None:
+            return False
+        
+        self._decode_pdu(bytestream)
+        return True
+
+    def _decode_pdu(self, bytestream):
+        """
+        Decode a complete PDU received from the peer and put the corresponding
+        event on the event queue
+        
+        Parameters
+        ----------
+        bytestream - bytes
+            The encoded PDU, including the 6 byte header
+        """
+        # Determine the type of PDU coming on remote port, then decode
+        # the raw bytestream to the corresponding PDU class
+        self.pdu = Socket2PDU(bytestream, self)
+        
+        # Put the event corresponding to the incoming PDU on the queue
+        self.event_queue.put(PDU2Event(self.pdu))
+
+        # Convert the incoming PDU to a corresponding ServiceParameters 
+        #   object
+        self.primitive = self.pdu.ToParams()
 
     def CheckTimer(self):
         """
@@ -392,13 +861,18 @@ class DULServiceProvider(Thread):
             if self.scu_socket is None:
                 return False
             
+            # Only read when there's something waiting so we don't block
+            #   while the peer keeps the connection open
+            read_list, _, _ = select.select([self.scu_socket], [], [], 0)
+            if not read_list:
+                return False
+            
             # If we are still connected to the SCU
             try:
-                # socket.Socket().recv(bufsize)
-                # If we are still receiving data from the socket
-                #   wait until its done  
-                while self.scu_socket.recv(1) != b'':
-                    continue
+                # Any incoming data is discarded, we're only waiting for the
+                #   peer to close the connection
+                if self.scu_socket.recv(4096) != b'':
+                    return False
             except socket.error:
                 return False
             
@@ -433,10 +907,18 @@ class DULServiceProvider(Thread):
             if self.state_machine.current_state == 'Sta4':
                 self.event_queue.put('Evt2')
                 return True
-            
+
+            # Leave the data with the peer until there's memory for it
+            if self._reading_paused():
+                return False
+
             # By this point the connection is established
             #   If theres incoming data on the connection then check the PDU
-            #   type
+            #   type. A complete PDU may already have been read along with
+            #   the previous one
+            if self._recv_buffer.has_pdu():
+                return self.CheckIncomingPDU()
+            
             #
             # FIXME: bug related to socket closing, see socket_bug.note
             #
@@ -446,8 +928,7 @@ class DULServiceProvider(Thread):
             read_list, _, _ = select.select([self.scu_socket], [], [], 0)
         
             if read_list:
-                self.CheckIncomingPDU()
-                return True
+                return self.CheckIncomingPDU()
             #except ValueError:
             #    self.event_queue.put('Evt17')
             #    return False
@@ -457,49 +938,144 @@ class DULServiceProvider(Thread):
 
     def run(self):
         """
-        The main threading.Thread run loop. Runs constantly, checking the
-        connection for incoming data. When incoming data is received it 
-        categorises it and add its to the `to_user_queue`.
+        The main threading.Thread run loop. Blocks until there is incoming
+        data on the connection, a primitive from the service user or the ARTIM
+        timer expires, then converts it to an event for the state machine.
+        Incoming PDUs are categorised and added to the `to_user_queue`.
         """
         #logger.debug('Starting DICOM UL service "%s"' %self.name)
+        if self._idle_timer is not None:
+            self._idle_timer.start()
 
         # Main DUL loop
-        while True:
-            if self._idle_timer is not None:
-                self._idle_timer.start()
-            
-            # Required for some reason
-            time.sleep(0.001)
-            
-            if self.kill:
-                break
-            
-            # Check the connection for incoming data
-            try:
-                # If local AE is SCU also calls CheckIncomingPDU()
-                if self.CheckNetwork():
-                    if self._idle_timer is not None:
-                        self._idle_timer.restart()
-                elif self.CheckIncomingPrimitive():
-                    pass
+        try:
+            while True:
+                # Block until there's something for the DUL to do
+                self._wait_for_event()
+
+                if self.kill:
+                    break
                 
-                elif self.CheckTimer():
-                    self.kill = True
-                    
-            except:
+                self._run_once()
+        finally:
+            self._close_selector()
+            # Wake the service user if it's waiting on us
+            self.to_user_queue.interrupt()
+            self.to_provider_queue.interrupt()
+        #logger.debug('DICOM UL service "%s" stopped' %self.name)
+
+    def _run_once(self):
+        """
+        Check for incoming data, a primitive from the service user or an
+        expired ARTIM timer and then process the next event in the event
+        queue. Never blocks waiting for the network.
+        
+        Returns
+        -------
+        bool
+            True if an event was processed, False otherwise
+        """
+        # Check the connection for incoming data
+        try:
+            # If local AE is SCU also calls CheckIncomingPDU()
+            if self.CheckNetwork():
+                if self._idle_timer is not None:
+                    self._idle_timer.restart()
+            elif self.CheckIncomingPrimitive():
+                if self._idle_timer is not None:
+                    self._idle_timer.restart()
+            
+            elif self.CheckTimer():
                 self.kill = True
-                raise
+                
+        except:
+            self.kill = True
+            raise
+        
+        # Check the event queue to see if there is anything to do
+        try:
+            event = self.event_queue.get(False)
+        except queue.Empty:
+            return False
+        
+        self.state_machine.do_action(event)
+        
+        return True
+
+    def _wait_for_event(self):
+        """
+        Block until the DUL has something to do: a queued state machine event,
+        a primitive from the service user, incoming data (or a connection
+        request) on the transport socket or an ARTIM timer expiry.
+        """
+        # Work is already waiting
+        if not self.event_queue.empty() or not self.to_provider_queue.empty():
+            return
+        
+        paused = self._reading_paused()
+        if self._recv_buffer.has_pdu() and not paused:
+            return
+
+        # Sta4 is awaiting transport connection opening to complete, which
+        #   doesn't require waiting on the selector
+        state = self.state_machine.current_state
+        if self.scu_socket is not None and state == 'Sta4':
+            return
+
+        # Keep the selector watching the current transport socket, the SCU
+        #   socket takes precedence over the listen socket. While reading is
+        #   paused the socket isn't watched at all
+        sock = self.scu_socket or self.scp_socket
+        if paused:
+            sock = None
+
+        if sock is not self._selected_socket:
+            if self._selected_socket is not None:
+                try:
+                    self._selector.unregister(self._selected_socket)
+                except (KeyError, ValueError):
+                    pass
             
-            # Check the event queue to see if there is anything to do
-            try:
-                event = self.event_queue.get(False)
-            # If the queue is empty, return to the start of the loop
-            except queue.Empty:
-                continue
+            if sock is not None:
+                self._selector.register(sock, selectors.EVENT_READ)
             
-            self.state_machine.do_action(event)
+            self._selected_socket = sock
+
+        # While paused the local AE wakes us once it has memory again, unless
+        #   it already has
+        if paused and not self.local_ae._wait_for_memory(self._wakeup):
+            return
+
+        # Wait no longer than the time until the ARTIM timer expires
+        #   None means block until network data or a wakeup
+        timeout = self.artim_timer.remaining
+
+        try:
+            ready = self._selector.select(timeout)
+        except (OSError, ValueError):
+            # The socket was closed underneath us, let CheckNetwork() deal
+            #   with it
+            return
+
+        for key, _ in ready:
+            if self._waker.is_wakeup(key):
+                self._waker.clear()
+
+    def _wakeup(self):
+        """ Interrupt the run loop's wait on the selector """
+        if self.engine is not None:
+            self.engine.wakeup(self.association)
+            return
         
-        #logger.debug('DICOM UL service "%s" stopped' %self.name)
+        self._waker.wakeup()
+
+    def _close_selector(self):
+        """ Release the selector and wakeup socket pair """
+        if self._selector is None:
+            return
+        
+        self._selector.close()
+        self._waker.close()
 
     def on_receive_pdu(self):
         """ 
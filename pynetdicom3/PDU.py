@@ -90,6 +90,9 @@ class PDU(object):
             if ff == 's':
                 if isinstance(self.parameters[ii], UID):
                     self.parameters[ii] = bytes(self.parameters[ii].title(), 'utf-8')
+                # Decoded presentation data values are memoryviews
+                elif isinstance(self.parameters[ii], (bytearray, memoryview)):
+                    self.parameters[ii] = bytes(self.parameters[ii])
                 
                 self.formats[ii] = '%ds' %len(self.parameters[ii])
                 # Make sure the parameter is a bytes
@@ -1362,32 +1365,68 @@ class P_DATA_TF_PDU(PDU):
         
         return bytestring
 
+    def encode_buffers(self):
+        """
+        Encode the PDU as a list of buffers for a gather write. The PDU and
+        Item headers are packed into a single bytearray and the presentation
+        data values aren't copied
+        
+        Returns
+        -------
+        list of memoryview and bytes
+            The encoded PDU, its concatenation is the same as Encode()
+        """
+        items = self.presentation_data_value_items
+        headers = bytearray(6 + 5 * len(items))
+        view = memoryview(headers)
+        
+        pack_into('> B B I', headers, 0, self.pdu_type, 0x00, self.pdu_length)
+        
+        buffers = []
+        start = 0
+        offset = 6
+        for item in items:
+            pack_into('> I B', headers, offset, item.item_length,
+                                                item.presentation_context_id)
+            offset += 5
+            
+            buffers.append(view[start:offset])
+            buffers.append(item.presentation_data_value)
+            start = offset
+        
+        # No items, just the PDU header
+        if start < offset:
+            buffers.append(view[start:offset])
+        
+        return buffers
+
     def Decode(self, bytestring):
         """
         Decode the parameter values for the PDU from the bytes string sent
         by the peer AE
         
+        The Presentation Data Values are memoryview slices of `bytestring`
+        rather than copies of it, so a large dataset fragment is only copied
+        once it's added to its DIMSE message
+        
         Parameters
         ----------
-        bytestring : bytes
+        bytestring : bytes, bytearray or memoryview
             The bytes string received from the peer
         """
-        # Convert `bytestring` to a bytes stream to make things easier 
-        #   during decoding of the Presentation Data Value Items section
-        s = BytesIO(bytestring)
+        view = memoryview(bytestring)
         
         # Decode the P-DATA-TF PDU up to the Presentation Data Value Items section
         (self.pdu_type, 
          _,
-         self.pdu_length) = unpack('> B B I', s.read(6))
+         self.pdu_length) = unpack_from('> B B I', view)
         
         # Decode the Presentation Data Value Items section
-        length_read = 0
-        while length_read != self.pdu_length:
+        offset = 6
+        while offset < 6 + self.pdu_length:
             pdv_item = PresentationDataValueItem()
-            pdv_item.Decode(s)
+            offset = pdv_item._decode_view(view, offset)
             
-            length_read += pdv_item.get_length()
             self.presentation_data_value_items.append(pdv_item)
             
         self._update_parameters()
@@ -2821,6 +2860,34 @@ class PresentationDataValueItem(PDU):
         
         self._update_parameters()
 
+    def _decode_view(self, view, offset):
+        """
+        Decode the parameter values for the Item starting at `offset` in the 
+        parent PDU, the presentation data value is a slice of `view` rather 
+        than a copy
+        
+        Parameters
+        ----------
+        view : memoryview
+            The encoded parent PDU
+        offset : int
+            The offset of the start of the Item in `view`
+        
+        Returns
+        -------
+        int
+            The offset of the end of the Item
+        """
+        (self.item_length, 
+         self.presentation_context_id) = unpack_from('> I B', view, offset)
+        
+        end = offset + 4 + self.item_length
+        self.presentation_data_value = view[offset + 5:end]
+        
+        self._update_parameters()
+        
+        return end
+
     def _update_parameters(self):
         self.parameters = [self.item_length, 
                            self.presentation_context_id, 
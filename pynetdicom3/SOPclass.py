@@ -1,14 +1,21 @@
 
+from bisect import bisect_right
 import logging
+import threading
 import time
 
 from pynetdicom3.dsutils import *
 from pynetdicom3.DIMSEparameters import *
 import pynetdicom3.DIMSEprovider
 import pynetdicom3.ACSEprovider
+from pynetdicom3.utils import uid_value
 
 logger = logging.getLogger('pynetdicom.SOPclass')
 
+# The longest time (in seconds) a C-FIND Pending response is held back so that
+#   the next responses can be sent in the same P-DATA-TF PDU
+FIND_FLUSH_DELAY = 0.05
+
 def class_factory(name, uid, BaseClass):
     """
     Generates a SOP Class subclass of `BaseClass` called `name`
@@ -44,6 +51,24 @@ def _generate_service_sop_classes(class_list, service_class):
     for name in class_list.keys():
         cls = class_factory(name, class_list[name], service_class)
         globals()[cls.__name__] = cls
+        register_sop_class(cls)
+
+# {UID : SOP class}, see register_sop_class()
+_SOP_CLASSES = {}
+
+def register_sop_class(sop_class):
+    """
+    Add a SOP class to the registry used to find the SOP class for a UID, 
+    replacing any SOP class already registered with the same UID. Private SOP
+    classes need to be registered so the SCP can handle requests for them
+    
+    Parameters
+    ----------
+    sop_class : pynetdicom3.SOPclass.ServiceClass subclass
+        The SOP class, its `UID` attribute is the SOP Class UID, such as the 
+        class returned by class_factory()
+    """
+    _SOP_CLASSES[uid_value(sop_class.UID)] = sop_class
 
 
 class Status(object):
@@ -62,11 +87,50 @@ class Status(object):
         return self.Type + ' ' + self.Description
 
 
+def _status_table(cls):
+    """
+    Return the status lookup tables for a ServiceClass subclass as 
+    ({code : Status}, [range start, ...], [(range start, range end, Status), 
+    ...]), where the single code statuses go in the dict and the rest are 
+    sorted by the start of their ranges, which mustn't overlap
+    """
+    codes = {}
+    ranges = []
+    for name in dir(cls):
+        obj = getattr(cls, name)
+        if obj.__class__ != Status:
+            continue
+        
+        if len(obj.CodeRange) == 1:
+            codes.setdefault(obj.CodeRange[0], obj)
+        else:
+            ranges.append((obj.CodeRange[0], obj.CodeRange[-1], obj))
+    
+    ranges.sort(key=lambda item: item[0])
+    
+    return codes, [start for start, _, _ in ranges], ranges
+
+
 # DICOM SERVICE CLASS BASE
 class ServiceClass(object):
     """
     
     """
+    # The status lookup tables, built by _status_table() for each subclass
+    #   that defines its own statuses
+    _status_codes = {}
+    _status_starts = []
+    _status_ranges = []
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        
+        # Subclasses that don't add any statuses (such as the SOP classes)
+        #   share their parent's tables
+        if any([obj.__class__ == Status for obj in vars(cls).values()]):
+            cls._status_codes, cls._status_starts, cls._status_ranges = \
+                                                        _status_table(cls)
+
     def Code2Status(self, code):
         """
         Parameters
@@ -79,13 +143,14 @@ class ServiceClass(object):
         obj : pynetdicom3.SOPclass.Status
             The Status object for the `code`
         """
-        for dd in dir(self):
-            getattr(self, dd).__class__
-            obj = getattr(self, dd)
-            
-            if obj.__class__ == Status:
-                if code in obj.CodeRange:
-                    return obj
+        status = self._status_codes.get(code)
+        if status is not None or not isinstance(code, int):
+            return status
+        
+        # The last range starting at or before the code
+        index = bisect_right(self._status_starts, code) - 1
+        if index >= 0 and code <= self._status_ranges[index][1]:
+            return self._status_ranges[index][2]
         
         # Unknown status
         return None
@@ -148,27 +213,40 @@ class StorageServiceClass(ServiceClass):
     Success = Status('Success', '', range(0x0000, 0x0000 + 1))
 
     def SCP(self, msg):
-        try:
-            dataset = decode(msg.DataSet,
-                             self.transfersyntax.is_implicit_VR,
-                             self.transfersyntax.is_little_endian)
-        except:
-            status = self.CannotUnderstand
-            logger.error("StorageServiceClass failed to decode the dataset")
-
         # Create C-STORE response primitive
         rsp = C_STORE_ServiceParameters()
         rsp.MessageIDBeingRespondedTo = msg.MessageID
         rsp.AffectedSOPInstanceUID = msg.AffectedSOPInstanceUID
         rsp.AffectedSOPClassUID = msg.AffectedSOPClassUID
         
-        # ApplicationEntity's on_c_store callback 
-        try:
-            status = self.AE.on_c_store(dataset)
-        except Exception as e:
-            logger.exception("Exception in the ApplicationEntity.on_c_store() "
-                                                                "callback")
-            status = self.CannotUnderstand
+        # The data set has been spooled to file, leave it up to the user
+        #   whether or not it gets decoded
+        if isinstance(msg.DataSet, SpooledDataset):
+            dataset = msg.DataSet
+            dataset.transfer_syntax = self.transfersyntax
+            dataset.file.flush()
+            
+            # ApplicationEntity's on_c_store callback 
+            try:
+                status = self.AE.on_c_store(dataset)
+            except Exception as e:
+                logger.exception("Exception in the "
+                                 "ApplicationEntity.on_c_store() callback")
+                status = self.CannotUnderstand
+            finally:
+                dataset.close()
+        
+        # ApplicationEntity's on_c_store_raw callback, by default this decodes
+        #   the data set and passes it to on_c_store
+        else:
+            try:
+                status = self.AE.on_c_store_raw(self.presentation_context,
+                                                msg,
+                                                msg.DataSet.getvalue())
+            except Exception as e:
+                logger.exception("Exception in the "
+                                 "ApplicationEntity.on_c_store_raw() callback")
+                status = self.CannotUnderstand
 
         # Check that the supplied dataset UID matches the presentation context
         #   ID
@@ -473,7 +551,11 @@ class QueryRetrieveFindServiceClass(ServiceClass):
             
             logger.info('Find SCP Response: %s (Pending)' %(ii + 1))
             
-            self.DIMSE.Send(c_find_rsp, self.pcid, self.ACSE.MaxPDULength)
+            # Pack as many responses as possible into each P-DATA-TF, which
+            #   is sent once it's full, FIND_FLUSH_DELAY has passed or the 
+            #   final response is sent
+            self.DIMSE.Send(c_find_rsp, self.pcid, self.ACSE.MaxPDULength,
+                            flush=False, delay=FIND_FLUSH_DELAY)
             
             logger.debug('Find SCP Response Identifiers:')
             logger.debug('')
@@ -563,43 +645,154 @@ class QueryRetrieveMoveServiceClass(ServiceClass):
             self.DIMSE.Send(c_move_rsp, self.pcid, self.maxpdulength)
             return
 
-        # Request new association with move destination
+        # Request new association(s) with move destination
         #   need (addr, port, aet)
-        assoc = self.AE.associate(addr, port, msg.MoveDestination)
+        #   reusing established associations if the AE has a pool
+        pool = self.AE.association_pool
+        associations = []
+        for ii in range(max(1, min(self.AE.move_associations,
+                                c_move_rsp.NumberOfRemainingSuboperations))):
+            if pool is not None:
+                assoc = pool.checkout(addr, port, msg.MoveDestination)
+            else:
+                assoc = self.AE.associate(addr, port, msg.MoveDestination)
+            
+            if not assoc.is_established:
+                break
+            
+            associations.append(assoc)
         
         ii = 1
-        if assoc.is_established:
-            for dataset in matches:
-                # Send dataset via C-STORE over new association
-                status = assoc.send_c_store(dataset)
-                store_status = status.Type
-                
-                logger.info('Move SCU: Received Store SCU RSP (%s)' %store_status)
-                
-                if store_status == 'Failure':
-                    c_move_rsp.NumberOfFailedSuboperations += 1
-                elif store_status == 'Warning':
-                    c_move_rsp.NumberOfWarningSuboperations += 1
-                elif store_status == 'Success':
-                    c_move_rsp.NumberOfCompletedSuboperations += 1
-                
-                c_move_rsp.NumberOfRemainingSuboperations -= 1
-                
-                c_move_rsp.Status = int(self.Pending)
-                
-                logger.info('Move SCP Response %s (Pending)' %ii)
-                
-                self.DIMSE.Send(c_move_rsp, self.pcid, self.maxpdulength)
+        if associations:
+            sub_operations = _SubOperations(
+                                    c_move_rsp.NumberOfRemainingSuboperations)
+            
+            # The user's generator is shared between the associations
+            lock = threading.Lock()
+            def next_match():
+                while True:
+                    with lock:
+                        dataset = next(matches, None)
+                    
+                    if dataset is None:
+                        return
+                    
+                    yield dataset
+            
+            def store(assoc):
+                try:
+                    # Send datasets via C-STORE over new association
+                    for _, status in assoc.send_c_store_pipelined(
+                                                                next_match()):
+                        store_status = 'Failure'
+                        if status is not None:
+                            store_status = status.Type
+                        
+                        logger.info('Move SCU: Received Store SCU RSP (%s)'
+                                                                %store_status)
+                        sub_operations.add(store_status)
+                finally:
+                    sub_operations.finished()
+            
+            sub_operations.running = len(associations)
+            for assoc in associations:
+                thread = threading.Thread(target=store, args=(assoc,))
+                thread.daemon = True
+                thread.start()
             
-                ii += 1
+            # Only this thread sends on the C-MOVE association. Pending 
+            #   responses are sent no more than once every 
+            #   `move_pending_interval` seconds
+            reported = 0
+            last_sent = 0
+            with sub_operations.updated:
+                while sub_operations.running:
+                    if sub_operations.recorded == reported:
+                        sub_operations.updated.wait()
+                        continue
+                    
+                    delay = last_sent + self.AE.move_pending_interval - \
+                                                                time.time()
+                    if delay > 0:
+                        sub_operations.updated.wait(delay)
+                        continue
+                    
+                    sub_operations.update(c_move_rsp)
+                    c_move_rsp.Status = int(self.Pending)
+                    
+                    logger.info('Move SCP Response %s (Pending)' %ii)
+                    
+                    self.DIMSE.Send(c_move_rsp, self.pcid, self.maxpdulength)
+                    
+                    reported = sub_operations.recorded
+                    last_sent = time.time()
+                    ii += 1
+                
+                sub_operations.update(c_move_rsp)
             
-            assoc.release()
+            for assoc in associations:
+                if pool is not None:
+                    pool.checkin(assoc)
+                else:
+                    assoc.release()
         
         # Send Success C-GET-RSP to peer
         c_move_rsp.Status = int(self.Success)
         logger.info('Move SCP Response %s (Success)' %ii)
         self.DIMSE.Send(c_move_rsp, self.pcid, self.maxpdulength)
 
+
+class _SubOperations(object):
+    """
+    Thread-safe counts of the C-STORE sub-operations of a C-MOVE, updated by
+    each of the associations to the move destination
+    
+    Attributes
+    ----------
+    recorded : int
+        The number of sub-operations that have completed
+    running : int
+        The number of associations still performing sub-operations
+    updated : threading.Condition
+        Notified whenever a sub-operation completes or an association
+        finishes, must be held when reading the counts
+    """
+    def __init__(self, remaining):
+        self.remaining = remaining
+        self.completed = 0
+        self.failed = 0
+        self.warning = 0
+        self.recorded = 0
+        self.running = 0
+        self.updated = threading.Condition()
+    
+    def add(self, store_status):
+        """ Record the result of a sub-operation """
+        with self.updated:
+            if store_status == 'Success':
+                self.completed += 1
+            elif store_status == 'Warning':
+                self.warning += 1
+            else:
+                self.failed += 1
+            
+            self.remaining -= 1
+            self.recorded += 1
+            self.updated.notify()
+    
+    def finished(self):
+        """ Record that an association has no more sub-operations to do """
+        with self.updated:
+            self.running -= 1
+            self.updated.notify()
+    
+    def update(self, primitive):
+        """ Set the sub-operation counts of a C-MOVE response primitive """
+        primitive.NumberOfRemainingSuboperations = max(0, self.remaining)
+        primitive.NumberOfCompletedSuboperations = self.completed
+        primitive.NumberOfFailedSuboperations = self.failed
+        primitive.NumberOfWarningSuboperations = self.warning
+
 class QueryRetrieveGetServiceClass(ServiceClass):
     OutOfResourcesNumberOfMatches = Status('Failure',
                                            'Refused: Out of resources - Unable '
@@ -974,23 +1167,17 @@ QR_CLASS_LIST = []
 for class_list in [QR_FIND_CLASS_LIST, QR_MOVE_CLASS_LIST, QR_GET_CLASS_LIST]:
     QR_CLASS_LIST.extend(class_list)
 
-d = dir()
-
 def UID2SOPClass(UID):
     """
     Parameters
     ----------
-    UID - str
-        The class UID as a string
+    UID - str or pydicom.uid.UID
+        The class UID
     
     Returns
     -------
-    SOPClass object corresponding to the given UID
+    SOPClass object corresponding to the given UID, or None if no SOP class
+    with the UID has been registered
     """
-    for ss in d:
-        if hasattr(eval(ss), 'UID'):
-            tmpuid = getattr(eval(ss), 'UID')
-            if tmpuid == UID:
-                return eval(ss)
-    return None
+    return _SOP_CLASSES.get(uid_value(UID))
 
@@ -9,12 +9,16 @@ pynetdicom_uid_prefix = '1.2.826.0.1.3680043.9.3811.' + \
 
 from pynetdicom3.applicationentity import ApplicationEntity as AE
 from pynetdicom3.association import Association
+from pynetdicom3.engine import AssociationEngine
+from pynetdicom3.aio import AsyncAssociation
+from pynetdicom3.pool import AssociationPool
 from pynetdicom3.ACSEprovider import ACSEServiceProvider as ACSE
 from pynetdicom3.DIMSEprovider import DIMSEServiceProvider as DIMSE
 from pynetdicom3.DULprovider import DULServiceProvider as DUL
 from pynetdicom3.SOPclass import STORAGE_CLASS_LIST as StorageSOPClassList
 from pynetdicom3.SOPclass import QR_CLASS_LIST as QueryRetrieveSOPClassList
 from pynetdicom3.SOPclass import VerificationSOPClass
+from pynetdicom3.SOPclass import register_sop_class
 
 # Set up logging system for the whole package.  In each module, set
 # logger=logging.getLogger('pynetdicom') and the same instance will be
@@ -0,0 +1,774 @@
+# This module implements an asyncio front end for associations. The DUL state
+# machine, PDU codec and DIMSE message encoding are the same ones used by the
+# threaded Association, only the transport (asyncio streams) and the waiting
+# on the peer (coroutines rather than blocking queue reads) differ.
+
+import asyncio
+import logging
+import queue
+from struct import unpack
+
+from pynetdicom3.association import Association
+from pynetdicom3.dsutils import decode
+from pynetdicom3.DULprovider import pdu_length_allowed
+from pynetdicom3.primitives import A_ASSOCIATE, A_RELEASE, A_ABORT, A_P_ABORT, \
+                                   P_DATA
+from pynetdicom3.SOPclass import VerificationServiceClass, \
+                                 StorageServiceClass, \
+                                 UID2SOPClass
+
+logger = logging.getLogger('pynetdicom.aio')
+
+# How often (in seconds) the ARTIM and idle timers are checked
+TIMER_INTERVAL = 0.5
+
+
+class _StreamSocket(object):
+    """
+    Presents an asyncio.StreamWriter as the socket the DUL state machine
+    actions send PDUs on and close. Writes are buffered by the transport,
+    AsyncAssociation drains the buffer once the state machine is done.
+    """
+    def __init__(self, writer):
+        self.writer = writer
+
+    def sendall(self, data):
+        self.writer.write(data)
+
+    def close(self):
+        self.writer.close()
+
+
+class LoopExecutor(object):
+    """
+    Submits functions to the default executor of an AsyncAssociation's event
+    loop. Unlike loop.run_in_executor(), submit() may be called from any
+    thread, which lets an SCP running on the executor submit the next one.
+
+    Parameters
+    ----------
+    assoc - pynetdicom3.aio.AsyncAssociation
+        The association, its event loop is used once it has started
+    """
+    def __init__(self, assoc):
+        self.assoc = assoc
+
+    def submit(self, fn):
+        loop = self.assoc._loop
+        try:
+            loop.call_soon_threadsafe(loop.run_in_executor, None, fn)
+        except RuntimeError:
+            # The event loop has been closed
+            pass
+
+
+class AsyncAssociation(object):
+    """
+    An association driven by an asyncio event loop rather than by its own
+    Association and DUL threads.
+
+    The underlying pynetdicom3.association.Association is created with the
+    AsyncAssociation as its engine so that neither of its threads is started,
+    PDUs read from the asyncio stream are then decoded and passed to the DUL
+    state machine and any primitives the state machine passes up are handled
+    by the coroutines waiting on them.
+
+    When requesting an association:
+        assoc = await ae.associate_async(addr, port)
+        status = await assoc.send_c_echo()
+        async for status, ds in assoc.send_c_find(query):
+            ...
+        await assoc.release()
+
+    When acting as an SCP one AsyncAssociation is created for each connection
+    accepted by the server started by ae.start_async(), the service class SCPs
+    (and so the AE's callbacks) then run one at a time on the event loop's
+    default executor, or on the AE's executor if it has one, so they don't
+    block the loop's other connections.
+
+    Parameters
+    ----------
+    local_ae - pynetdicom3.applicationentity.ApplicationEntity
+        The local AE instance
+    peer_ae - dict, optional
+        If the local AE is acting as an SCU this is the AE title, host and port
+        of the peer AE that we want to Associate with
+    max_pdu - int, optional
+        The maximum PDU receive size in bytes for the association. A value of 0
+        means no maximum size (default: 16382 bytes).
+    ext_neg - list of extended negotiation parameters objects, optional
+        If the association requires an extended negotiation then `ext_neg` is
+        a list containing the negotiation objects (default: None)
+    reader - asyncio.StreamReader, optional
+        If the local AE is acting as an SCP, the reader for the accepted
+        connection
+    writer - asyncio.StreamWriter, optional
+        If the local AE is acting as an SCP, the writer for the accepted
+        connection
+
+    Attributes
+    ----------
+    ae - pynetdicom3.applicationentity.ApplicationEntity
+        The local AE
+    assoc - pynetdicom3.association.Association
+        The association being driven
+    executor - pynetdicom3.aio.LoopExecutor
+        Runs the service class SCPs, see Association._get_executor()
+    """
+    def __init__(self, local_ae, peer_ae=None, max_pdu=16382, ext_neg=None,
+                                                    reader=None, writer=None):
+        self.ae = local_ae
+        self.executor = LoopExecutor(self)
+
+        # The event loop running the association, set once it's started
+        self._loop = None
+        self._reader = reader
+        self._writer = writer
+
+        # Set whenever the state machine has run so that coroutines waiting on
+        #   the DUL can check for new primitives
+        self._changed = asyncio.Event()
+        # True once the connection has been closed
+        self._closed = False
+        # True while a call to _on_wakeup() is scheduled
+        self._wakeup_pending = False
+
+        self._reader_task = None
+        self._timer_task = None
+
+        client_socket = None
+        if writer is not None:
+            client_socket = _StreamSocket(writer)
+
+        self.assoc = Association(local_ae,
+                                 client_socket,
+                                 peer_ae,
+                                 acse_timeout=local_ae.acse_timeout,
+                                 dimse_timeout=local_ae.dimse_timeout,
+                                 max_pdu=max_pdu,
+                                 ext_neg=ext_neg,
+                                 engine=self)
+
+    @property
+    def dul(self):
+        return self.assoc.dul
+
+    @property
+    def is_established(self):
+        return self.assoc.is_established
+
+    @property
+    def is_refused(self):
+        return self.assoc.is_refused
+
+    @property
+    def is_aborted(self):
+        return self.assoc.is_aborted
+
+    @property
+    def is_released(self):
+        return self.assoc.is_released
+
+    def wakeup(self, assoc=None):
+        """
+        Called when a primitive has been sent to the DUL, possibly from a
+        thread other than the event loop's (e.g. by a C-GET SCP), so that the
+        event loop passes it to the state machine
+
+        Parameters
+        ----------
+        assoc - pynetdicom3.association.Association, optional
+            The association to service
+        """
+        if self._wakeup_pending or self._closed or self._loop is None:
+            return
+
+        self._wakeup_pending = True
+        try:
+            self._loop.call_soon_threadsafe(self._on_wakeup)
+        except RuntimeError:
+            # The event loop has been closed
+            pass
+
+    async def release(self):
+        """
+        Issue an A-RELEASE request to the peer and wait for the association to
+        be released
+        """
+        if not self.is_established:
+            raise RuntimeError("The association with a peer SCP must be "
+                "established before it can be released")
+
+        # Stops _step() taking the peer's confirmation for a release request
+        self.assoc.is_established = False
+
+        logger.info("Releasing Association")
+        self.dul.Send(A_RELEASE())
+        self._process()
+        await self._drain()
+
+        await self._wait_for_primitive(self.assoc.acse_timeout or None)
+        self.dul.Receive()
+
+        self.assoc.is_released = True
+
+        # The state machine closes the connection once the release is
+        #   confirmed (AR-3)
+        if self._reader_task is not None:
+            await self._reader_task
+
+    async def abort(self):
+        """
+        Issue an A-ABORT request to the peer
+
+        DUL service user association abort. Always gives the source as the
+        DUL service user and sets the abort reason to 0x00 (not significant)
+
+        See PS3.8, 7.3-4 and 9.3.8.
+        """
+        self.assoc.abort()
+        self._process()
+        await self._drain()
+
+    # DIMSE-C services provided by the Association
+    async def send_c_echo(self, msg_id=1):
+        """
+        Send a C-ECHO message to the peer AE to verify end-to-end communication
+
+        Parameters
+        ----------
+        msg_id - int, optional
+            The message ID to use (default: 1)
+
+        Returns
+        -------
+        status : pynetdicom3.SOPclass.Status or None
+            Returns None if no valid presentation context or no response
+            from the peer, Success (0x0000) otherwise.
+        """
+        if not self.is_established:
+            raise RuntimeError("The association with a peer SCP must be "
+                "established before sending a C-ECHO request")
+
+        # Service Class - used to determine Status
+        service_class = VerificationServiceClass()
+
+        primitive, context_id = self.assoc._c_echo_request(msg_id)
+        if primitive is None:
+            return None
+
+        await self._send_dimse(primitive, context_id)
+
+        rsp, _ = await self._receive_dimse()
+        if rsp is None:
+            return None
+
+        return service_class.Code2Status(rsp.Status)
+
+    async def send_c_store(self, dataset, msg_id=1, priority=2):
+        """
+        Send a C-STORE request message to the peer AE Storage SCP, see
+        pynetdicom3.association.Association.send_c_store()
+
+        Parameters
+        ----------
+        dataset - pydicom.Dataset
+            The DICOM dataset to send to the peer
+        msg_id - int, optional
+            The message ID, must be between 0 and 65535, inclusive. (default: 1)
+        priority : int, optional
+            The C-STORE operation priority (if supported by the peer), one of:
+                2 - Low (default)
+                1 - High
+                0 - Medium
+
+        Returns
+        -------
+        status : pynetdicom3.SOPclass.Status or None
+            The status for the requested C-STORE operation (see PS3.4 Annex
+            B.2.3), None if the DIMSE service timed out before receiving a
+            response
+        """
+        # Service Class - used to determine Status
+        service_class = StorageServiceClass()
+
+        # pydicom can only handle uncompressed transfer syntaxes for conversion
+        if not dataset._is_uncompressed_transfer_syntax():
+            logger.warning('Unable to send the dataset due to pydicom not '
+                                        'supporting compressed datasets')
+            logger.error('Sending file failed')
+            return service_class.CannotUnderstand
+
+        if not self.is_established:
+            raise RuntimeError("The association with a peer SCP must be "
+                    "established before sending a C-STORE request")
+
+        primitive, context_id = self.assoc._c_store_request(dataset, msg_id,
+                                                            priority)
+        if primitive is None:
+            return service_class.CannotUnderstand
+
+        await self._send_dimse(primitive, context_id)
+
+        # Wait for C-STORE response primitive
+        rsp, _ = await self._receive_dimse()
+
+        status = None
+        if rsp is not None:
+            status = service_class.Code2Status(rsp.Status)
+
+        return status
+
+    async def send_c_find(self, dataset, msg_id=1, priority=2,
+                                                            query_model='W'):
+        """
+        Send a C-FIND request message to the peer AE, see
+        pynetdicom3.association.Association.send_c_find()
+
+        Parameters
+        ----------
+        dataset : pydicom.Dataset
+            The DICOM dataset to containing the Key Attributes the peer AE
+            should perform the match against
+        msg_id : int, optional
+            The message ID
+        priority : int, optional
+            The C-FIND operation priority (if supported by the peer), one of:
+                2 - Low (default)
+                1 - High
+                0 - Medium
+        query_model : str, optional
+            The Query/Retrieve Information Model to use, one of the following:
+                'W' - Modality Worklist Information - FIND (default)
+                'P' - Patient Root Information Model - FIND
+                'S' - Study Root Information Model - FIND
+                'O' - Patient Study Only Information Model - FIND
+
+        Yields
+        ------
+        status : pynetdicom3.SOPclass.Status
+            The resulting status(es) from the C-FIND operation
+        dataset : pydicom.dataset.Dataset
+            The resulting dataset(s) from the C-FIND operation
+        """
+        if not self.is_established:
+            raise RuntimeError("The association with a peer SCP must be "
+                "established before sending a C-FIND request")
+
+        service_class, primitive, context_id, transfer_syntax = \
+            self.assoc._c_find_request(dataset, msg_id, priority, query_model)
+        if primitive is None:
+            yield service_class.IdentifierDoesNotMatchSOPClass, None
+            return
+
+        await self._send_dimse(primitive, context_id)
+
+        # Get the responses from the peer
+        while True:
+            rsp, _ = await self._receive_dimse()
+            if rsp is None:
+                return
+
+            # Decode the dataset
+            ds = decode(rsp.Identifier,
+                        transfer_syntax.is_implicit_VR,
+                        transfer_syntax.is_little_endian)
+
+            # Status may be 'Failure', 'Cancel', 'Success' or 'Pending'
+            status = service_class.Code2Status(rsp.Status)
+
+            yield status, ds
+
+            if status.Type != 'Pending':
+                return
+
+    async def _request(self):
+        """ Request an association with the peer AE (Requestor only) """
+        assoc = self.assoc
+        ae = self.ae
+
+        if ae.presentation_contexts_scu == []:
+            logger.error("No presentation contexts set for the SCU")
+            self._finish()
+            return
+
+        try:
+            self._reader, self._writer = await asyncio.open_connection(
+                                                    assoc.peer_ae['Address'],
+                                                    assoc.peer_ae['Port'])
+        except OSError:
+            logger.error("Association Request Failed: Failed to establish "
+                                                                "association")
+            logger.error("TCP Initialisation Error: Connection refused")
+            self._finish()
+            return
+
+        self.dul.scu_socket = _StreamSocket(self._writer)
+        self._start()
+
+        local_ae = {'Address' : ae.address,
+                    'Port'    : ae.port,
+                    'AET'     : ae.ae_title}
+
+        # Asynchronous Operations Window negotiation (optional)
+        user_information, async_ops = assoc._user_information()
+
+        assoc_rq = assoc.acse._build_associate_rq(
+                                        local_ae,
+                                        assoc.peer_ae,
+                                        assoc.local_max_pdu,
+                                        ae.presentation_contexts_scu,
+                                        userspdu=user_information or None)
+
+        # The transport connection is already open so skip straight to
+        #   sending the A-ASSOCIATE-RQ (Sta4 + Evt2 -> AE-2)
+        logger.info("Requesting Association")
+        self.dul.primitive = assoc_rq
+        self.dul.state_machine.transition('Sta4')
+        self.dul.event_queue.put('Evt2')
+        self._process()
+        await self._drain()
+
+        # Receive the A-ASSOCIATE confirmation or A-ABORT/A-P-ABORT
+        assoc_rsp = None
+        if await self._wait_for_primitive(assoc.acse_timeout or None):
+            assoc_rsp = self.dul.Receive()
+
+        is_accepted, assoc_rsp = assoc.acse._check_associate_rsp(
+                                            assoc_rsp,
+                                            ae.presentation_contexts_scu)
+
+        # Association was accepted or rejected
+        if isinstance(assoc_rsp, A_ASSOCIATE):
+            if is_accepted:
+                assoc.debug_association_accepted(assoc_rsp)
+                ae.on_association_accepted(assoc_rsp)
+
+                # No acceptable presentation contexts
+                if assoc.acse.presentation_contexts_accepted == []:
+                    logger.error("No Acceptable Presentation Contexts")
+                    assoc.acse.Abort(0x02, 0x00)
+                    self._process()
+                    await self._drain()
+                    self._close()
+                    return
+
+                assoc._negotiate_window(async_ops, assoc_rsp)
+
+                # Build supported SOP Classes for the Association
+                assoc.scu_supported_sop = []
+                for context in assoc.acse.presentation_contexts_accepted:
+                    assoc.scu_supported_sop.append(
+                                   (context.ID,
+                                    UID2SOPClass(context.AbstractSyntax),
+                                    context.TransferSyntax[0]))
+
+                assoc._index_contexts()
+                assoc.is_established = True
+                return
+
+            ae.on_association_rejected(assoc_rsp)
+            assoc.debug_association_rejected(assoc_rsp)
+            assoc.is_refused = True
+
+        # Association was aborted by peer
+        elif isinstance(assoc_rsp, A_ABORT):
+            ae.on_association_aborted(assoc_rsp)
+            assoc.debug_association_aborted(assoc_rsp)
+            assoc.is_aborted = True
+
+        # Association was aborted by DUL provider
+        elif isinstance(assoc_rsp, A_P_ABORT):
+            assoc.is_aborted = True
+
+        self._close()
+
+    async def _serve(self):
+        """ Serve the association requested by the peer (Acceptor only) """
+        self._start(read=False)
+
+        # Evt5 was queued when the DUL was created
+        self._process()
+
+        await self._read_pdus()
+
+    def _start(self, read=True):
+        """ Start checking the timers and, if `read` is True, reading PDUs """
+        self._loop = asyncio.get_running_loop()
+        self._timer_task = self._loop.create_task(self._watch_timers())
+        if read:
+            self._reader_task = self._loop.create_task(self._read_pdus())
+
+    def _on_wakeup(self):
+        """ Process the primitives that woke the association up """
+        self._wakeup_pending = False
+        if not self._closed:
+            self._process()
+
+    def _process(self):
+        """
+        Run the state machine until there are no more events or primitives
+        from the service user, letting the association handle whatever the DUL
+        passes up to it
+        """
+        dul = self.dul
+        while True:
+            try:
+                event = dul.event_queue.get(False)
+            except queue.Empty:
+                # Each primitive has to be processed before the next one
+                #   replaces it as dul.primitive
+                if dul.CheckIncomingPrimitive():
+                    if dul._idle_timer is not None:
+                        dul._idle_timer.restart()
+                    continue
+
+                if self._step():
+                    continue
+
+                break
+
+            dul.state_machine.do_action(event)
+
+        self._changed.set()
+
+    def _step(self):
+        """
+        Handle whatever the DUL has passed up to the association that isn't
+        being waited on by a coroutine
+
+        Returns
+        -------
+        bool
+            True if anything was processed, False otherwise
+        """
+        assoc = self.assoc
+        if assoc.mode == 'Acceptor':
+            return assoc._acceptor_step()
+
+        if not assoc.is_established:
+            return False
+
+        # Check for release request
+        if assoc.acse.CheckRelease():
+            assoc.ae.on_association_released()
+            assoc.debug_association_released()
+            assoc.kill()
+            return True
+
+        # Check for abort
+        if assoc.acse.CheckAbort():
+            assoc.ae.on_association_aborted()
+            assoc.debug_association_aborted()
+            assoc.is_aborted = True
+            assoc.kill()
+            return True
+
+        return False
+
+    async def _read_pdus(self):
+        """ Read PDUs from the peer until the connection is closed """
+        dul = self.dul
+        try:
+            while True:
+                # Leave the data with the peer until there's memory for it,
+                #   the stream stops reading once its own buffer is full. The
+                #   local AE wakes us up once it has memory again
+                while dul._reading_paused() and not self._closed:
+                    self._changed.clear()
+                    if self.ae._wait_for_memory(self.wakeup):
+                        await self._changed.wait()
+
+                header = await self._reader.readexactly(6)
+                length = unpack('>L', header[2:])[0]
+
+                # Longer than the local maximum PDU length - Evt19, the rest
+                #   of the PDU is never read
+                max_pdu = getattr(self.assoc, 'local_max_pdu', 0)
+                if not pdu_length_allowed(header[0], length, max_pdu):
+                    logger.error("Received a PDU longer than the local "
+                                 "maximum PDU length, aborting the "
+                                 "association")
+                    dul.event_queue.put('Evt19')
+                    self._process()
+                    await self._drain()
+                    break
+
+                bytestream = header + await self._reader.readexactly(length)
+
+                # Unrecognised PDU type - Evt19 in the State Machine
+                if header[0] not in [0x01, 0x02, 0x03, 0x04, 0x05, 0x06, 0x07]:
+                    logger.error("Unrecognised PDU type: 0x%02x" %header[0])
+                    dul.event_queue.put('Evt19')
+                else:
+                    dul._decode_pdu(bytestream)
+                    if dul._idle_timer is not None:
+                        dul._idle_timer.restart()
+
+                self._process()
+                await self._drain()
+
+        except (asyncio.IncompleteReadError, OSError):
+            pass
+        except Exception as e:
+            logger.error("Failed to serve an association: %s" %e)
+        finally:
+            self._connection_lost()
+
+    async def _watch_timers(self):
+        """ Check the ARTIM and idle timers every TIMER_INTERVAL seconds """
+        dul = self.dul
+        while not self._closed:
+            await asyncio.sleep(TIMER_INTERVAL)
+
+            if dul.CheckTimer():
+                dul.kill = True
+
+            # The acceptor checks its idle timer in _step()
+            elif (self.assoc.mode == 'Requestor' and self.is_established
+                                            and dul.idle_timer_expired()):
+                self.assoc.abort()
+
+            self._process()
+            await self._drain()
+
+    async def _wait_for_primitive(self, timeout=None):
+        """
+        Wait for the DUL to pass a primitive up to the service user
+
+        Parameters
+        ----------
+        timeout - float or None, optional
+            The maximum number of seconds to wait, None to wait until the
+            connection is closed
+
+        Returns
+        -------
+        bool
+            True if a primitive is available, False if the wait timed out or
+            the connection was closed
+        """
+        loop = asyncio.get_running_loop()
+        end = None
+        if timeout is not None:
+            end = loop.time() + timeout
+
+        while self.dul.Peek() is None:
+            if self._closed:
+                return False
+
+            remaining = None
+            if end is not None:
+                remaining = end - loop.time()
+                if remaining <= 0:
+                    return False
+
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+
+        return True
+
+    async def _send_dimse(self, primitive, context_id):
+        """ Send a DIMSE message to the peer """
+        self.assoc.dimse.Send(primitive, context_id,
+                                            self.assoc.acse.MaxPDULength)
+        self._process()
+        await self._drain()
+
+    async def _receive_dimse(self):
+        """
+        Wait for a complete DIMSE message from the peer
+
+        Returns
+        -------
+        pynetdicom3.DIMSEparameters, int or None, None
+            The DIMSE message and its presentation context ID, None, None if
+            the DIMSE timeout expired, the connection was closed or the DUL
+            passed up something other than a P-DATA primitive
+        """
+        timeout = self.assoc.dimse_timeout or None
+        while True:
+            if not await self._wait_for_primitive(timeout):
+                return None, None
+
+            if not isinstance(self.dul.Peek(), P_DATA):
+                return None, None
+
+            msg, context_id = self.assoc.dimse.Receive(False)
+            if msg is not None:
+                return msg, context_id
+
+    async def _drain(self):
+        """ Wait for the PDUs written by the state machine to be sent """
+        try:
+            await self._writer.drain()
+        except OSError:
+            # The connection has been lost, _read_pdus() will deal with it
+            pass
+
+    def _close(self):
+        """ Close the connection """
+        if self._writer is not None:
+            self._writer.close()
+
+    def _connection_lost(self):
+        """ Let the state machine know the connection has gone and clean up """
+        if self._closed:
+            return
+
+        dul = self.dul
+        if dul.state_machine.current_state != 'Sta1':
+            dul.event_queue.put('Evt17')
+            try:
+                self._process()
+            except Exception as e:
+                logger.error("Failed to close an association: %s" %e)
+
+        self._close()
+        self._finish()
+
+    def _finish(self):
+        """ Mark the association as done """
+        self._closed = True
+        if self._timer_task is not None:
+            self._timer_task.cancel()
+
+        assoc = self.assoc
+        assoc.dul.kill = True
+        assoc._Kill = True
+        assoc.is_established = False
+        assoc._engine_done = True
+        assoc._close_spooled()
+
+        self.ae._association_ended(assoc)
+
+        # Wake any coroutines waiting on the association
+        self._changed.set()
+
+
+async def serve_association(local_ae, reader, writer):
+    """
+    Serve an association requested by a peer AE over an accepted asyncio
+    connection, suitable for use as an asyncio.start_server() callback (see
+    ApplicationEntity.start_async())
+
+    Parameters
+    ----------
+    local_ae - pynetdicom3.applicationentity.ApplicationEntity
+        The local AE instance
+    reader - asyncio.StreamReader
+        The reader for the accepted connection
+    writer - asyncio.StreamWriter
+        The writer for the accepted connection
+    """
+    assoc = AsyncAssociation(local_ae,
+                             max_pdu=local_ae.maximum_pdu_size,
+                             reader=reader,
+                             writer=writer)
+
+    local_ae._add_association(assoc.assoc)
+
+    await assoc._serve()
@@ -1,21 +1,30 @@
 
-import gc
+import asyncio
+from io import BytesIO
 import logging
+import multiprocessing
 import os
 import platform
-import select
+import selectors
+import signal
 import socket
 from struct import pack
 import sys
+import tempfile
+import threading
 import time
 import warnings
 
 from pydicom.uid import ExplicitVRLittleEndian, ImplicitVRLittleEndian, \
     ExplicitVRBigEndian, UID, InvalidUID
 
+from pynetdicom3.aio import AsyncAssociation, serve_association
 from pynetdicom3.association import Association
 from pynetdicom3.DULprovider import DULServiceProvider
-from pynetdicom3.utils import PresentationContext, validate_ae_title
+from pynetdicom3.dsutils import SpooledDataset, decode
+from pynetdicom3.engine import AssociationEngine
+from pynetdicom3.utils import PresentationContext, SelectorWakeup, \
+    validate_ae_title
 
 logger = logging.getLogger('pynetdicom')
 handler = logging.StreamHandler()
@@ -120,6 +129,10 @@ class ApplicationEntity(object):
         The currently active associations between the local and peer AEs
     address : str
         The local AE's TCP/IP address
+    association_pool : pynetdicom3.pool.AssociationPool or None
+        If set then the associations used for the C-STORE sub-operations of
+        a C-MOVE are taken from and returned to the pool, rather than being
+        requested and released for each C-MOVE (SCP only) (default: None)
     ae_title : str or bytes
         The local AE's title
     client_socket : socket.socket
@@ -127,11 +140,51 @@ class ApplicationEntity(object):
     dimse_timeout : int
         The maximum amount of time (in seconds) to wait for DIMSE related
         messages. A value of 0 means no timeout. (default: 0)
+    memory_budget : int
+        The maximum number of bytes of received P-DATA held by the AE's 
+        associations, both while messages are being received and while 
+        they're waiting on or being handled by the executor. Once it's used
+        up the associations stop reading from their peers, letting TCP flow
+        control hold the peers back, until enough has been released. An 
+        association that's part way through receiving a message carries on
+        so the message can be completed. When running with worker processes
+        the budget applies to each worker. A value of 0 means no limit 
+        (default: 0)
+    listen_backlog : int
+        The maximum number of connections waiting to be accepted, any more 
+        are refused by the operating system (SCP only) 
+        (default: socket.SOMAXCONN)
+    executor : concurrent.futures.Executor or None
+        If set then the service class SCPs for incoming requests are run on
+        the executor rather than by the association, which carries on
+        reading from the peer in the meantime. Requests on the same 
+        association are still handled one at a time and responded to in 
+        order, while the executor's worker count caps the number of requests 
+        handled at once across all associations. The SCPs share the 
+        association with the AE so the executor must run in the same 
+        process, such as a ThreadPoolExecutor (SCP only) (default: None)
+    move_associations : int
+        The number of associations opened to the move destination to send
+        the C-STORE sub-operations of a C-MOVE in parallel (SCP only) 
+        (default: 1)
+    move_pending_interval : float
+        The minimum time (in seconds) between the Pending responses sent 
+        while the C-STORE sub-operations of a C-MOVE are in progress. A 
+        value of 0 sends a Pending response after every sub-operation (SCP 
+        only) (default: 0)
     network_timeout : int
         The maximum amount of time (in seconds) to wait for network messages. 
         A value of 0 means no timeout. (default: 60)
     maximum_associations : int
         The maximum number of simultaneous associations (default: 2)
+    maximum_operations_invoked : int
+        The maximum number of outstanding DIMSE requests the AE will invoke 
+        on an association, proposed using Asynchronous Operations Window
+        negotiation. A value of 0 means unlimited. (default: 1)
+    maximum_operations_performed : int
+        The maximum number of outstanding DIMSE requests the AE will perform
+        on an association, proposed using Asynchronous Operations Window
+        negotiation. A value of 0 means unlimited. (default: 1)
     maximum_pdu_size : int
         The maximum PDU receive size in bytes. A value of 0 means there is no 
         maximum size (default: 16382)
@@ -149,6 +202,15 @@ class ApplicationEntity(object):
     require_called_aet : str
         If not empty str the called AE title must match `required_called_aet`
         (SCP only)
+    spool_c_store : bool
+        If True then the data sets of incoming C-STORE requests are written
+        to file as they're received and on_c_store() is passed a 
+        pynetdicom3.dsutils.SpooledDataset rather than a decoded pydicom 
+        Dataset (SCP only) (default: False)
+    spool_directory : str or None
+        The directory that spooled C-STORE data sets are written to by 
+        on_c_store_spool(), if None then the default temporary directory is 
+        used (SCP only)
     scu_supported_sop : List of pydicom.uid.UID
         The SOP Classes supported when acting as an SCU (SCU only)
     scp_supported_sop : List of pydicom.uid.UID
@@ -189,6 +251,29 @@ class ApplicationEntity(object):
         # Default maximum PDU receive size (in bytes)
         self.maximum_pdu_size = 16382
         
+        # Connections waiting to be accepted by the SCP
+        self.listen_backlog = socket.SOMAXCONN
+        
+        # Asynchronous Operations Window - 1 means no asynchronous operations
+        #   and 0 means unlimited
+        self.maximum_operations_invoked = 1
+        self.maximum_operations_performed = 1
+        
+        # C-MOVE sub-operations can be sent over several associations at once
+        #   and their Pending responses rate limited
+        self.move_associations = 1
+        self.move_pending_interval = 0
+        
+        # Reuse established associations with move destinations
+        self.association_pool = None
+        
+        # Run the SCPs for incoming requests on an executor's workers
+        self.executor = None
+        
+        # Stop reading from peers while this many bytes of received data are
+        #   buffered - 0 means no limit
+        self.memory_budget = 0
+        
         # Default timeouts - 0 means no timeout
         self.acse_timeout = 0
         self.network_timeout = 60
@@ -198,6 +283,11 @@ class ApplicationEntity(object):
         self.require_calling_aet = ''
         self.require_called_aet = ''
         
+        # Write C-STORE data sets to file as they're received rather than
+        #   decoding them in memory, None uses the default temporary directory
+        self.spool_c_store = False
+        self.spool_directory = None
+        
         # List of active association objects
         self.active_associations = []
         
@@ -250,17 +340,59 @@ class ApplicationEntity(object):
                     break
 
         self.local_socket = None
+        
+        # Serves the associations when running with engine loops
+        self._engine = None
+        
+        # Lets stop() interrupt the wait for connections
+        self._waker = None
+        
+        # Guards active_associations against associations ending in their
+        #   own threads
+        self._associations_lock = threading.Lock()
+        
+        # When running with worker processes, the supervisor's {pid : slot}
+        #   for the workers and the number of active associations in each 
+        #   worker, indexed by slot
+        self._workers = {}
+        self._workers_lock = threading.Lock()
+        self._worker_counts = None
+        self._worker_slot = None
+        
+        # The number of bytes of received data counted against the memory
+        #   budget
+        self._memory_used = 0
+        self._memory_lock = threading.Lock()
+        # Called once memory is released, see _wait_for_memory()
+        self._memory_waiters = []
 
         # Used to terminate AE when running as an SCP
         self._quit = False
 
-    def start(self):
+    def start(self, engine_loops=0, workers=0):
         """
         When running the AE as an SCP this needs to be called to start the main 
         loop, it listens for connections on `local_socket` and if they request
         association starts a new Association thread
         
         Successful associations get added to `active_associations`
+        
+        Parameters
+        ----------
+        engine_loops : int, optional
+            If 0 (default) then each association runs in its own thread (plus
+            a thread for its DUL provider). Otherwise the associations are 
+            served by `engine_loops` selector loops, each running in a single
+            thread, so that a large number of simultaneous associations don't 
+            require a large number of threads (see pynetdicom3.engine)
+        workers : int, optional
+            If 0 (default) then the associations are served by this process.
+            Otherwise `workers` worker processes are forked which accept 
+            connections on the shared listen socket and serve the 
+            associations (using `engine_loops` if set) while this process 
+            supervises them, restarting any that die. `maximum_associations`
+            applies to the associations across all the workers and the AE 
+            callbacks are called in the worker processes (POSIX only)
         """
 
         # If the SCP has no supported SOP Classes then there's no point 
@@ -274,32 +406,155 @@ class ApplicationEntity(object):
 
         # Bind the local_socket to the specified listen port
         self._bind_socket()
+        
+        if workers:
+            self._supervise(workers, engine_loops)
+        else:
+            self._serve(engine_loops)
 
-        no_loops = 0
+    def _serve(self, engine_loops):
+        """
+        AE.start(): Accept connections on the local socket and serve the 
+        associations until the AE is stopped
+        """
+        if engine_loops:
+            self._engine = AssociationEngine(self, engine_loops)
+            self._engine.start()
+
+        selector = selectors.DefaultSelector()
+        selector.register(self.local_socket, selectors.EVENT_READ)
+        self._waker = SelectorWakeup(selector)
+        
+        # Associations remove themselves from active_associations when they
+        #   end so there's nothing to do until a connection arrives
+        try:
+            while not self._quit:
+                try:
+                    for key, _ in selector.select():
+                        if key.fileobj is self.local_socket and \
+                                                        not self._quit:
+                            # Accept any connections and append their
+                            #   associations to self.active_associations
+                            self._monitor_socket()
+                
+                except KeyboardInterrupt:
+                    self.stop()
+        finally:
+            selector.close()
+            self._waker.close()
+
+    def _supervise(self, workers, engine_loops):
+        """
+        AE.start(): Fork the worker processes that serve the associations and
+        restart any that die until the AE is stopped
+        """
+        if not hasattr(os, 'fork'):
+            logger.error("Worker processes are only supported on POSIX "
+                         "systems")
+            return
+        
+        # The workers can't see each other's active_associations
+        self._worker_counts = multiprocessing.RawArray('i', workers)
+        
+        with self._workers_lock:
+            for slot in range(workers):
+                self._workers[self._fork_worker(slot, engine_loops)] = slot
+        
         while True:
             try:
                 time.sleep(0.1)
                 
-                if self._quit:
-                    break
-                
-                # Monitor client_socket for association requests and
-                #   appends any associations to self.active_associations
-                self._monitor_socket()
-                
-                # Delete dead associations
-                self._cleanup_associations()
-
-                # Every 50 loops run the garbage collection
-                if no_loops % 51 == 0:
-                    gc.collect()
-                    no_loops = 0
-                
-                no_loops += 1
+                with self._workers_lock:
+                    if self._quit:
+                        break
+                    
+                    pid, status = os.waitpid(-1, os.WNOHANG)
+                    if pid not in self._workers:
+                        continue
+                    
+                    slot = self._workers.pop(pid)
+                    self._worker_counts[slot] = 0
+                    logger.warning("SCP worker process %s exited with status "
+                                   "%s, restarting" %(pid, status))
+                    
+                    self._workers[self._fork_worker(slot, engine_loops)] = slot
             
             except KeyboardInterrupt:
                 self.stop()
 
+    def _fork_worker(self, slot, engine_loops):
+        """
+        AE.start(): Fork a worker process to serve associations, returns its
+        pid (supervisor only)
+        """
+        pid = os.fork()
+        if pid:
+            return pid
+        
+        # Worker process, only the forking thread survives the fork so the
+        #   supervisor's state is meaningless here
+        exit_status = 0
+        try:
+            self._workers = {}
+            self._workers_lock = threading.Lock()
+            self._worker_slot = slot
+            self._memory_lock = threading.Lock()
+            self._memory_waiters = []
+            
+            # The supervisor stops the workers, Ctrl-C is for it to handle
+            signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            
+            self._serve(engine_loops)
+        except SystemExit:
+            pass
+        except BaseException as e:
+            logger.error("SCP worker process failed")
+            logger.exception(e)
+            exit_status = 1
+        finally:
+            os._exit(exit_status)
+
+    def _association_count(self):
+        """
+        Return the number of active associations, across all the worker 
+        processes when running with workers
+        """
+        if self._worker_counts is None:
+            return len(self.active_associations)
+        
+        self._publish_association_count()
+        return sum(self._worker_counts)
+
+    async def start_async(self):
+        """
+        The asyncio equivalent of start(), starts a server on the running
+        event loop that listens for connections on `port` and serves the
+        associations they request (see pynetdicom3.aio)
+        
+        Successful associations get added to `active_associations`
+        
+        Returns
+        -------
+        asyncio.AbstractServer or None
+            The server, which can be closed to stop listening, or None if the 
+            AE has no supported SOP Classes for use with the SCP
+        """
+        # If the SCP has no supported SOP Classes then there's no point 
+        #   running as a server
+        if self.scp_supported_sop == []:
+            logger.error("AE is running as an SCP but no supported SOP classes "
+                "for use with the SCP have been included during"
+                "ApplicationEntity() initialisation or by setting the "
+                "scp_supported_sop attribute")
+            return None
+
+        async def on_connection(reader, writer):
+            await serve_association(self, reader, writer)
+
+        return await asyncio.start_server(on_connection, '', self.port,
+                                          reuse_address=True)
+
     def _bind_socket(self):
         """ 
         AE.start(): Set up and bind the socket. Separated out from start() to 
@@ -309,58 +564,204 @@ class ApplicationEntity(object):
         self.local_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.local_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.local_socket.bind(('', self.port))
-        self.local_socket.listen(1)
+        self.local_socket.listen(self.listen_backlog)
+        
+        # accept() is called until there are no more connections waiting, 
+        #   which may be none if another worker process got to them first
+        self.local_socket.setblocking(False)
 
     def _monitor_socket(self):
         """ 
-        AE.start(): Monitors the local socket to see if anyone tries to connect 
-        and if so, creates a new association. Separated out from start() to 
+        AE.start(): Accepts all the connections waiting on the local socket and
+        creates a new association for each. Separated out from start() to 
         enable better unit testing
         """
-        read_list, _, _ = select.select([self.local_socket], [], [], 0)
-
-        # If theres a connection
-        if read_list:
-            client_socket, remote_address = self.local_socket.accept()
+        while True:
+            try:
+                client_socket, remote_address = self.local_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                # No more connections, or another worker process accepted them
+                return
+            
+            client_socket.setblocking(True)
             client_socket.setsockopt(socket.SOL_SOCKET, 
                                      socket.SO_RCVTIMEO, 
                                      pack('ll', 10, 0))
 
             # Create a new Association
-            # Association(local_ae, local_socket=None, max_pdu=16382)
-            assoc = Association(self, 
-                                client_socket, 
-                                max_pdu=self.maximum_pdu_size,
-                                acse_timeout=self.acse_timeout,
-                                dimse_timeout=self.dimse_timeout)
+            if self._engine is not None:
+                assoc = self._engine.add(client_socket)
+            else:
+                # Association(local_ae, local_socket=None, max_pdu=16382)
+                assoc = Association(self, 
+                                    client_socket, 
+                                    max_pdu=self.maximum_pdu_size,
+                                    acse_timeout=self.acse_timeout,
+                                    dimse_timeout=self.dimse_timeout)
+
+            self._add_association(assoc)
+
+    def _add_association(self, assoc):
+        """
+        Append an association to self.active_associations, unless it has
+        already ended
+        
+        Parameters
+        ----------
+        assoc - pynetdicom3.association.Association
+            The association
+        """
+        with self._associations_lock:
+            if not assoc._ended:
+                self.active_associations.append(assoc)
+            
+            self._publish_association_count()
+
+    def _association_ended(self, assoc):
+        """
+        Remove an association from self.active_associations, called by the 
+        association (or the loop serving it) once it has ended
+        
+        Parameters
+        ----------
+        assoc - pynetdicom3.association.Association
+            The association
+        """
+        with self._associations_lock:
+            assoc._ended = True
+            if assoc in self.active_associations:
+                self.active_associations.remove(assoc)
+            
+            self._publish_association_count()
+        
+        # Anything it hadn't finished receiving no longer counts
+        assoc.dul.release_memory()
+
+    def _reserve_memory(self, nbytes):
+        """
+        Count `nbytes` of received data against self.memory_budget
+        
+        Parameters
+        ----------
+        nbytes - int
+            The number of bytes
+        """
+        with self._memory_lock:
+            self._memory_used += nbytes
 
-            self.active_associations.append(assoc)
+    def _release_memory(self, nbytes):
+        """
+        Stop counting `nbytes` of received data against self.memory_budget
+        
+        Parameters
+        ----------
+        nbytes - int
+            The number of bytes
+        """
+        with self._memory_lock:
+            self._memory_used = max(self._memory_used - nbytes, 0)
+            
+            waiters = []
+            if not self._memory_exhausted():
+                waiters, self._memory_waiters = self._memory_waiters, []
+        
+        for callback in waiters:
+            callback()
+
+    def _memory_exhausted(self):
+        """ 
+        Return True if the received data being held is using all of
+        self.memory_budget, in which case associations stop reading from
+        their peers until some of it has been released
+        """
+        return 0 < self.memory_budget <= self._memory_used
+
+    def _wait_for_memory(self, callback):
+        """
+        Have `callback` called, once, when enough received data has been
+        released that the memory budget is no longer used up. Used by the DULs
+        and engine loops that have stopped reading from their peers so they 
+        can sleep until then. The callback may be called from any thread
+        
+        Parameters
+        ----------
+        callback - callable
+            Called with no arguments, registering the same callback more than
+            once only has it called once
+        
+        Returns
+        -------
+        bool
+            True if `callback` was registered, False if the memory budget
+            isn't used up so there's nothing to wait for
+        """
+        with self._memory_lock:
+            if not self._memory_exhausted():
+                return False
+            
+            if callback not in self._memory_waiters:
+                self._memory_waiters.append(callback)
+            
+            return True
 
     def _cleanup_associations(self):
         """ 
-        AE.start(): Removes any dead associations from self.active_associations 
-        by checking to see if the association thread is still alive. Separated 
+        Removes any dead associations from self.active_associations by 
+        checking to see if the association thread is still alive. Separated 
         out from start() to enable better unit testing
         """
-        # We can use threading.enumerate() to list all alive threads
-        
         #   assoc.is_alive() is inherited from threading.thread
-        self.active_associations = [assoc for assoc in 
-                    self.active_associations if assoc.is_alive()]
+        with self._associations_lock:
+            self.active_associations = [assoc for assoc in 
+                        self.active_associations if assoc.is_alive()]
+            
+            self._publish_association_count()
+
+    def _publish_association_count(self):
+        """ Let the other worker processes know our association count """
+        if self._worker_counts is not None:
+            self._worker_counts[self._worker_slot] = \
+                                            len(self.active_associations)
 
     def stop(self):
         """
         When running as an SCP, calling stop() will kill all associations,
         close the listen socket and quit
         """
+        # Stop the worker processes, making sure the supervisor doesn't
+        #   restart them
+        with self._workers_lock:
+            self._quit = True
+            for pid in self._workers:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except OSError:
+                    pass
+            
+            for pid in self._workers:
+                try:
+                    os.waitpid(pid, 0)
+                except ChildProcessError:
+                    pass
+            
+            self._workers = {}
+        
         for aa in self.active_associations:
             aa.kill()
         
+        if self._engine is not None:
+            self._engine.stop()
+            self._engine = None
+        
         if self.local_socket:
             self.local_socket.close()
         
         self._quit = True
         
+        # Interrupt the wait for connections
+        if self._waker is not None:
+            self._waker.wakeup()
+        
         while True:
             sys.exit(0)
 
@@ -419,7 +820,56 @@ class ApplicationEntity(object):
 
         # If the Association was established
         if assoc.is_established:
-            self.active_associations.append(assoc)
+            self._add_association(assoc)
+
+        return assoc
+
+    async def associate_async(self, addr, port, ae_title='ANY-SCP', 
+                                max_pdu=16382, ext_neg=None):
+        """
+        The asyncio equivalent of associate(), attempts to associate with a 
+        remote application entity without blocking the event loop
+
+        Parameters
+        ----------
+        addr : str
+            The peer AE's TCP/IP address (IPv4)
+        port : int
+            The peer AE's listen port number
+        ae_title : str, optional
+            The peer AE's title
+        max_pdu : int, optional
+            The maximum PDV receive size in bytes to use when negotiating the 
+            association
+        ext_neg : List of UserInformation objects, optional
+            Used if extended association negotiation is required
+
+        Returns
+        -------
+        assoc : pynetdicom3.aio.AsyncAssociation
+            The association, check `is_established` to see if the association
+            request was accepted
+        """
+        if not isinstance(addr, str):
+            raise ValueError("ip_address must be a valid IPv4 string")
+
+        if not isinstance(port, int):
+            raise ValueError("port must be a valid port number")
+
+        peer_ae = {'AET' : validate_ae_title(ae_title), 
+                   'Address' : addr, 
+                   'Port' : port}
+
+        assoc = AsyncAssociation(self,
+                                 peer_ae=peer_ae,
+                                 max_pdu=max_pdu,
+                                 ext_neg=ext_neg)
+
+        await assoc._request()
+
+        # If the Association was established
+        if assoc.is_established:
+            self._add_association(assoc.assoc)
 
         return assoc
 
@@ -867,9 +1317,19 @@ class ApplicationEntity(object):
         
         ae.start()
 
+        If AE.spool_c_store is True then `dataset` is the data set spooled 
+        to file by on_c_store_spool() instead, which is closed once the 
+        callback returns. It can be decoded with `dataset.decode()` or its 
+        file moved elsewhere using `dataset.path`:
+        
+        def on_c_store(dataset):
+            uid = dataset.command_set.AffectedSOPInstanceUID
+            os.rename(dataset.path, os.path.join('archive', uid))
+            return 0x0000
+
         Parameters
         ----------
-        dataset : pydicom.dataset.Dataset
+        dataset : pydicom.dataset.Dataset or pynetdicom3.dsutils.SpooledDataset
             The DICOM dataset sent in the C-STORE request
 
         Returns
@@ -906,6 +1366,107 @@ class ApplicationEntity(object):
         raise NotImplementedError("User must implement the AE.on_c_store "
                     "function prior to calling AE.start()")
 
+    def on_c_store_raw(self, context, command_set, dataset_bytes):
+        """
+        Function callback for when a C-STORE request is received from a peer
+        AE, called with the data set still encoded. By default the data set
+        is decoded and passed to on_c_store(), but it may be replaced by the
+        user to handle the encoded data set directly, such as writing it to 
+        file with pynetdicom3.dsutils.write_part10_file(), avoiding the cost 
+        of decoding it. Must return a valid C-STORE status integer value or 
+        the corresponding pynetdicom3.SOPclass.Status object, as with 
+        on_c_store().
+        
+        Not called when AE.spool_c_store is True.
+        
+        Example
+        -------
+        from pynetdicom3 import AE, StorageSOPClassList
+        from pynetdicom3.dsutils import write_part10_file
+        
+        def on_c_store_raw(context, command_set, dataset_bytes):
+            write_part10_file(command_set.AffectedSOPInstanceUID,
+                              dataset_bytes,
+                              command_set.AffectedSOPClassUID,
+                              command_set.AffectedSOPInstanceUID,
+                              context.TransferSyntax[0])
+            return 0x0000
+            
+        ae = AE(11112, scp_sop_class=StorageSOPClassList)
+        ae.on_c_store_raw = on_c_store_raw
+        
+        ae.start()
+        
+        Parameters
+        ----------
+        context : pynetdicom3.utils.PresentationContext
+            The accepted presentation context the C-STORE request was sent
+            under, the data set is encoded using its transfer syntax
+        command_set : pynetdicom3.DIMSEparameters.C_STORE_ServiceParameters
+            The C-STORE request primitive, with the MessageID, Priority,
+            AffectedSOPClassUID, AffectedSOPInstanceUID, etc of the request's
+            Command Set
+        dataset_bytes : bytes
+            The encoded data set sent in the C-STORE request
+            
+        Returns
+        -------
+        status : pynetdicom3.SOPclass.Status or int
+            A valid return status for the C-STORE operation, see on_c_store()
+        """
+        transfer_syntax = context.TransferSyntax[0]
+        try:
+            dataset = decode(BytesIO(dataset_bytes),
+                             transfer_syntax.is_implicit_VR,
+                             transfer_syntax.is_little_endian)
+        except:
+            logger.error("StorageServiceClass failed to decode the dataset")
+            # Error: Cannot understand
+            return 0xC000
+        
+        return self.on_c_store(dataset)
+
+    def on_c_store_spool(self, command_set):
+        """
+        Function callback for when a C-STORE request with a data set is 
+        received from a peer AE and AE.spool_c_store is True. Returns the 
+        SpooledDataset that the data set fragments are written to as they 
+        arrive, which is then passed to on_c_store().
+        
+        By default the data set is written to a temporary file in 
+        AE.spool_directory that is deleted once on_c_store() returns, unless
+        it has been moved or `dataset.delete` set to False. May be replaced 
+        by the user to write to a different file or file-like sink.
+        
+        Example
+        -------
+        from pynetdicom3 import AE, StorageSOPClassList
+        from pynetdicom3.dsutils import SpooledDataset
+        
+        def on_c_store_spool(command_set):
+            path = os.path.join('incoming', command_set.AffectedSOPInstanceUID)
+            return SpooledDataset(command_set, open(path, 'w+b'), path)
+            
+        ae = AE(11112, scp_sop_class=StorageSOPClassList)
+        ae.spool_c_store = True
+        ae.on_c_store_spool = on_c_store_spool
+        
+        Parameters
+        ----------
+        command_set : pydicom.dataset.Dataset
+            The Command Set of the C-STORE request
+            
+        Returns
+        -------
+        pynetdicom3.dsutils.SpooledDataset
+            The spooled data set to write the fragments to
+        """
+        fp = tempfile.NamedTemporaryFile(suffix='.dcm', 
+                                         dir=self.spool_directory,
+                                         delete=False)
+        
+        return SpooledDataset(command_set, fp, fp.name, delete=True)
+
     def on_c_find(self, dataset):
         """
         Function callback for when a dataset is received following a C-FIND.
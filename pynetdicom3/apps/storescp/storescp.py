@@ -12,13 +12,11 @@ import os
 import socket
 import sys
 
-from pydicom.dataset import Dataset, FileDataset
-from pydicom.filewriter import write_file
 from pydicom.uid import ExplicitVRLittleEndian, ImplicitVRLittleEndian, \
     ExplicitVRBigEndian, DeflatedExplicitVRLittleEndian
 
 from pynetdicom3 import AE, StorageSOPClassList, VerificationSOPClass
-from pynetdicom3 import pynetdicom_uid_prefix
+from pynetdicom3.dsutils import write_part10_file
 
 logger = logging.Logger('')
 stream_logger = logging.StreamHandler()
@@ -187,14 +185,18 @@ if args.prefer_big:
         transfer_syntax.remove(ExplicitVRBigEndian)
         transfer_syntax.insert(0, ExplicitVRBigEndian)
 
-def on_c_store(dataset):
+def on_c_store_raw(context, command_set, dataset_bytes):
     """
-    Write `dataset` to file as little endian implicit VR
+    Write the encoded dataset to file as received, without decoding it
     
     Parameters
     ----------
-    dataset - pydicom.Dataset
-        The DICOM dataset sent via the C-STORE
+    context - pynetdicom3.utils.PresentationContext
+        The presentation context the C-STORE was sent under
+    command_set - pynetdicom3.DIMSEparameters.C_STORE_ServiceParameters
+        The C-STORE request
+    dataset_bytes - bytes
+        The encoded DICOM dataset sent via the C-STORE
             
     Returns
     -------
@@ -221,35 +223,29 @@ def on_c_store(dataset):
                      'Nuclear Medicine Image Storage' : 'NM',
                      'Secondary Capture Image Storage' : 'SC'}
 
+    sop_class = command_set.AffectedSOPClassUID
+    sop_instance = command_set.AffectedSOPInstanceUID
+
     try:
-        mode_prefix = mode_prefixes[dataset.SOPClassUID.__str__()]
+        mode_prefix = mode_prefixes[sop_class.__str__()]
     except:
         pass
     
-    filename = '%s.%s' %(mode_prefix, dataset.SOPInstanceUID)
+    filename = '%s.%s' %(mode_prefix, sop_instance)
     logger.info('Storing DICOM file: %s' %filename)
     
     if os.path.exists(filename):
         logger.warning('DICOM file already exists, overwriting')
     
-    meta = Dataset()
-    meta.MediaStorageSOPClassUID = dataset.SOPClassUID
-    meta.MediaStorageSOPInstanceUID = dataset.SOPInstanceUID
-    meta.ImplementationClassUID = pynetdicom_uid_prefix
-    
-    ds = FileDataset(filename, {}, file_meta=meta, preamble=b"\0" * 128)
-    ds.update(dataset)
-
-    ds.is_little_endian = True
-    ds.is_implicit_VR = True
-    
     if not args.ignore:
         # Try to save to output-directory
         if args.output_directory is not None:
             filename = os.path.join(args.output_directory, filename)
         
+        # The dataset is stored using the transfer syntax it was sent with
         try:
-            ds.save_as(filename)
+            write_part10_file(filename, dataset_bytes, sop_class, sop_instance,
+                              context.TransferSyntax[0])
         except IOError:
             logger.error('Could not write file to specified directory:')
             logger.error("    %s" %os.path.dirname(filename))
@@ -287,6 +283,6 @@ ae.network_timeout = args.timeout
 ae.acse_timeout = args.acse_timeout
 ae.dimse_timeout = args.dimse_timeout
 
-ae.on_c_store = on_c_store
+ae.on_c_store_raw = on_c_store_raw
 
 ae.start()
@@ -3,21 +3,28 @@
 """
     A dcmtk style storescu application. 
     
-    Used as an SCU for sending DICOM objects from
+    Used as an SCU for sending DICOM objects from files, directories or glob
+    patterns to a Storage SCP, over one or more associations in parallel
 """
 
 import argparse
+import glob
 import logging
 import os
+import queue
 import socket
 import sys
+import threading
+import time
 
 from pydicom import read_file
-from pydicom.uid import ExplicitVRLittleEndian, ImplicitVRLittleEndian, \
+from pydicom.uid import UID, ExplicitVRLittleEndian, ImplicitVRLittleEndian, \
     ExplicitVRBigEndian, DeflatedExplicitVRLittleEndian
 
 from pynetdicom3 import AE
 from pynetdicom3 import StorageSOPClassList
+from pynetdicom3.dsutils import read_file_meta
+from pynetdicom3.utils import PresentationContext
 
 logger = logging.Logger('storescu')
 stream_logger = logging.StreamHandler()
@@ -35,7 +42,7 @@ def _setup_argparser():
                     "Storage Service Class Provider (SCP) and waits for a "
                     "response. The application can be used to transmit DICOM "
                     "images and other composite objectes.", 
-        usage="storescu [options] peer port")
+        usage="storescu [options] peer port dcmfile-in [dcmfile-in...]")
         
     # Parameters
     req_opts = parser.add_argument_group('Parameters')
@@ -43,8 +50,10 @@ def _setup_argparser():
     req_opts.add_argument("port", help="TCP/IP port number of peer", type=int)
     req_opts.add_argument("dcmfile_in", 
                           metavar="dcmfile-in",
-                          help="DICOM file or directory to be transmitted", 
-                          type=str)
+                          help="DICOM file, directory or glob pattern to be "
+                               "transmitted", 
+                          type=str,
+                          nargs='+')
 
     # General Options
     gen_opts = parser.add_argument_group('General Options')
@@ -96,8 +105,265 @@ def _setup_argparser():
                          help="request implicit VR little endian TS only",
                          action="store_true")
 
+    # Input Options
+    in_opts = parser.add_argument_group('Input Options')
+    in_opts.add_argument("-r", "--recurse",
+                         help="recurse into subdirectories, also lets ** in "
+                              "glob patterns match any number of directories",
+                         action="store_true")
+    in_opts.add_argument("--resume-file", metavar='[f]ilename',
+                         help="skip the files whose SOP Instance UIDs are "
+                              "listed in file f and add the UIDs of the files "
+                              "that are sent to it",
+                         type=str)
+
+    # Batch Options
+    batch_opts = parser.add_argument_group('Batch Options')
+    batch_opts.add_argument("-n", "--associations", metavar='[n]umber',
+                            help="send over n associations in parallel "
+                                 "(default: 1)",
+                            type=int,
+                            default=1)
+    batch_opts.add_argument("--report-interval", metavar='[s]econds',
+                            help="report progress every s seconds, 0 to only "
+                                 "report once finished (default: 0)",
+                            type=float,
+                            default=0)
+
     return parser.parse_args()
 
+def _find_files(paths, recurse=False):
+    """
+    Return the paths of the files to be sent, in order and without duplicates
+    
+    Parameters
+    ----------
+    paths - list of str
+        The files, directories and glob patterns from the command line
+    recurse - bool, optional
+        Include the files in subdirectories of directories
+    """
+    found = []
+    for path in paths:
+        matches = [path]
+        if glob.has_magic(path):
+            matches = sorted(glob.glob(path, recursive=recurse))
+            if not matches:
+                logger.error('No files match %s' %path)
+        
+        for match in matches:
+            if not os.path.isdir(match):
+                found.append(match)
+                continue
+            
+            for root, dirs, files in os.walk(match):
+                dirs.sort()
+                found.extend([os.path.join(root, ff) for ff in sorted(files)])
+                if not recurse:
+                    break
+    
+    unique = []
+    seen = set()
+    for path in found:
+        if path not in seen:
+            seen.add(path)
+            unique.append(path)
+    
+    return unique
+
+def _read_uids(path):
+    """
+    Return the SOP Class UID, SOP Instance UID and transfer syntax of the file
+    at `path`, reading only the File Meta Information of DICOM Part 10 files.
+    The transfer syntax is None for files without File Meta Information
+    
+    Raises
+    ------
+    IOError
+        If the file can't be read
+    """
+    with open(path, 'rb') as fp:
+        try:
+            meta = read_file_meta(fp)
+            return meta.MediaStorageSOPClassUID, \
+                   meta.MediaStorageSOPInstanceUID, \
+                   UID(meta.TransferSyntaxUID)
+        except (ValueError, AttributeError):
+            pass
+        
+        fp.seek(0)
+        dataset = read_file(fp, force=True, stop_before_pixels=True)
+        return dataset.SOPClassUID, dataset.SOPInstanceUID, None
+
+def _build_contexts(groups, transfer_syntax):
+    """
+    Return the smallest set of presentation contexts needed to send the files
+    in `groups`, split into lists of no more than 128 contexts (the most an
+    association can have), along with the SOP Classes in each list
+    
+    Each SOP Class has one context proposing the uncompressed transfer 
+    syntaxes in `transfer_syntax`, with the one most of its files are already
+    encoded in first so they can be sent without conversion, plus one context
+    for each compressed transfer syntax its files are encoded in, as pydicom 
+    can't convert those.
+    
+    Parameters
+    ----------
+    groups - dict
+        {(SOP Class UID, transfer syntax or None) : [files]}
+    transfer_syntax - list of pydicom.uid.UID
+        The uncompressed transfer syntaxes that may be proposed
+        
+    Returns
+    -------
+    list of (list of pynetdicom3.utils.PresentationContext, set of str)
+    """
+    # {SOP Class UID : {transfer syntax : number of files}}
+    sop_classes = {}
+    for (sop_class, syntax), files in groups.items():
+        syntaxes = sop_classes.setdefault(sop_class, {})
+        syntaxes[syntax] = syntaxes.get(syntax, 0) + len(files)
+    
+    # Keep the contexts for each SOP Class together
+    contexts = []
+    for sop_class in sorted(sop_classes):
+        syntaxes = sop_classes[sop_class]
+        
+        uncompressed = [ts for ts in syntaxes if ts is None or ts in 
+                                                            UNCOMPRESSED]
+        items = [ts for ts in syntaxes if ts not in uncompressed]
+        items = [[ts] for ts in sorted(items)]
+        if uncompressed:
+            preferred = max(uncompressed, key=lambda ts: syntaxes[ts])
+            proposed = [ts for ts in transfer_syntax if ts == preferred]
+            proposed += [ts for ts in transfer_syntax if ts != preferred]
+            items.insert(0, proposed)
+        
+        contexts.append((UID(sop_class), items))
+    
+    batches = [([], set())]
+    for sop_class, items in contexts:
+        batch, batch_classes = batches[-1]
+        if len(batch) + len(items) > MAX_CONTEXTS:
+            batch, batch_classes = [], set()
+            batches.append((batch, batch_classes))
+        
+        for syntaxes in items:
+            # Must be an odd integer between 1 and 255
+            batch.append(PresentationContext(len(batch) * 2 + 1, sop_class,
+                                             syntaxes))
+        batch_classes.add(sop_class)
+    
+    return [batch for batch in batches if batch[0]]
+
+class Progress(object):
+    """
+    Keeps count of the files sent and reports the throughput
+    
+    Parameters
+    ----------
+    total - int
+        The number of files to be sent
+    resume_file - str or None
+        The file to add the SOP Instance UIDs of the files sent to
+    """
+    def __init__(self, total, resume_file=None):
+        self.total = total
+        self.sent = 0
+        self.failed = 0
+        self.nbytes = 0
+        self.start = time.time()
+        
+        self._resume = None
+        if resume_file:
+            self._resume = open(resume_file, 'a')
+        
+        self._lock = threading.Lock()
+
+    def add(self, path, sop_instance, success):
+        """ Count a file once its C-STORE has completed or failed """
+        with self._lock:
+            if not success:
+                self.failed += 1
+                return
+            
+            self.sent += 1
+            try:
+                self.nbytes += os.path.getsize(path)
+            except OSError:
+                pass
+            
+            if self._resume is not None:
+                self._resume.write('%s\n' %sop_instance)
+                self._resume.flush()
+
+    def report(self):
+        """ Return a one line summary of the progress so far """
+        with self._lock:
+            elapsed = max(time.time() - self.start, 1e-6)
+            return '%d/%d files sent, %d failed, %.1f files/s, %.2f MB/s' %(
+                        self.sent, self.total, self.failed, 
+                        self.sent / elapsed, self.nbytes / elapsed / 1e6)
+
+    def close(self):
+        """ Close the resume file """
+        if self._resume is not None:
+            self._resume.close()
+
+def _send_files(ae, files, progress):
+    """
+    Send the files waiting in the `files` queue over a single association, 
+    until there are none left or the association can't be established
+    """
+    assoc = None
+    while True:
+        try:
+            path, sop_instance, is_part10 = files.get(False)
+        except queue.Empty:
+            break
+        
+        if assoc is None or not assoc.is_established:
+            assoc = ae.associate(args.peer, args.port, args.called_aet)
+            if not assoc.is_established:
+                # Leave the file to the other associations
+                files.put((path, sop_instance, is_part10))
+                logger.error('Association with the peer failed')
+                return
+        
+        logger.info('Sending file: %s' %path)
+        status = None
+        try:
+            if is_part10:
+                status = assoc.send_c_store_file(path)
+            else:
+                status = assoc.send_c_store(read_file(path, force=True))
+        except Exception as e:
+            logger.error('Failed to send %s: %s' %(path, e))
+        
+        success = status is not None and status.Type in ['Success', 
+                                                         'Warning']
+        if status is not None and not success:
+            logger.error('The peer failed to store %s' %path)
+        
+        progress.add(path, sop_instance, success)
+    
+    if assoc is not None and assoc.is_established:
+        assoc.release()
+
+def _report_progress(progress, interval, done):
+    """ Print the progress every `interval` seconds until `done` is set """
+    while not done.wait(interval):
+        print(progress.report())
+
+# The maximum number of presentation contexts that can be proposed
+MAX_CONTEXTS = 128
+
+# The transfer syntaxes pydicom can convert between
+UNCOMPRESSED = [ExplicitVRLittleEndian,
+                ImplicitVRLittleEndian,
+                DeflatedExplicitVRLittleEndian,
+                ExplicitVRBigEndian]
+
 args = _setup_argparser()
 
 if args.verbose:
@@ -113,24 +379,45 @@ if args.debug:
 logger.debug('$storescu.py v%s %s $' %('0.1.0', '2016-02-10'))
 logger.debug('')
 
-# Check file exists and is readable and DICOM
+# The SOP Instance UIDs already sent
+sent_uids = set()
+if args.resume_file and os.path.exists(args.resume_file):
+    with open(args.resume_file, 'r') as fp:
+        sent_uids = set([line.strip() for line in fp if line.strip()])
+
+# Check the files exist and are readable and DICOM, grouping them by SOP
+#   Class and transfer syntax
 logger.debug('Checking input files')
-try:
-    f = open(args.dcmfile_in, 'rb')
-    dataset = read_file(f, force=True)
-    f.close()
-except IOError:
-    logger.error('Cannot read input file %s' %args.dcmfile_in)
-    sys.exit()
-except:
-    logger.error('File may not be DICOM %s' %args.dcmfile_in)
+groups = {}
+skipped = 0
+unreadable = 0
+for path in _find_files(args.dcmfile_in, args.recurse):
+    try:
+        sop_class, sop_instance, syntax = _read_uids(path)
+    except IOError:
+        logger.error('Cannot read input file %s' %path)
+        unreadable += 1
+        continue
+    except:
+        logger.error('File may not be DICOM %s' %path)
+        unreadable += 1
+        continue
+    
+    if sop_instance in sent_uids:
+        skipped += 1
+        continue
+    
+    groups.setdefault((sop_class, syntax), []).append((path, sop_instance))
+
+if skipped:
+    logger.info('Skipping %d files that have already been sent' %skipped)
+
+if not groups:
+    logger.error('No files to send')
     sys.exit()
 
 # Set Transfer Syntax options
-transfer_syntax = [ExplicitVRLittleEndian,
-                   ImplicitVRLittleEndian,
-                   DeflatedExplicitVRLittleEndian,
-                   ExplicitVRBigEndian]
+transfer_syntax = UNCOMPRESSED[:]
                    
 if args.request_little:
     transfer_syntax = [ExplicitVRLittleEndian]
@@ -146,17 +433,42 @@ ae = AE(ae_title=args.calling_aet,
         scp_sop_class=[],
         transfer_syntax=transfer_syntax)
 
-# Request association with remote
-assoc = ae.associate(args.peer, args.port, args.called_aet)
+total = sum([len(files) for files in groups.values()]) + unreadable
+progress = Progress(total, args.resume_file)
+progress.failed = unreadable
+
+done = threading.Event()
+if args.report_interval > 0:
+    threading.Thread(target=_report_progress, 
+                     args=(progress, args.report_interval, done),
+                     daemon=True).start()
 
-if assoc.is_established:
-    logger.info('Sending file: %s' %args.dcmfile_in)
+# Each batch of presentation contexts needs its own associations
+for contexts, sop_classes in _build_contexts(groups, transfer_syntax):
+    ae.presentation_contexts_scu = contexts
+    
+    files = queue.Queue()
+    for (sop_class, syntax), group in groups.items():
+        if sop_class in sop_classes:
+            for path, sop_instance in group:
+                files.put((path, sop_instance, syntax is not None))
     
-    status = assoc.send_c_store(dataset)
+    workers = [threading.Thread(target=_send_files, 
+                                args=(ae, files, progress))
+                            for ii in range(max(args.associations, 1))]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
     
-    assoc.release()
+    # Left over if none of the associations could be established
+    while not files.empty():
+        path, sop_instance, _ = files.get()
+        progress.add(path, sop_instance, False)
+
+done.set()
+progress.close()
+print(progress.report())
 
 # Quit
 ae.quit()
-
-
@@ -1,4 +1,5 @@
 
+from collections import deque
 import logging
 import os
 import platform
@@ -10,23 +11,50 @@ import threading
 import time
 from weakref import proxy
 
+from pydicom import read_file
 from pydicom.uid import ExplicitVRLittleEndian, ImplicitVRLittleEndian, \
                          ExplicitVRBigEndian, UID
 
 from pynetdicom3.ACSEprovider import ACSEServiceProvider
 from pynetdicom3.DIMSEprovider import DIMSEServiceProvider
 from pynetdicom3.DIMSEparameters import *
-from pynetdicom3.DULprovider import DULServiceProvider
+from pynetdicom3.DULprovider import DULServiceProvider, WAIT_INTERVAL
+from pynetdicom3.dsutils import read_file_meta, read_sop_uids, \
+                               SpooledDataset
 from pynetdicom3.SOPclass import *
-from pynetdicom3.utils import PresentationContextManager, correct_ambiguous_vr, wrap_list
+from pynetdicom3.utils import PresentationContextManager, correct_ambiguous_vr, \
+    uid_value, wrap_list
 from pynetdicom3.primitives import UserIdentityNegotiation, \
                                    SOPClassExtendedNegotiation, \
                                    MaximumLengthNegotiation, \
-                                   A_ASSOCIATE, A_RELEASE, A_ABORT, A_P_ABORT
+                                   AsynchronousOperationsWindowNegotiation, \
+                                   A_ASSOCIATE, A_RELEASE, A_ABORT, A_P_ABORT, \
+                                   P_DATA
 
 
 logger = logging.getLogger('pynetdicom.assoc')
 
+def _window(proposed, supported):
+    """
+    Return the negotiated number of asynchronous operations, where 0 means
+    unlimited
+    """
+    if proposed == 0:
+        return supported
+    
+    if supported == 0:
+        return proposed
+    
+    return min(proposed, supported)
+
+
+def _next_message_id(msg_id, offset=1):
+    """
+    Return the Message ID `offset` after `msg_id`, wrapping from 65535 back
+    to 1 as a Message ID can't be 0
+    """
+    return (msg_id + offset - 1) % 65535 + 1
+
 
 class Association(threading.Thread):
     """
@@ -71,6 +99,11 @@ class Association(threading.Thread):
     ext_neg - list of extended negotiation parameters objects, optional
         If the association requires an extended negotiation then `ext_neg` is
         a list containing the negotiation objects (default: None)
+    engine - pynetdicom3.engine.EngineLoop or pynetdicom3.aio.AsyncAssociation
+    optional
+        If `engine` is given then the association (and its DUL) isn't run in a
+        thread of its own but is served by the engine loop or the asyncio 
+        event loop instead (default: None)
 
     Attributes
     ----------
@@ -82,10 +115,20 @@ class Association(threading.Thread):
         The DICOM Message Service Element provider
     dul - DUL
         The DICOM Upper Layer service provider instance
+    engine - pynetdicom3.engine.EngineLoop, pynetdicom3.aio.AsyncAssociation
+    or None
+        The engine serving the association, None if the association runs in
+        its own thread
     is_aborted - bool
         True if the association has been aborted
     is_established - bool
         True if the association has been established
+    max_operations_invoked - int
+        The negotiated maximum number of outstanding requests the local AE 
+        may invoke, 0 for unlimited (default: 1)
+    max_operations_performed - int
+        The negotiated maximum number of outstanding requests the local AE 
+        may perform, 0 for unlimited (default: 1)
     is_released - bool
         True if the association has been released
     mode - str
@@ -106,7 +149,8 @@ class Association(threading.Thread):
                        acse_timeout=30,
                        dimse_timeout=0,
                        max_pdu=16382,
-                       ext_neg=None):
+                       ext_neg=None,
+                       engine=None):
         
         # Why is the AE in charge of supplying the client socket?
         #   Hmm, perhaps because we can have multiple connections on the same
@@ -134,6 +178,9 @@ class Association(threading.Thread):
         
         # The parent AE object
         self.ae = local_ae
+        
+        # The engine loop serving the association (if any)
+        self.engine = engine
 
         # Why do we instantiate the DUL provider with a socket when acting
         #   as an SCU?
@@ -143,7 +190,8 @@ class Association(threading.Thread):
                                       dul_timeout=self.ae.network_timeout,
                                       acse_timeout=acse_timeout,
                                       local_ae=local_ae,
-                                      assoc=self)
+                                      assoc=self,
+                                      engine=engine)
         
         # Dict containing the peer AE title, address and port
         self.peer_ae = peer_ae
@@ -170,12 +218,51 @@ class Association(threading.Thread):
         # A list of extended negotiation objects
         self.ext_neg = ext_neg
         
+        # The negotiated Asynchronous Operations Window, without negotiation
+        #   only one operation may be outstanding at a time
+        self.max_operations_invoked = 1
+        self.max_operations_performed = 1
+        
+        # Set new ACSE and DIMSE providers
+        self.acse = ACSEServiceProvider(self, self.dul, self.acse_timeout)
+        self.dimse = DIMSEServiceProvider(self.dul, self.dimse_timeout)
+        if self.mode == 'Acceptor':
+            self.dimse.data_set_sink = self._spool_c_store
+        
         # Kills the thread loop in run()
         self._Kill = False
         
+        # The thread running a C-GET or C-MOVE SCP when served by an engine
+        self._worker = None
+        # Set by the engine loop once it stops serving the association
+        self._engine_done = False
+        # Set once the AE has been told the association has ended
+        self._ended = False
+        
+        # The accepted presentation contexts by ID and by abstract syntax,
+        #   built once the association is established
+        self._contexts_by_id = {}
+        self._contexts_by_syntax = {}
+        
+        # The (SCP, message, length) waiting on or running on the AE's 
+        #   executor, oldest first, and how many of them are a C-GET or C-MOVE.
+        #   The length of each message stays counted against the AE's memory
+        #   budget until its SCP has finished
+        self._dispatched = deque()
+        self._dispatch_retrieves = 0
+        self._dispatch_lock = threading.Lock()
+        
         # Thread setup
         threading.Thread.__init__(self)
         self.daemon = True
+        
+        # The engine loop drives the DUL and association for us
+        if engine is not None:
+            return
+
+        # The DUL needs the ACSE to decode incoming PDUs so it can only be
+        #   started once the providers are available
+        self.dul.start()
 
         # Start the thread
         self.start()
@@ -188,10 +275,29 @@ class Association(threading.Thread):
         self._Kill = True
         
         self.is_established = False
-        while not self.dul.Stop():
-            time.sleep(0.001)
+        self._close_spooled()
+        self.dul.to_user_queue.interrupt()
+        # When served by an engine we may be running in the engine loop, 
+        #   which will close the connection once the DUL is done with it
+        if self.engine is None:
+            while not self.dul.Stop():
+                time.sleep(0.001)
+
+    def is_alive(self):
+        """
+        Return True if the association is still running. An association served
+        by an engine loop has no thread so is alive until the engine is done
+        with it
+        
+        Returns
+        -------
+        bool
+            True if the association is still running, False otherwise
+        """
+        if self.engine is not None:
+            return not self._engine_done
         
-        self.ae._cleanup_associations()
+        return threading.Thread.is_alive(self)
 
     def release(self):
         """
@@ -223,10 +329,14 @@ class Association(threading.Thread):
         """
         The main Association thread
         """
-        # Set new ACSE and DIMSE providers
-        self.acse = ACSEServiceProvider(self, self.dul, self.acse_timeout)
-        self.dimse = DIMSEServiceProvider(self.dul, self.dimse_timeout)
-        
+        try:
+            self._run()
+        finally:
+            # Let the AE know so it can remove us from its active associations
+            self.ae._association_ended(self)
+
+    def _run(self):
+        """ Run the association until it's released or aborted """
         # When the AE is acting as an SCP (Association Acceptor)
         if self.mode == 'Acceptor':
             # needed because of some thread-related problem. To investigate.
@@ -239,123 +349,9 @@ class Association(threading.Thread):
                 self.kill()
                 return
             
-            # If the remote AE initiated the Association then reject it if:
-            # Rejection reasons: 
-            #   a) DUL user
-            #       0x02 unsupported application context name
-            #   b) DUL ACSE related
-            #       0x01 no reason given
-            #       0x02 protocol version not supported
-            #   c) DUL Presentation related
-            #       0x01 temporary congestion
-            
-            ## DUL User Related Rejections
-            #
-            # [result, source, diagnostic]
-            reject_assoc_rsd = []
-            
-            # Calling AE Title not recognised
-            if self.ae.require_calling_aet != '':
-                if self.ae.require_calling_aet != assoc_rq.calling_ae_title:
-                    reject_assoc_rsd = [(0x01, 0x01, 0x03)]
-
-            # Called AE Title not recognised
-            if self.ae.require_called_aet != '':
-                if self.ae.require_called_aet != assoc_rq.called_ae_title:
-                    reject_assoc_rsd = [(0x01, 0x01, 0x07)]
-
-            ## DUL ACSE Related Rejections
-            #
-            # User Identity Negotiation (PS3.7 Annex D.3.3.7)
-            for ii in assoc_rq.user_information:
-                if isinstance(ii, UserIdentityNegotiation):
-                    # Used to notify the association acceptor of the user 
-                    #   identity of the association requestor. It may also
-                    #   request that the Acceptor response with the server
-                    #   identity.
-                    #
-                    # The Acceptor does not provide an A-ASSOCIATE response
-                    #   unless a positive response is requested and user
-                    #   authentication succeeded. If a positive response
-                    #   was requested, the A-ASSOCIATE response shall contain
-                    #   a User Identity sub-item. If a Kerberos ticket is used
-                    #   the response shall include a Kerberos server ticket
-                    #
-                    # A positive response must be requested if the association
-                    #   requestor requires confirmation. If the Acceptor does
-                    #   not support user identification it will accept the 
-                    #   association without making a positive response. The 
-                    #   Requestor can then decide whether to proceed
-                    
-                    #user_authorised = self.ae.on_user_identity(ii.UserIdentityType,
-                    #                                           ii.PrimaryField,
-                    #                                           ii.SecondaryField)
-                    
-                    # Associate with all requestors
-                    assoc_rq.user_information.remove(ii)
-                    
-                    # Testing
-                    #if ii.PositiveResponseRequested:
-                    #    ii.ServerResponse = b''
-            
-            # Extended Negotiation
-            for ii in assoc_rq.user_information:
-                if isinstance(ii, SOPClassExtendedNegotiation):
-                    assoc_rq.user_information.remove(ii)
-
-            ## DUL Presentation Related Rejections
-            #
-            # Maximum number of associations reached (local-limit-exceeded)
-            if len(self.ae.active_associations) > self.ae.maximum_associations:
-                reject_assoc_rsd = [(0x02, 0x03, 0x02)]
-
-            for (result, src, diag) in reject_assoc_rsd:
-                assoc_rj = self.acse.Reject(assoc_rq, result, src, diag)
-                self.debug_association_rejected(assoc_rj)
-                self.ae.on_association_rejected(assoc_rj)
-                self.kill()
-                return
-            
-            ## Presentation Contexts
-            self.acse.context_manager = PresentationContextManager()
-            self.acse.context_manager.requestor_contexts = \
-                                    assoc_rq.presentation_context_definition_list
-            self.acse.context_manager.acceptor_contexts = \
-                                    self.ae.presentation_contexts_scp
-            
-            self.acse.presentation_contexts_accepted = \
-                                    self.acse.context_manager.accepted
-            
-            # Set maximum PDU send length
-            #self.peer_max_pdu = assoc_rq.UserInformation[0].MaximumLengthReceived
-            self.peer_max_pdu = assoc_rq.maximum_length_received
-            
-            # Set maximum PDU receive length
-            assoc_rq.maximum_length_received = self.local_max_pdu
-            #for user_item in assoc_rq.user_information:
-            #    if isinstance(user_item, MaximumLengthNegotiation):
-            #        user_item.maximum_length_received = self.local_max_pdu
-            
-            # Issue the A-ASSOCIATE indication (accept) primitive using the ACSE
-            assoc_ac = self.acse.Accept(assoc_rq)
-            
-            # Callbacks/Logging
-            self.debug_association_accepted(assoc_ac)
-            self.ae.on_association_accepted(assoc_ac)
-            
-            if assoc_ac is None:
-                self.kill()
-                return
-            
-            # No valid presentation contexts, abort the association
-            if self.acse.presentation_contexts_accepted == []:
-                self.acse.Abort(0x02, 0x00)
-                self.kill()
+            if not self._handle_association_request(assoc_rq):
                 return
             
-            # Assocation established OK
-            self.is_established = True
-            
             # Main SCP run loop 
             #   1. Checks for incoming DIMSE messages
             #       If DIMSE message then run corresponding service class' SCP
@@ -364,75 +360,38 @@ class Association(threading.Thread):
             #       If present then kill thread
             #   3. Checks for peer A-ABORT request primitive
             #       If present then kill thread
-            #   4. Checks DUL provider still running
+            #   4. Checks DUL idle timeout
+            #       If timed out then abort the association
+            #   5. Checks DUL provider still running
             #       If not then kill thread
-            #   5. Checks DUL idle timeout
-            #       If timed out then kill thread
             while not self._Kill:
-                time.sleep(0.001)
+                changes = self.dul.to_user_queue.changes
                 
-                # Check with the DIMSE provider for incoming messages
-                #   all messages should be a DIMSEMessage subclass
-                msg, msg_context_id = self.dimse.Receive(False, self.dimse_timeout)
-                
-                # DIMSE message received
-                if msg:
-                    # Convert the message's affected SOP class to a UID
-                    uid = msg.AffectedSOPClassUID
-
-                    # Use the UID to create a new SOP Class instance of the
-                    #   corresponding value
-                    try:
-                        sop_class = UID2SOPClass(uid.value)()
-                    except:
-                        sop_class = UID2SOPClass(uid)()
-                    
-                    # Check that the SOP Class is supported by the AE
-                    matching_context = False
-                    for context in self.acse.presentation_contexts_accepted:
-                        if context.ID == msg_context_id:
-                            # New method - what is this even used for?
-                            sop_class.presentation_context = context
-                            
-                            # Old method
-                            sop_class.pcid = context.ID
-                            sop_class.sopclass = context.AbstractSyntax
-                            sop_class.transfersyntax = context.TransferSyntax[0]
-
-                            matching_context = True
-
-                    if matching_context:
-                        # Most of these shouldn't be necessary
-                        sop_class.maxpdulength = self.peer_max_pdu
-                        sop_class.DIMSE = self.dimse
-                        sop_class.ACSE = self.acse
-                        sop_class.AE = self.ae
-                        
-                        # Run SOPClass in SCP mode
-                        sop_class.SCP(msg)
+                # A C-GET or C-MOVE running on the AE's executor is consuming
+                #   the DUL's output
+                if not self._dispatch_retrieves:
+                    # Check with the DIMSE provider for incoming messages
+                    #   all messages should be a DIMSEMessage subclass
+                    msg, msg_context_id = self.dimse.Receive(False, 
+                                                            self.dimse_timeout)
                     
-                # Check for release request
-                if self.acse.CheckRelease():
-                    # Callback trigger
-                    self.debug_association_released()
-                    self.ae.on_association_released()
-                    self.kill()
-
-                # Check for abort
-                if self.acse.CheckAbort():
-                    # Callback trigger
-                    self.debug_association_aborted()
-                    self.ae.on_association_aborted(None)
-                    self.kill()
-
+                    # DIMSE message received
+                    if msg:
+                        self._process_dimse_message(msg, msg_context_id)
+                
+                # Check for release, abort and idle timeout, a release has
+                #   to wait until the requests on the executor are responded to
+                if self._check_association_end(not self._dispatched):
+                    break
+                
                 # Check if the DULServiceProvider thread is still running
                 #   DUL.is_alive() is inherited from threading.thread
                 if not self.dul.is_alive():
                     self.kill()
-
-                # Check if idle timer has expired
-                if self.dul.idle_timer_expired():
-                    self.kill()
+                    break
+                
+                # Block until the DUL passes up something new
+                self._wait_for_dul(changes)
         
         # If the local AE initiated the Association
         elif self.mode == 'Requestor':
@@ -460,13 +419,16 @@ class Association(threading.Thread):
                         'Port'    : self.ae.port,
                         'AET'     : self.ae.ae_title}
             
+            # Asynchronous Operations Window negotiation (optional)
+            user_information, async_ops = self._user_information()
+            
             # Request an Association via the ACSE
             is_accepted, assoc_rsp = self.acse.Request(
                                         local_ae, 
                                         self.peer_ae,
                                         self.local_max_pdu,
                                         self.ae.presentation_contexts_scu,
-                                        userspdu=self.ext_neg)
+                                        userspdu=user_information or None)
 
             # Association was accepted or rejected
             if isinstance(assoc_rsp, A_ASSOCIATE):
@@ -482,6 +444,8 @@ class Association(threading.Thread):
                         self.kill()
                         return
                     
+                    self._negotiate_window(async_ops, assoc_rsp)
+                    
                     # Build supported SOP Classes for the Association
                     self.scu_supported_sop = []
                     for context in self.acse.presentation_contexts_accepted:
@@ -491,6 +455,7 @@ class Association(threading.Thread):
                                         context.TransferSyntax[0]))
 
                     # Assocation established OK
+                    self._index_contexts()
                     self.is_established = True
                     
                     # This seems like it should be event driven rather than
@@ -498,7 +463,7 @@ class Association(threading.Thread):
                     #
                     # Listen for further messages from the peer
                     while not self._Kill:
-                        time.sleep(0.001)
+                        changes = self.dul.to_user_queue.changes
                         
                         # Check for release request
                         if self.acse.CheckRelease():
@@ -525,8 +490,12 @@ class Association(threading.Thread):
 
                         # Check if idle timer has expired
                         if self.dul.idle_timer_expired():
-                            self.kill()
+                            self.abort()
                             return
+                        
+                        # Block until the DUL passes up something new or 
+                        #   the user takes a response off the queue
+                        self._wait_for_dul(changes)
                 
                 # Association was rejected
                 else:
@@ -557,6 +526,661 @@ class Association(threading.Thread):
                 self.dul.Kill()
                 return
 
+    def _handle_association_request(self, assoc_rq):
+        """
+        Accept or reject an A-ASSOCIATE request primitive from the peer 
+        (Acceptor only)
+        
+        Parameters
+        ----------
+        assoc_rq - pynetdicom3.primitives.A_ASSOCIATE
+            The A-ASSOCIATE request primitive received from the DUL
+            
+        Returns
+        -------
+        bool
+            True if the association was established, False otherwise
+        """
+        # If the remote AE initiated the Association then reject it if:
+        # Rejection reasons: 
+        #   a) DUL user
+        #       0x02 unsupported application context name
+        #   b) DUL ACSE related
+        #       0x01 no reason given
+        #       0x02 protocol version not supported
+        #   c) DUL Presentation related
+        #       0x01 temporary congestion
+
+        ## DUL User Related Rejections
+        #
+        # [result, source, diagnostic]
+        reject_assoc_rsd = []
+
+        # Calling AE Title not recognised
+        if self.ae.require_calling_aet != '':
+            if self.ae.require_calling_aet != assoc_rq.calling_ae_title:
+                reject_assoc_rsd = [(0x01, 0x01, 0x03)]
+
+        # Called AE Title not recognised
+        if self.ae.require_called_aet != '':
+            if self.ae.require_called_aet != assoc_rq.called_ae_title:
+                reject_assoc_rsd = [(0x01, 0x01, 0x07)]
+
+        ## DUL ACSE Related Rejections
+        #
+        # User Identity Negotiation (PS3.7 Annex D.3.3.7)
+        for ii in assoc_rq.user_information:
+            if isinstance(ii, UserIdentityNegotiation):
+                # Used to notify the association acceptor of the user 
+                #   identity of the association requestor. It may also
+                #   request that the Acceptor response with the server
+                #   identity.
+                #
+                # The Acceptor does not provide an A-ASSOCIATE response
+                #   unless a positive response is requested and user
+                #   authentication succeeded. If a positive response
+                #   was requested, the A-ASSOCIATE response shall contain
+                #   a User Identity sub-item. If a Kerberos ticket is used
+                #   the response shall include a Kerberos server ticket
+                #
+                # A positive response must be requested if the association
+                #   requestor requires confirmation. If the Acceptor does
+                #   not support user identification it will accept the 
+                #   association without making a positive response. The 
+                #   Requestor can then decide whether to proceed
+
+                #user_authorised = self.ae.on_user_identity(ii.UserIdentityType,
+                #                                           ii.PrimaryField,
+                #                                           ii.SecondaryField)
+
+                # Associate with all requestors
+                assoc_rq.user_information.remove(ii)
+
+                # Testing
+                #if ii.PositiveResponseRequested:
+                #    ii.ServerResponse = b''
+
+        # Extended Negotiation
+        for ii in assoc_rq.user_information:
+            if isinstance(ii, SOPClassExtendedNegotiation):
+                assoc_rq.user_information.remove(ii)
+
+        # Asynchronous Operations Window (PS3.7 Annex D.3.3.3)
+        #   The response values are from the point of view of the acceptor
+        #   and must not exceed those proposed by the requestor
+        for ii in assoc_rq.user_information:
+            if isinstance(ii, AsynchronousOperationsWindowNegotiation):
+                self.max_operations_invoked = _window(
+                                    ii.maximum_number_operations_performed,
+                                    self.ae.maximum_operations_invoked)
+                self.max_operations_performed = _window(
+                                    ii.maximum_number_operations_invoked,
+                                    self.ae.maximum_operations_performed)
+                
+                ii.maximum_number_operations_invoked = \
+                                    self.max_operations_invoked
+                ii.maximum_number_operations_performed = \
+                                    self.max_operations_performed
+
+        ## DUL Presentation Related Rejections
+        #
+        # Maximum number of associations reached (local-limit-exceeded)
+        if self.ae._association_count() > self.ae.maximum_associations:
+            reject_assoc_rsd = [(0x02, 0x03, 0x02)]
+
+        for (result, src, diag) in reject_assoc_rsd:
+            assoc_rj = self.acse.Reject(assoc_rq, result, src, diag)
+            self.debug_association_rejected(assoc_rj)
+            self.ae.on_association_rejected(assoc_rj)
+            self.kill()
+            return False
+
+        ## Presentation Contexts
+        self.acse.context_manager = PresentationContextManager()
+        self.acse.context_manager.requestor_contexts = \
+                                assoc_rq.presentation_context_definition_list
+        self.acse.context_manager.acceptor_contexts = \
+                                self.ae.presentation_contexts_scp
+
+        self.acse.presentation_contexts_accepted = \
+                                self.acse.context_manager.accepted
+
+        # Set maximum PDU send length
+        #self.peer_max_pdu = assoc_rq.UserInformation[0].MaximumLengthReceived
+        self.peer_max_pdu = assoc_rq.maximum_length_received
+
+        # Set maximum PDU receive length
+        assoc_rq.maximum_length_received = self.local_max_pdu
+        #for user_item in assoc_rq.user_information:
+        #    if isinstance(user_item, MaximumLengthNegotiation):
+        #        user_item.maximum_length_received = self.local_max_pdu
+
+        # Issue the A-ASSOCIATE indication (accept) primitive using the ACSE
+        assoc_ac = self.acse.Accept(assoc_rq)
+
+        # Callbacks/Logging
+        self.debug_association_accepted(assoc_ac)
+        self.ae.on_association_accepted(assoc_ac)
+
+        if assoc_ac is None:
+            self.kill()
+            return False
+
+        # No valid presentation contexts, abort the association
+        if self.acse.presentation_contexts_accepted == []:
+            self.acse.Abort(0x02, 0x00)
+            self.kill()
+            return False
+
+        # Assocation established OK
+        self._index_contexts()
+        self.is_established = True
+
+        return True
+
+    def _process_dimse_message(self, msg, msg_context_id):
+        """
+        Run the SCP of the service class corresponding to a DIMSE message 
+        received from the peer (Acceptor only)
+        
+        Parameters
+        ----------
+        msg - pynetdicom3.DIMSEparameters
+            The DIMSE service primitive received from the peer
+        msg_context_id - int
+            The ID of the presentation context the message was sent under
+        """
+        # Convert the message's affected SOP class to a UID
+        uid = msg.AffectedSOPClassUID
+
+        # Check that the SOP Class is supported by the AE
+        context = self._contexts_by_id.get(msg_context_id)
+        if context is None:
+            if isinstance(getattr(msg, 'DataSet', None), SpooledDataset):
+                msg.DataSet.close()
+            return
+
+        # Use the UID to create a new SOP Class instance of the
+        #   corresponding value
+        sop_class = UID2SOPClass(uid)
+        if sop_class is None:
+            logger.error("No SOP class has been registered for the UID '%s', "
+                         "refusing the request" %uid_value(uid))
+            self._refuse_unsupported(msg, context.ID)
+            return
+
+        sop_class = sop_class()
+
+        # New method - what is this even used for?
+        sop_class.presentation_context = context
+
+        # Old method
+        sop_class.pcid = context.ID
+        sop_class.sopclass = context.AbstractSyntax
+        sop_class.transfersyntax = context.TransferSyntax[0]
+
+        # Most of these shouldn't be necessary
+        sop_class.maxpdulength = self.peer_max_pdu
+        sop_class.DIMSE = self.dimse
+        sop_class.ACSE = self.acse
+        sop_class.AE = self.ae
+
+        # Let the executor run the SCP so we can carry on reading
+        if self._get_executor() is not None:
+            self._dispatch(sop_class, msg)
+            return
+
+        # C-GET and C-MOVE wait on the peer (or the move destination) while
+        #   their sub-operations complete, which would stall an engine loop
+        #   so they get a thread of their own
+        if self.engine is not None and isinstance(sop_class, 
+                                        (QueryRetrieveGetServiceClass,
+                                         QueryRetrieveMoveServiceClass)):
+            self._worker = threading.Thread(target=self._run_worker,
+                                            args=(sop_class, msg))
+            self._worker.daemon = True
+            self._worker.start()
+            return
+
+        # Run SOPClass in SCP mode
+        sop_class.SCP(msg)
+
+    def _refuse_unsupported(self, msg, context_id):
+        """
+        Send a 'Refused: SOP Class not supported' (0x0122) response to a DIMSE
+        request whose SOP class hasn't been registered (Acceptor only)
+        
+        Parameters
+        ----------
+        msg - pynetdicom3.DIMSEparameters
+            The DIMSE service primitive received from the peer
+        context_id - int
+            The ID of the presentation context the message was sent under
+        """
+        if isinstance(getattr(msg, 'DataSet', None), SpooledDataset):
+            msg.DataSet.close()
+
+        # C-CANCEL requests have no response
+        if msg.MessageID is None:
+            return
+
+        rsp = msg.__class__()
+        rsp.MessageIDBeingRespondedTo = msg.MessageID
+        rsp.AffectedSOPClassUID = msg.AffectedSOPClassUID
+        if getattr(msg, 'AffectedSOPInstanceUID', None) is not None:
+            rsp.AffectedSOPInstanceUID = msg.AffectedSOPInstanceUID
+        rsp.Status = 0x0122
+
+        self.dimse.Send(rsp, context_id, self.acse.MaxPDULength)
+
+    def _index_contexts(self):
+        """
+        Index the accepted presentation contexts by ID and by abstract syntax
+        so they don't have to be searched for each message
+        """
+        self._contexts_by_id = {}
+        self._contexts_by_syntax = {}
+        for context in self.acse.presentation_contexts_accepted:
+            self._contexts_by_id[context.ID] = context
+            self._contexts_by_syntax.setdefault(
+                        uid_value(context.AbstractSyntax), []).append(context)
+
+    def _get_context(self, uid, transfer_syntax=None):
+        """
+        Return the ID and transfer syntax of the accepted presentation context
+        for the abstract syntax `uid`, None, None if there isn't one. If there
+        is more than one then the last accepted is used
+        
+        Parameters
+        ----------
+        uid - str or pydicom.uid.UID
+            The abstract syntax
+        transfer_syntax - pydicom.uid.UID, optional
+            If given then only a context with this transfer syntax is used
+        """
+        contexts = self._contexts_by_syntax.get(uid_value(uid), [])
+        for context in reversed(contexts):
+            if transfer_syntax is None or \
+                                transfer_syntax == context.TransferSyntax[0]:
+                return context.ID, context.TransferSyntax[0]
+        
+        return None, None
+
+    def _spool_c_store(self, command_set):
+        """
+        Return the SpooledDataset to write the data set of an incoming C-STORE
+        request to, or None if the AE isn't spooling data sets (Acceptor only)
+        
+        Parameters
+        ----------
+        command_set - pydicom.Dataset
+            The Command Set of the incoming message
+        """
+        if not self.ae.spool_c_store or command_set.CommandField != 0x0001:
+            return None
+        
+        return self.ae.on_c_store_spool(command_set)
+
+    def _close_spooled(self):
+        """
+        Close any data set that was still being spooled to file when the 
+        association ended
+        """
+        message = self.dimse.message
+        if message is not None and isinstance(message.data_set, 
+                                                        SpooledDataset):
+            message.data_set.close()
+            message.data_set = BytesIO()
+
+    def _run_worker(self, sop_class, msg):
+        """ Run a service class SCP outside the engine loop """
+        try:
+            sop_class.SCP(msg)
+        finally:
+            self._worker = None
+            # Let the engine loop know it can resume serving the association
+            self.engine.wakeup(self)
+
+    def _get_executor(self):
+        """
+        Return the executor the service class SCPs are run on: the AE's if it
+        has one, otherwise the engine's if it has one (an asyncio association
+        uses its event loop's executor), None to run them on the association
+        """
+        if self.ae.executor is not None:
+            return self.ae.executor
+        
+        return getattr(self.engine, 'executor', None)
+
+    def _dispatch(self, sop_class, msg):
+        """
+        Queue a service class SCP to be run on the executor. The SCPs for
+        an association are run one at a time in the order the requests were
+        received so the responses are sent in order (Acceptor only)
+        
+        Parameters
+        ----------
+        sop_class - pynetdicom3.SOPclass.ServiceClass
+            The service class to run the SCP of
+        msg - pynetdicom3.DIMSEparameters
+            The DIMSE service primitive received from the peer
+        """
+        # The DIMSE provider released the message's memory once it was
+        #   complete, but it's held until the SCP has run
+        nbytes = self.dimse._message_length
+        self.ae._reserve_memory(nbytes)
+        
+        with self._dispatch_lock:
+            self._dispatched.append((sop_class, msg, nbytes))
+            if isinstance(sop_class, (QueryRetrieveGetServiceClass,
+                                      QueryRetrieveMoveServiceClass)):
+                self._dispatch_retrieves += 1
+            
+            # Otherwise the worker running the previous SCP submits it
+            if len(self._dispatched) == 1:
+                self._get_executor().submit(self._run_dispatched)
+
+    def _run_dispatched(self):
+        """
+        Run the oldest queued SCP on an executor worker, then submit the next
+        one (Acceptor only)
+        """
+        sop_class, msg, nbytes = self._dispatched[0]
+        try:
+            if not self._Kill:
+                sop_class.SCP(msg)
+        except Exception as e:
+            logger.error("Exception in the %s SCP" %sop_class.__class__.__name__)
+            logger.exception(e)
+        finally:
+            with self._dispatch_lock:
+                self._dispatched.popleft()
+                if isinstance(sop_class, (QueryRetrieveGetServiceClass,
+                                          QueryRetrieveMoveServiceClass)):
+                    self._dispatch_retrieves -= 1
+                
+                # Resubmitting rather than looping lets the other 
+                #   associations' requests have a turn on the workers
+                if self._dispatched:
+                    self._get_executor().submit(self._run_dispatched)
+            
+            self.ae._release_memory(nbytes)
+            
+            # Let the engine loop or run loop know it can resume serving the
+            #   association
+            if self.engine is not None:
+                self.engine.wakeup(self)
+            else:
+                self.dul.to_user_queue.interrupt()
+
+    def _check_association_end(self, release=True):
+        """
+        Check for a peer A-RELEASE or A-ABORT and for the DUL idle timer
+        expiring (Acceptor only)
+        
+        Parameters
+        ----------
+        release - bool, optional
+            If False then a peer A-RELEASE is left for a later check
+        
+        Returns
+        -------
+        bool
+            True if the association has been released or aborted, False 
+            otherwise
+        """
+        # Check for release request
+        if release and self.acse.CheckRelease():
+            # Callback trigger
+            self.debug_association_released()
+            self.ae.on_association_released()
+            self.kill()
+            return True
+
+        # Check for abort
+        if self.acse.CheckAbort():
+            # Callback trigger
+            self.debug_association_aborted()
+            self.ae.on_association_aborted(None)
+            self.kill()
+            return True
+
+        # Check if idle timer has expired, the DUL is still in
+        #   Sta6 so the association must be aborted not just killed
+        if self.dul.idle_timer_expired():
+            self.abort()
+            return True
+        
+        return False
+
+    def _acceptor_step(self):
+        """
+        Handle whatever the DUL has passed up to the association without 
+        blocking. Used instead of run() when the association is served by an
+        engine loop (Acceptor only)
+        
+        Returns
+        -------
+        bool
+            True if anything was processed, False otherwise
+        """
+        # A C-GET or C-MOVE is in progress and is consuming the DUL's output
+        if self._Kill or self._worker is not None or self._dispatch_retrieves:
+            return False
+        
+        if not self.is_established:
+            if not isinstance(self.dul.Peek(), A_ASSOCIATE):
+                return False
+            
+            self._handle_association_request(self.dul.Receive())
+            return True
+        
+        # A P-DATA primitive may be consumed without completing a message
+        is_pdata = isinstance(self.dul.Peek(), P_DATA)
+        
+        msg, msg_context_id = self.dimse.Receive(False, self.dimse_timeout)
+        if msg:
+            self._process_dimse_message(msg, msg_context_id)
+            return True
+        
+        if self._check_association_end(not self._dispatched):
+            return True
+        
+        return is_pdata
+
+    def _user_information(self):
+        """
+        Return the extended negotiation items to send with the A-ASSOCIATE-RQ
+        and the Asynchronous Operations Window item among them, None if one
+        isn't proposed (Requestor only)
+        """
+        user_information = list(self.ext_neg or [])
+        async_ops = self._proposed_async_ops(user_information)
+        if async_ops is not None and async_ops not in user_information:
+            user_information.append(async_ops)
+        
+        return user_information, async_ops
+
+    def _negotiate_window(self, async_ops, assoc_rsp):
+        """
+        Set the number of outstanding operations from the peer's accepted
+        A-ASSOCIATE response. Without an Asynchronous Operations Window item
+        in the response only one operation may be outstanding (Requestor only)
+        
+        Parameters
+        ----------
+        async_ops - AsynchronousOperationsWindowNegotiation or None
+            The item proposed in the request, see _user_information()
+        assoc_rsp - pynetdicom3.primitives.A_ASSOCIATE
+            The peer's response
+        """
+        if async_ops is None:
+            return
+        
+        for item in assoc_rsp.user_information:
+            if isinstance(item, AsynchronousOperationsWindowNegotiation):
+                # The peer's values are from its own point of view 
+                #   (PS3.7 D.3.3.3)
+                self.max_operations_invoked = _window(
+                                item.maximum_number_operations_performed,
+                                async_ops.maximum_number_operations_invoked)
+                self.max_operations_performed = _window(
+                                item.maximum_number_operations_invoked,
+                                async_ops.maximum_number_operations_performed)
+
+    def _proposed_async_ops(self, user_information):
+        """
+        Return the Asynchronous Operations Window item to propose when
+        requesting an association, or None if the AE only supports one
+        outstanding operation at a time (Requestor only)
+        
+        Parameters
+        ----------
+        user_information - list
+            The extended negotiation items, if it already contains an 
+            AsynchronousOperationsWindowNegotiation item then it's used
+        """
+        for item in user_information:
+            if isinstance(item, AsynchronousOperationsWindowNegotiation):
+                return item
+        
+        if self.ae.maximum_operations_invoked == 1 and \
+                            self.ae.maximum_operations_performed == 1:
+            return None
+        
+        item = AsynchronousOperationsWindowNegotiation()
+        item.maximum_number_operations_invoked = \
+                                    self.ae.maximum_operations_invoked
+        item.maximum_number_operations_performed = \
+                                    self.ae.maximum_operations_performed
+        
+        return item
+
+    def _receive_response(self):
+        """
+        Wait for the next complete DIMSE message from the peer
+        
+        Returns
+        -------
+        pynetdicom3.DIMSEparameters DIMSE service primitive or None
+            The received message, or None if the association ended or no 
+            message was received within the DIMSE timeout
+        """
+        start = time.time()
+        while not self._Kill and self.dul.is_alive():
+            changes = self.dul.to_user_queue.changes
+            rsp, _ = self.dimse.Receive(False, self.dimse_timeout)
+            if rsp is not None:
+                return rsp
+            
+            timeout = None
+            if self.dimse_timeout:
+                timeout = start + self.dimse_timeout - time.time()
+                if timeout < 0:
+                    logger.error("DIMSE timeout reached while waiting for a "
+                                 "response")
+                    return None
+            
+            self._wait_for_dul(changes, timeout)
+        
+        return None
+
+    def _wait_for_dul(self, changes, timeout=None):
+        """
+        Block until a primitive is put in or taken out of the DUL's 
+        to_user_queue, the association is killed or `timeout` seconds have 
+        passed, waking at least every WAIT_INTERVAL seconds
+        
+        Parameters
+        ----------
+        changes - int
+            The queue's `changes` attribute, read before it was last checked
+        timeout - float, optional
+            The most time (in seconds) to wait (default: WAIT_INTERVAL)
+        """
+        if timeout is None or timeout > WAIT_INTERVAL:
+            timeout = WAIT_INTERVAL
+        
+        self.dul.to_user_queue.wait(changes, timeout)
+
+    def _receive_pipelined(self, outstanding, limit):
+        """
+        Receive responses to outstanding requests until no more than `limit`
+        requests are still outstanding
+        
+        Parameters
+        ----------
+        outstanding - dict
+            The outstanding requests as {MessageID : key}, where `key` is 
+            whatever the caller uses to identify the request
+        limit - int
+            The number of requests that may remain outstanding
+        
+        Yields
+        ------
+        key, rsp
+            The request's key and the response primitive. If the association
+            ends or times out then None is yielded as the response for every
+            outstanding request
+        """
+        while len(outstanding) > limit:
+            rsp = self._receive_response()
+            
+            if rsp is None:
+                for key in list(outstanding.values()):
+                    yield key, None
+                
+                outstanding.clear()
+                return
+            
+            msg_id = rsp.MessageIDBeingRespondedTo
+            if msg_id not in outstanding:
+                logger.error("Received a response to an unknown request, "
+                             "Message ID %s" %msg_id)
+                continue
+            
+            key = outstanding[msg_id]
+            
+            # C-FIND, C-GET and C-MOVE send Pending responses before the 
+            #   final one
+            if rsp.Status not in [0xFF00, 0xFF01]:
+                del outstanding[msg_id]
+            
+            yield key, rsp
+
+    def _send_pipelined(self, primitive, context_id, key, outstanding):
+        """
+        Send a request once the Asynchronous Operations Window has room for
+        it, receiving responses to outstanding requests while waiting
+        
+        Parameters
+        ----------
+        primitive - pynetdicom3.DIMSEparameters DIMSE service primitive
+            The request to send
+        context_id - int
+            The ID of the presentation context to send the request under
+        key
+            Whatever the caller uses to identify the request
+        outstanding - dict
+            The outstanding requests, see _receive_pipelined()
+        
+        Yields
+        ------
+        key, rsp
+            The responses received while waiting, see _receive_pipelined()
+        """
+        if self.max_operations_invoked != 0:
+            for result in self._receive_pipelined(outstanding, 
+                                            self.max_operations_invoked - 1):
+                yield result
+        
+        if primitive.MessageID in outstanding:
+            logger.warning("Message ID %s is already in use by an outstanding "
+                           "request" %primitive.MessageID)
+        
+        self.dimse.Send(primitive, context_id, self.acse.MaxPDULength)
+        outstanding[primitive.MessageID] = key
+
 
     # DIMSE-C services provided by the Association
     def send_c_echo(self, msg_id=1):
@@ -578,24 +1202,9 @@ class Association(threading.Thread):
             # Service Class - used to determine Status
             service_class = VerificationServiceClass()
             
-            uid = UID('1.2.840.10008.1.1')
-            
-            # Determine the Presentation Context we are operating under
-            #   and hence the transfer syntax to use for encoding `dataset`
-            transfer_syntax = None
-            for context in self.acse.context_manager.accepted:
-                if uid == context.AbstractSyntax:
-                    transfer_syntax = context.TransferSyntax[0]
-                    context_id = context.ID
-                    
-            if transfer_syntax is None:
-                logger.error("No Presentation Context for: '%s'" %uid)
+            primitive, context_id = self._c_echo_request(msg_id)
+            if primitive is None:
                 return None
-            
-            # Build C-STORE request primitive
-            primitive = C_ECHO_ServiceParameters()
-            primitive.MessageID = msg_id
-            primitive.AffectedSOPClassUID = uid
 
             self.dimse.Send(primitive, context_id, self.acse.MaxPDULength)
 
@@ -612,6 +1221,85 @@ class Association(threading.Thread):
             raise RuntimeError("The association with a peer SCP must be "
                 "established before sending a C-ECHO request")
 
+    def _c_echo_request(self, msg_id):
+        """
+        Build the C-ECHO request primitive, see send_c_echo() for the 
+        parameters
+        
+        Returns
+        -------
+        primitive, context_id
+            The C-ECHO request primitive and the ID of the presentation 
+            context to send it under, or None, None if there's no 
+            presentation context for the Verification SOP Class
+        """
+        uid = UID('1.2.840.10008.1.1')
+        
+        # Determine the Presentation Context we are operating under
+        context_id, transfer_syntax = self._get_context(uid)
+        
+        if transfer_syntax is None:
+            logger.error("No Presentation Context for: '%s'" %uid)
+            return None, None
+        
+        # Build C-ECHO request primitive
+        primitive = C_ECHO_ServiceParameters()
+        primitive.MessageID = msg_id
+        primitive.AffectedSOPClassUID = uid
+        
+        return primitive, context_id
+
+    def send_c_echo_pipelined(self, count, msg_id=1):
+        """
+        Send `count` C-ECHO requests to the peer AE without waiting for each
+        response before sending the next request
+        
+        Up to `max_operations_invoked` requests are outstanding at a time, see
+        send_c_store_pipelined()
+        
+        Parameters
+        ----------
+        count - int
+            The number of C-ECHO requests to send
+        msg_id - int, optional
+            The message ID of the first request, subsequent requests use
+            the following IDs (default: 1)
+        
+        Yields
+        ------
+        msg_id : int
+            The message ID of the request
+        status : pynetdicom3.SOPclass.Status or None
+            The status of the response, None if the association ended or the
+            DIMSE service timed out before receiving a response
+        """
+        if not self.is_established:
+            raise RuntimeError("The association with a peer SCP must be "
+                "established before sending a C-ECHO request")
+        
+        service_class = VerificationServiceClass()
+        
+        context_id, _ = self._get_context('1.2.840.10008.1.1')
+        
+        if context_id is None:
+            logger.error("No Presentation Context for: '1.2.840.10008.1.1'")
+            return
+        
+        outstanding = {}
+        for ii in range(count):
+            primitive = C_ECHO_ServiceParameters()
+            primitive.MessageID = _next_message_id(msg_id, ii)
+            primitive.AffectedSOPClassUID = UID('1.2.840.10008.1.1')
+            
+            for key, rsp in self._send_pipelined(primitive, context_id, 
+                                                 primitive.MessageID, 
+                                                 outstanding):
+                yield key, service_class.Code2Status(rsp.Status) \
+                                                    if rsp else None
+        
+        for key, rsp in self._receive_pipelined(outstanding, 0):
+            yield key, service_class.Code2Status(rsp.Status) if rsp else None
+
     def send_c_store(self, dataset, msg_id=1, priority=2):
         """
         Send a C-STORE request message to the peer AE Storage SCP
@@ -729,51 +1417,9 @@ class Association(threading.Thread):
             # Service Class - used to determine Status
             service_class = StorageServiceClass()
             
-            # Determine the Presentation Context we are operating under
-            #   and hence the transfer syntax to use for encoding `dataset`
-            transfer_syntax = None
-            for context in self.acse.context_manager.accepted:
-                if dataset.SOPClassUID == context.AbstractSyntax:
-                    transfer_syntax = context.TransferSyntax[0]
-                    context_id = context.ID
-                    
-            if transfer_syntax is None:
-                logger.error("No Presentation Context for: '%s'" 
-                                                    %dataset.SOPClassUID)
-                logger.error("Store SCU failed due to there being no valid "
-                        "presentation context for the current dataset")
-                return service_class.CannotUnderstand
-            
-            # Set the correct VR for ambiguous elements
-            dataset = correct_ambiguous_vr(dataset, transfer_syntax)
-            
-            # Build C-STORE request primitive
-            primitive = C_STORE_ServiceParameters()
-            primitive.MessageID = msg_id
-            primitive.AffectedSOPClassUID = dataset.SOPClassUID
-            primitive.AffectedSOPInstanceUID = dataset.SOPInstanceUID
-            
-            # Message priority
-            if priority in [0x0000, 0x0001, 0x0002]:
-                primitive.Priority = priority
-            else:
-                logger.warning("C-STORE SCU: Invalid priority value "
-                                                            "'%s'" %priority)
-                primitive.Priorty = 0x0000
-            
-            # Encode the dataset using the agreed transfer syntax
-            ds = encode(dataset,
-                        transfer_syntax.is_implicit_VR,
-                        transfer_syntax.is_little_endian)
-            
-            if ds is not None:
-                primitive.DataSet = BytesIO(ds)
-            
-            #for s in wrap_list(primitive.DataSet):
-            #    print(s)
-            
-            # If we failed to encode our dataset
-            else:
+            primitive, context_id = self._c_store_request(dataset, msg_id,
+                                                          priority)
+            if primitive is None:
                 return service_class.CannotUnderstand
 
             # Send C-STORE request primitive to DIMSE
@@ -793,6 +1439,222 @@ class Association(threading.Thread):
             raise RuntimeError("The association with a peer SCP must be "
                     "established before sending a C-STORE request")
 
+    def _c_store_request(self, dataset, msg_id, priority):
+        """
+        Build the C-STORE request primitive for `dataset`, see send_c_store()
+        for the parameters
+        
+        Returns
+        -------
+        primitive, context_id
+            The C-STORE request primitive and the ID of the presentation 
+            context to send it under, or None, None if there's no 
+            presentation context for `dataset` or it can't be encoded
+        """
+        # Determine the Presentation Context we are operating under
+        #   and hence the transfer syntax to use for encoding `dataset`
+        context_id, transfer_syntax = self._get_context(dataset.SOPClassUID)
+
+        if transfer_syntax is None:
+            logger.error("No Presentation Context for: '%s'" 
+                                                %dataset.SOPClassUID)
+            logger.error("Store SCU failed due to there being no valid "
+                    "presentation context for the current dataset")
+            return None, None
+        
+        # Set the correct VR for ambiguous elements
+        dataset = correct_ambiguous_vr(dataset, transfer_syntax)
+        
+        # Build C-STORE request primitive
+        primitive = C_STORE_ServiceParameters()
+        primitive.MessageID = msg_id
+        primitive.AffectedSOPClassUID = dataset.SOPClassUID
+        primitive.AffectedSOPInstanceUID = dataset.SOPInstanceUID
+        
+        # Message priority
+        if priority in [0x0000, 0x0001, 0x0002]:
+            primitive.Priority = priority
+        else:
+            logger.warning("C-STORE SCU: Invalid priority value "
+                                                        "'%s'" %priority)
+            primitive.Priority = 0x0000
+        
+        # Encode the dataset using the agreed transfer syntax
+        ds = encode(dataset,
+                    transfer_syntax.is_implicit_VR,
+                    transfer_syntax.is_little_endian)
+        
+        # If we failed to encode our dataset
+        if ds is None:
+            return None, None
+        
+        primitive.DataSet = BytesIO(ds)
+        
+        return primitive, context_id
+
+    def send_c_store_pipelined(self, datasets, msg_id=1, priority=2):
+        """
+        Send a C-STORE request to the peer AE Storage SCP for each of 
+        `datasets`, without waiting for each response before sending the next
+        request
+        
+        Up to `max_operations_invoked` requests are outstanding at a time, as
+        negotiated with the peer using the Asynchronous Operations Window 
+        (see ApplicationEntity.maximum_operations_invoked). Without 
+        negotiation this is the same as calling send_c_store() for each 
+        dataset. Responses are matched to their requests by Message ID
+        
+        Parameters
+        ----------
+        datasets - iterable of pydicom.Dataset
+            The DICOM datasets to send to the peer, each is only encoded
+            once there's room for its request
+        msg_id - int, optional
+            The message ID of the first request, subsequent requests use
+            the following IDs (default: 1)
+        priority : int, optional
+            The C-STORE operation priority, see send_c_store() (default: 2)
+        
+        Yields
+        ------
+        dataset : pydicom.Dataset
+            The dataset that was sent
+        status : pynetdicom3.SOPclass.Status or None
+            The status for the dataset's C-STORE operation, see 
+            send_c_store(). None if the association ended or the DIMSE 
+            service timed out before receiving a response
+        
+        Responses are yielded in the order they're received, which may not
+        be the order the datasets were sent in
+        """
+        if not self.is_established:
+            raise RuntimeError("The association with a peer SCP must be "
+                    "established before sending a C-STORE request")
+        
+        service_class = StorageServiceClass()
+        
+        outstanding = {}
+        for dataset in datasets:
+            if not dataset._is_uncompressed_transfer_syntax():
+                logger.error("Unable to send the dataset due to pydicom not "
+                             "supporting compressed datasets")
+                yield dataset, service_class.CannotUnderstand
+                continue
+            
+            primitive, context_id = self._c_store_request(dataset, msg_id,
+                                                          priority)
+            if primitive is None:
+                yield dataset, service_class.CannotUnderstand
+                continue
+            
+            for key, rsp in self._send_pipelined(primitive, context_id, 
+                                                 dataset, outstanding):
+                yield key, service_class.Code2Status(rsp.Status) \
+                                                    if rsp else None
+            
+            msg_id = _next_message_id(msg_id)
+        
+        for key, rsp in self._receive_pipelined(outstanding, 0):
+            yield key, service_class.Code2Status(rsp.Status) if rsp else None
+
+    def send_c_store_file(self, path, msg_id=1, priority=2):
+        """
+        Send the DICOM Part 10 file at `path` to the peer AE Storage SCP as a
+        C-STORE request
+        
+        The File Meta Information is used to determine the presentation 
+        context. If a context has been accepted with the same transfer syntax
+        as the file then the encoded data set is streamed from the file
+        one P-DATA at a time, without being decoded or loaded into memory in
+        full. Otherwise the file is read as a pydicom Dataset and sent using
+        send_c_store()
+        
+        Parameters
+        ----------
+        path - str
+            The path to the DICOM Part 10 file to send to the peer
+        msg_id - int, optional
+            The message ID, must be between 0 and 65535, inclusive. (default: 1)
+        priority : int, optional
+            The C-STORE operation priority (if supported by the peer), one of:
+                2 - Low (default)
+                1 - High
+                0 - Medium
+
+        Returns
+        -------
+        status : pynetdicom3.SOPclass.Status or None
+            The status for the requested C-STORE operation, see send_c_store()
+            
+            Returns None if the DIMSE service timed out before receiving a 
+            response
+            
+        Raises
+        ------
+        ValueError
+            If the file at `path` isn't a DICOM Part 10 file
+        """
+        if not self.is_established:
+            raise RuntimeError("The association with a peer SCP must be "
+                    "established before sending a C-STORE request")
+        
+        service_class = StorageServiceClass()
+        
+        with open(path, 'rb') as fp:
+            meta = read_file_meta(fp)
+            transfer_syntax = UID(meta.TransferSyntaxUID)
+            sop_class = meta.MediaStorageSOPClassUID
+            
+            # Look for a presentation context that needs no conversion of
+            #   the encoded data set
+            context_id, _ = self._get_context(sop_class, transfer_syntax)
+            
+            if context_id is not None:
+                # Use the UIDs from the data set itself, as send_c_store() does
+                sop_class, sop_instance = \
+                            read_sop_uids(fp, transfer_syntax.is_implicit_VR,
+                                          transfer_syntax.is_little_endian,
+                                          transfer_syntax.is_deflated)
+                
+                # Build C-STORE request primitive
+                primitive = C_STORE_ServiceParameters()
+                primitive.MessageID = msg_id
+                primitive.AffectedSOPClassUID = sop_class
+                primitive.AffectedSOPInstanceUID = sop_instance
+                
+                # Message priority
+                if priority in [0x0000, 0x0001, 0x0002]:
+                    primitive.Priority = priority
+                else:
+                    logger.warning("C-STORE SCU: Invalid priority value "
+                                                            "'%s'" %priority)
+                    primitive.Priority = 0x0000
+                
+                # The file is positioned at the start of the data set
+                primitive.DataSet = fp
+                
+                # Send C-STORE request primitive to DIMSE, this returns once
+                #   the last fragment has been read from the file
+                self.dimse.Send(primitive, context_id, self.acse.MaxPDULength)
+        
+        if context_id is None:
+            logger.info("No Presentation Context for '%s' with a transfer "
+                        "syntax of '%s', the file will be decoded before "
+                        "sending" %(sop_class, transfer_syntax))
+            
+            dataset = read_file(path)
+            return self.send_c_store(dataset, msg_id, priority)
+        
+        # Wait for C-STORE response primitive
+        #   returns a C_STORE_ServiceParameters primitive
+        rsp, _ = self.dimse.Receive(True, self.dimse_timeout)
+        
+        status = None
+        if rsp is not None:
+            status = service_class.Code2Status(rsp.Status)
+
+        return status
+
     def send_c_find(self, dataset, msg_id=1, priority=2, query_model='W'):
         """
         Send a C-FIND request message to the peer AE
@@ -830,48 +1692,12 @@ class Association(threading.Thread):
             The resulting dataset(s) from the C-FIND operation
         """
         if self.is_established:
-            service_class = QueryRetrieveFindServiceClass()
-            
-            if query_model == 'W':
-                sop_class = ModalityWorklistInformationFind()
-                service_class = ModalityWorklistServiceSOPClass()
-            elif query_model == "P":
-                # Four level hierarchy, patient, study, series, composite object
-                sop_class = PatientRootQueryRetrieveInformationModelFind()
-            elif query_model == "S":
-                # Three level hierarchy, study, series, composite object
-                sop_class = StudyRootQueryRetrieveInformationModelFind()
-            elif query_model == "O":
-                # Retired
-                sop_class = PatientStudyOnlyQueryRetrieveInformationModelFind()
-            else:
-                raise ValueError("Association::send_c_find() query_model "
-                    "must be one of ['W'|'P'|'S'|'O']")
-            
-            # Determine the Presentation Context we are operating under
-            #   and hence the transfer syntax to use for encoding `dataset`
-            transfer_syntax = None
-            for context in self.acse.context_manager.accepted:
-                if sop_class.UID == context.AbstractSyntax:
-                    transfer_syntax = context.TransferSyntax[0]
-                    context_id = context.ID
+            service_class, primitive, context_id, transfer_syntax = \
+                self._c_find_request(dataset, msg_id, priority, query_model)
                     
-            if transfer_syntax is None:
-                logger.error("No Presentation Context for: '%s'" 
-                                                    %sop_class.UID)
-                logger.error("Find SCU failed due to there being no valid "
-                        "presentation context for the current dataset")
+            if primitive is None:
                 return service_class.IdentifierDoesNotMatchSOPClass
             
-            # Build C-FIND primitive
-            primitive = C_FIND_ServiceParameters()
-            primitive.MessageID = msg_id
-            primitive.AffectedSOPClassUID = sop_class.UID
-            primitive.Priority = priority
-            primitive.Identifier = BytesIO(encode(dataset,
-                                           transfer_syntax.is_implicit_VR,
-                                           transfer_syntax.is_little_endian))
-            
             logger.info('Find SCU Request Identifiers:')
             logger.info('')
             logger.info('# DICOM Dataset')
@@ -885,12 +1711,13 @@ class Association(threading.Thread):
             # Get the responses from the peer
             ii = 1
             while True:
-                time.sleep(0.001)
+                changes = self.dul.to_user_queue.changes
                 
                 # Wait for c-find responses
                 rsp, _ = self.dimse.Receive(False, self.dimse.dimse_timeout)
                 
                 if not rsp:
+                    self._wait_for_dul(changes)
                     continue
 
                 # Decode the dataset
@@ -926,6 +1753,134 @@ class Association(threading.Thread):
             raise RuntimeError("The association with a peer SCP must be "
                 "established before sending a C-FIND request")
 
+    def _c_find_request(self, dataset, msg_id, priority, query_model):
+        """
+        Build the C-FIND request primitive for `dataset`, see send_c_find()
+        for the parameters
+        
+        Returns
+        -------
+        service_class, primitive, context_id, transfer_syntax
+            The service class used to determine the Status, the C-FIND 
+            request primitive, the ID of the presentation context to send it
+            under and the context's transfer syntax. The primitive, context ID
+            and transfer syntax are None if there's no presentation context
+            for `query_model`
+        """
+        service_class = QueryRetrieveFindServiceClass()
+        
+        if query_model == 'W':
+            sop_class = ModalityWorklistInformationFind()
+            service_class = ModalityWorklistServiceSOPClass()
+        elif query_model == "P":
+            # Four level hierarchy, patient, study, series, composite object
+            sop_class = PatientRootQueryRetrieveInformationModelFind()
+        elif query_model == "S":
+            # Three level hierarchy, study, series, composite object
+            sop_class = StudyRootQueryRetrieveInformationModelFind()
+        elif query_model == "O":
+            # Retired
+            sop_class = PatientStudyOnlyQueryRetrieveInformationModelFind()
+        else:
+            raise ValueError("Association::send_c_find() query_model "
+                "must be one of ['W'|'P'|'S'|'O']")
+        
+        # Determine the Presentation Context we are operating under
+        #   and hence the transfer syntax to use for encoding `dataset`
+        context_id, transfer_syntax = self._get_context(sop_class.UID)
+
+        if transfer_syntax is None:
+            logger.error("No Presentation Context for: '%s'" 
+                                                %sop_class.UID)
+            logger.error("Find SCU failed due to there being no valid "
+                    "presentation context for the current dataset")
+            return service_class, None, None, None
+        
+        # Build C-FIND primitive
+        primitive = C_FIND_ServiceParameters()
+        primitive.MessageID = msg_id
+        primitive.AffectedSOPClassUID = sop_class.UID
+        primitive.Priority = priority
+        primitive.Identifier = BytesIO(encode(dataset,
+                                       transfer_syntax.is_implicit_VR,
+                                       transfer_syntax.is_little_endian))
+        
+        return service_class, primitive, context_id, transfer_syntax
+
+    def send_c_find_pipelined(self, datasets, msg_id=1, priority=2, 
+                                                            query_model='W'):
+        """
+        Send a C-FIND request to the peer AE for each of `datasets`, without
+        waiting for each query to complete before sending the next request
+        
+        Up to `max_operations_invoked` requests are outstanding at a time, see
+        send_c_store_pipelined(). Responses are matched to their requests by
+        Message ID
+        
+        Parameters
+        ----------
+        datasets - iterable of pydicom.Dataset
+            The Key Attributes for each query
+        msg_id - int, optional
+            The message ID of the first request, subsequent requests use
+            the following IDs (default: 1)
+        priority : int, optional
+            The C-FIND operation priority, see send_c_find() (default: 2)
+        query_model : str, optional
+            The Query/Retrieve Information Model to use, see send_c_find()
+            (default: 'W')
+        
+        Yields
+        ------
+        query : pydicom.Dataset
+            The query the response is for
+        status : pynetdicom3.SOPclass.Status or None
+            The status of the response, None if the association ended or the
+            DIMSE service timed out before receiving a response
+        identifier : pydicom.Dataset or None
+            The response's Identifier, None if there is none
+        
+        Every response is yielded, Pending responses are followed by a final
+        response for each query
+        """
+        if not self.is_established:
+            raise RuntimeError("The association with a peer SCP must be "
+                "established before sending a C-FIND request")
+        
+        def result(key, rsp):
+            dataset, service_class, transfer_syntax = key
+            if rsp is None:
+                return dataset, None, None
+            
+            identifier = None
+            if rsp.Identifier is not None and \
+                                        rsp.Identifier.getvalue() != b'':
+                identifier = decode(rsp.Identifier,
+                                    transfer_syntax.is_implicit_VR,
+                                    transfer_syntax.is_little_endian)
+            
+            return dataset, service_class.Code2Status(rsp.Status), identifier
+        
+        outstanding = {}
+        for dataset in datasets:
+            service_class, primitive, context_id, transfer_syntax = \
+                self._c_find_request(dataset, msg_id, priority, query_model)
+            
+            if primitive is None:
+                yield dataset, service_class.IdentifierDoesNotMatchSOPClass, \
+                                                                        None
+                continue
+            
+            request = (dataset, service_class, transfer_syntax)
+            for key, rsp in self._send_pipelined(primitive, context_id, 
+                                                 request, outstanding):
+                yield result(key, rsp)
+            
+            msg_id = _next_message_id(msg_id)
+        
+        for key, rsp in self._receive_pipelined(outstanding, 0):
+            yield result(key, rsp)
+
     def send_c_cancel_find(self, msg_id, query_model):
         """
         See PS3.7 9.3.2.3
@@ -962,12 +1917,8 @@ class Association(threading.Thread):
             
             # Determine the Presentation Context we are operating under
             #   and hence the transfer syntax to use for encoding `dataset`
-            transfer_syntax = None
-            for context in self.acse.context_manager.accepted:
-                if sop_class.UID == context.AbstractSyntax:
-                    transfer_syntax = context.TransferSyntax[0]
-                    context_id = context.ID
-                    
+            context_id, transfer_syntax = self._get_context(sop_class.UID)
+
             if transfer_syntax is None:
                 logger.error("No Presentation Context for: '%s'" 
                                                     %sop_class.UID)
@@ -1039,12 +1990,8 @@ class Association(threading.Thread):
 
             # Determine the Presentation Context we are operating under
             #   and hence the transfer syntax to use for encoding `dataset`
-            transfer_syntax = None
-            for context in self.acse.context_manager.accepted:
-                if sop_class.UID == context.AbstractSyntax:
-                    transfer_syntax = context.TransferSyntax[0]
-                    context_id = context.ID
-                    
+            context_id, transfer_syntax = self._get_context(sop_class.UID)
+
             if transfer_syntax is None:
                 logger.error("No Presentation Context for: '%s'" 
                                                     %sop_class.UID)
@@ -1075,10 +2022,14 @@ class Association(threading.Thread):
             # Get the responses from peer
             ii = 1
             while True:
-                time.sleep(0.001)
+                changes = self.dul.to_user_queue.changes
                 
                 rsp, context_id = self.dimse.Receive(False, self.dimse.dimse_timeout)
                 
+                if not rsp:
+                    self._wait_for_dul(changes)
+                    continue
+                
                 if rsp.__class__ == C_MOVE_ServiceParameters:
                     status = service_class.Code2Status(rsp.Status)
                     dataset = decode(rsp.Identifier,
@@ -1169,12 +2120,8 @@ class Association(threading.Thread):
             
             # Determine the Presentation Context we are operating under
             #   and hence the transfer syntax to use for encoding `dataset`
-            transfer_syntax = None
-            for context in self.acse.context_manager.accepted:
-                if sop_class.UID == context.AbstractSyntax:
-                    transfer_syntax = context.TransferSyntax[0]
-                    context_id = context.ID
-                    
+            context_id, transfer_syntax = self._get_context(sop_class.UID)
+
             if transfer_syntax is None:
                 logger.error("No Presentation Context for: '%s'" 
                                                     %sop_class.UID)
@@ -1239,12 +2186,8 @@ class Association(threading.Thread):
             
             # Determine the Presentation Context we are operating under
             #   and hence the transfer syntax to use for encoding `dataset`
-            transfer_syntax = None
-            for context in self.acse.context_manager.accepted:
-                if sop_class.UID == context.AbstractSyntax:
-                    transfer_syntax = context.TransferSyntax[0]
-                    context_id = context.ID
-                    
+            context_id, transfer_syntax = self._get_context(sop_class.UID)
+
             if transfer_syntax is None:
                 logger.error("No Presentation Context for: '%s'" 
                                                     %sop_class.UID)
@@ -1399,12 +2342,8 @@ class Association(threading.Thread):
             
             # Determine the Presentation Context we are operating under
             #   and hence the transfer syntax to use for encoding `dataset`
-            transfer_syntax = None
-            for context in self.acse.context_manager.accepted:
-                if sop_class.UID == context.AbstractSyntax:
-                    transfer_syntax = context.TransferSyntax[0]
-                    context_id = context.ID
-                    
+            context_id, transfer_syntax = self._get_context(sop_class.UID)
+
             if transfer_syntax is None:
                 logger.error("No Presentation Context for: '%s'" 
                                                     %sop_class.UID)
@@ -1428,12 +2367,8 @@ class Association(threading.Thread):
             
             # Determine the Presentation Context we are operating under
             #   and hence the transfer syntax to use for encoding `dataset`
-            transfer_syntax = None
-            for context in self.acse.context_manager.accepted:
-                if sop_class.UID == context.AbstractSyntax:
-                    transfer_syntax = context.TransferSyntax[0]
-                    context_id = context.ID
-                    
+            context_id, transfer_syntax = self._get_context(sop_class.UID)
+
             if transfer_syntax is None:
                 logger.error("No Presentation Context for: '%s'" 
                                                     %sop_class.UID)
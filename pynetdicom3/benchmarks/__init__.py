@@ -0,0 +1,11 @@
+# The benchmarks measure the latency and throughput of an SCU and SCP running
+# in the same process over the loopback interface. Run them with
+#
+#   python -m pynetdicom3.benchmarks -o results.json
+#
+# and compare the results of two revisions with
+#
+#   python -m pynetdicom3.benchmarks --compare old.json new.json
+
+from pynetdicom3.benchmarks.loopback import BENCHMARKS, LoopbackSCP, \
+    compare, make_dataset, run_benchmarks
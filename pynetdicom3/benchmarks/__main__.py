@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+"""
+    Runs the loopback benchmarks and writes the results as JSON
+"""
+
+import argparse
+import json
+import logging
+import sys
+
+from pynetdicom3.benchmarks.loopback import BENCHMARKS, STORE_SIZES, \
+    compare, run_benchmarks
+
+logger = logging.Logger('benchmarks')
+stream_logger = logging.StreamHandler()
+formatter = logging.Formatter('%(levelname).1s: %(message)s')
+stream_logger.setFormatter(formatter)
+logger.addHandler(stream_logger)
+logger.setLevel(logging.ERROR)
+
+def _setup_argparser():
+    parser = argparse.ArgumentParser(
+        description="Measures the C-ECHO latency, C-STORE throughput, C-FIND "
+                    "Pending response rate and association setup and "
+                    "teardown time of an SCU and SCP running in the same "
+                    "process over the loopback interface",
+        usage="python -m pynetdicom3.benchmarks [options]")
+
+    parser.add_argument("-b", "--benchmark", metavar='[n]ame',
+                        help="run benchmark n, may be given more than once "
+                             "(default: all of %s)" 
+                                        %', '.join(sorted(BENCHMARKS)),
+                        choices=sorted(BENCHMARKS),
+                        action="append")
+    parser.add_argument("-o", "--output", metavar='[f]ilename',
+                        help="write the results to file f rather than stdout",
+                        type=str)
+    parser.add_argument("--engine-loops", metavar='[n]umber',
+                        help="serve the SCP's associations with n engine "
+                             "loops (default: 0, a thread per association)",
+                        type=int,
+                        default=0)
+    parser.add_argument("--sizes", metavar='[s]izes',
+                        help="comma separated C-STORE Pixel Data sizes in "
+                             "bytes (default: %s)" 
+                                    %','.join([str(ss) for ss in STORE_SIZES]),
+                        type=str)
+    parser.add_argument("--quick",
+                        help="run fewer iterations of each benchmark",
+                        action="store_true")
+    parser.add_argument("--compare", metavar='[f]ilename',
+                        help="print the change in each result from the "
+                             "results in file f to those in the second file "
+                             "instead of running the benchmarks",
+                        nargs=2)
+    parser.add_argument("-v", "--verbose",
+                        help="verbose mode, print processing details",
+                        action="store_true")
+
+    return parser.parse_args()
+
+args = _setup_argparser()
+
+if args.verbose:
+    logger.setLevel(logging.INFO)
+    bench_logger = logging.getLogger('pynetdicom.benchmarks')
+    bench_logger.setLevel(logging.INFO)
+    bench_logger.addHandler(stream_logger)
+
+if args.compare:
+    results = []
+    for filename in args.compare:
+        with open(filename, 'r') as fp:
+            results.append(json.load(fp))
+
+    for key, change in compare(*results).items():
+        print('%-45s %+8.1f%%' %(key, change))
+
+    sys.exit()
+
+options = {}
+if args.sizes:
+    options['store'] = {'sizes' : [int(ss) for ss in args.sizes.split(',')]}
+
+if args.quick:
+    options.setdefault('store', {})['volume'] = 0
+    options['echo'] = {'count' : 50}
+    options['find'] = {'count' : 1}
+    options['association'] = {'count' : 10}
+
+logger.info('Running the benchmarks')
+results = run_benchmarks(args.benchmark, args.engine_loops, options)
+
+if args.output:
+    with open(args.output, 'w') as fp:
+        json.dump(results, fp, indent=2, sort_keys=True)
+else:
+    json.dump(results, sys.stdout, indent=2, sort_keys=True)
+    print()
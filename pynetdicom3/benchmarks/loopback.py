@@ -0,0 +1,433 @@
+
+# This module implements the benchmarks, each of which runs an SCU against an
+# SCP served by the same process over the loopback interface, so that the
+# results reflect the cost of the DUL, DIMSE and PDU encoding and decoding
+# rather than that of the network.
+
+import logging
+import os
+import platform
+import subprocess
+import threading
+import time
+
+from pydicom.dataset import Dataset
+from pydicom.uid import UID, ImplicitVRLittleEndian
+
+from pynetdicom3 import AE, VerificationSOPClass, StorageSOPClassList, \
+    QueryRetrieveSOPClassList, __version__, pynetdicom_uid_prefix
+
+logger = logging.getLogger('pynetdicom.benchmarks')
+
+# The SOP Classes used by the benchmarks
+CT_IMAGE_STORAGE = '1.2.840.10008.5.1.4.1.1.2'
+SOP_CLASSES = [VerificationSOPClass] + StorageSOPClassList + \
+                                                    QueryRetrieveSOPClassList
+
+# The default size (in bytes) of the Pixel Data of the C-STORE datasets
+STORE_SIZES = [16 * 1024, 256 * 1024, 4 * 1024 * 1024]
+
+# The most data (in bytes) sent for each C-STORE dataset size, the number of
+#   datasets sent is also kept between 10 and 200
+STORE_VOLUME = 64 * 1024 * 1024
+
+
+class LoopbackSCP(threading.Thread):
+    """
+    An SCP for the Verification, Storage and Query/Retrieve Service Classes
+    listening on a port chosen by the operating system, run by its own thread
+
+    Every C-STORE succeeds without the dataset being kept and every C-FIND
+    is answered with the same `find_matches` matches.
+
+    Parameters
+    ----------
+    find_matches - int, optional
+        The number of Pending responses sent for each C-FIND (default: 1000)
+    engine_loops - int, optional
+        If non-zero then the associations are served by this many engine
+        loops rather than each by its own threads (default: 0)
+
+    Attributes
+    ----------
+    ae - pynetdicom3.applicationentity.ApplicationEntity
+        The SCP's AE
+    port - int
+        The port number the SCP is listening on, set once start() returns
+    """
+    def __init__(self, find_matches=1000, engine_loops=0):
+        self.ae = AE(ae_title='BENCH-SCP', port=0, scp_sop_class=SOP_CLASSES)
+        self.ae.maximum_associations = 100
+        self.ae.on_c_store = self._on_c_store
+        self.ae.on_c_find = self._on_c_find
+        self.ae.on_c_find_cancel = self._on_c_find_cancel
+
+        self.engine_loops = engine_loops
+        self.port = None
+
+        match = Dataset()
+        match.PatientName = 'BENCHMARK^PATIENT'
+        match.PatientID = '1234567'
+        match.QueryRetrieveLevel = 'PATIENT'
+        self._matches = [match] * find_matches
+
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+    def start(self):
+        """ Start the SCP, returning once it's listening for connections """
+        threading.Thread.start(self)
+
+        # The socket is bound to a port and then listened on
+        timeout = time.time() + 5
+        while self.port is None:
+            if time.time() > timeout or not self.is_alive():
+                raise RuntimeError("The loopback SCP failed to start")
+
+            time.sleep(0.01)
+            sock = self.ae.local_socket
+            if sock is not None and sock.getsockname()[1]:
+                self.port = sock.getsockname()[1]
+
+        time.sleep(0.05)
+
+    def run(self):
+        self.ae.start(engine_loops=self.engine_loops)
+
+    def stop(self):
+        """ Stop the SCP """
+        try:
+            self.ae.stop()
+        except SystemExit:
+            pass
+
+    @staticmethod
+    def _on_c_store(dataset):
+        return 0x0000
+
+    def _on_c_find(self, dataset):
+        return self._matches
+
+    @staticmethod
+    def _on_c_find_cancel():
+        return False
+
+
+def make_dataset(size, index=0):
+    """
+    Return a synthetic CT Image Storage dataset with `size` bytes of Pixel
+    Data
+
+    Parameters
+    ----------
+    size - int
+        The length of the Pixel Data in bytes, rounded up to an even number
+    index - int, optional
+        Used to give the dataset a unique SOP Instance UID
+
+    Returns
+    -------
+    pydicom.Dataset
+        The dataset
+    """
+    ds = Dataset()
+    ds.file_meta = Dataset()
+    ds.file_meta.TransferSyntaxUID = ImplicitVRLittleEndian
+    ds.is_implicit_VR = True
+    ds.is_little_endian = True
+
+    ds.SOPClassUID = UID(CT_IMAGE_STORAGE)
+    ds.SOPInstanceUID = UID('%s.99.%d.%d.%d' %(pynetdicom_uid_prefix,
+                                               os.getpid(), size, index))
+    ds.PatientName = 'BENCHMARK^PATIENT'
+    ds.PatientID = '1234567'
+    ds.Modality = 'CT'
+    ds.add_new(0x7fe00010, 'OB', b'\x00' * (size + size % 2))
+
+    return ds
+
+
+def _summarise(times):
+    """
+    Return the mean, median, 95th and 99th percentile, minimum and maximum
+    of `times` (in seconds) as milliseconds
+    """
+    times = sorted(times)
+    count = len(times)
+
+    def percentile(pct):
+        return times[min(int(count * pct / 100), count - 1)] * 1000
+
+    return {'count' : count,
+            'mean_ms' : sum(times) / count * 1000,
+            'median_ms' : percentile(50),
+            'p95_ms' : percentile(95),
+            'p99_ms' : percentile(99),
+            'min_ms' : times[0] * 1000,
+            'max_ms' : times[-1] * 1000}
+
+
+def _associate(ae, port):
+    """ Return an established association with the loopback SCP """
+    assoc = ae.associate('localhost', port, 'BENCH-SCP')
+    if not assoc.is_established:
+        raise RuntimeError("Unable to associate with the loopback SCP")
+
+    return assoc
+
+
+def bench_echo(ae, port, count=500):
+    """
+    Measure the round trip time of C-ECHO requests sent one after another
+    over a single association
+
+    Parameters
+    ----------
+    ae - pynetdicom3.applicationentity.ApplicationEntity
+        The SCU's AE
+    port - int
+        The loopback SCP's port number
+    count - int, optional
+        The number of C-ECHO requests to send (default: 500)
+
+    Returns
+    -------
+    dict
+        The latency statistics, see _summarise()
+    """
+    assoc = _associate(ae, port)
+    times = []
+    try:
+        for ii in range(count):
+            start = time.perf_counter()
+            status = assoc.send_c_echo(msg_id=ii % 65535 + 1)
+            times.append(time.perf_counter() - start)
+
+            if status is None:
+                raise RuntimeError("No response to a C-ECHO request")
+    finally:
+        assoc.release()
+
+    return _summarise(times)
+
+
+def bench_store(ae, port, sizes=STORE_SIZES, volume=STORE_VOLUME):
+    """
+    Measure the C-STORE throughput for datasets of each of `sizes` sent one
+    after another over a single association
+
+    Parameters
+    ----------
+    ae - pynetdicom3.applicationentity.ApplicationEntity
+        The SCU's AE
+    port - int
+        The loopback SCP's port number
+    sizes - list of int, optional
+        The sizes of the datasets' Pixel Data in bytes
+    volume - int, optional
+        The most Pixel Data (in bytes) to send for each size, between 10 and
+        200 datasets are always sent
+
+    Returns
+    -------
+    dict
+        {size : results} with the number of datasets sent and failed, the
+        datasets/s, MB/s and latency statistics for each size
+    """
+    results = {}
+    for size in sizes:
+        count = max(10, min(200, volume // size))
+        datasets = [make_dataset(size, ii) for ii in range(count)]
+
+        assoc = _associate(ae, port)
+        times = []
+        failed = 0
+        try:
+            total_start = time.perf_counter()
+            for ii, dataset in enumerate(datasets):
+                start = time.perf_counter()
+                status = assoc.send_c_store(dataset, msg_id=ii % 65535 + 1)
+                times.append(time.perf_counter() - start)
+
+                if status is None or status.Type != 'Success':
+                    failed += 1
+            elapsed = time.perf_counter() - total_start
+        finally:
+            assoc.release()
+
+        result = _summarise(times)
+        result['failed'] = failed
+        result['datasets_per_s'] = count / elapsed
+        result['mb_per_s'] = count * size / elapsed / 1e6
+        results[str(size)] = result
+
+    return results
+
+
+def bench_find(ae, port, count=5):
+    """
+    Measure the rate at which the Pending responses to a C-FIND request are
+    received
+
+    Parameters
+    ----------
+    ae - pynetdicom3.applicationentity.ApplicationEntity
+        The SCU's AE
+    port - int
+        The loopback SCP's port number
+    count - int, optional
+        The number of C-FIND requests to send (default: 5)
+
+    Returns
+    -------
+    dict
+        The number of Pending responses, the responses/s and the latency
+        statistics for the complete C-FIND operations
+    """
+    query = Dataset()
+    query.PatientName = '*'
+    query.PatientID = ''
+    query.QueryRetrieveLevel = 'PATIENT'
+
+    assoc = _associate(ae, port)
+    times = []
+    pending = 0
+    try:
+        for ii in range(count):
+            start = time.perf_counter()
+            for status, _ in assoc.send_c_find(query, msg_id=ii % 65535 + 1,
+                                               query_model='P'):
+                if status.Type == 'Pending':
+                    pending += 1
+            times.append(time.perf_counter() - start)
+    finally:
+        assoc.release()
+
+    result = _summarise(times)
+    result['pending'] = pending
+    result['responses_per_s'] = pending / sum(times)
+
+    return result
+
+
+def bench_association(ae, port, count=50):
+    """
+    Measure the time taken to establish and release associations
+
+    Parameters
+    ----------
+    ae - pynetdicom3.applicationentity.ApplicationEntity
+        The SCU's AE
+    port - int
+        The loopback SCP's port number
+    count - int, optional
+        The number of associations (default: 50)
+
+    Returns
+    -------
+    dict
+        {'setup' : results, 'teardown' : results}, see _summarise()
+    """
+    setup = []
+    teardown = []
+    for ii in range(count):
+        start = time.perf_counter()
+        assoc = _associate(ae, port)
+        setup.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        assoc.release()
+        teardown.append(time.perf_counter() - start)
+
+    return {'setup' : _summarise(setup), 'teardown' : _summarise(teardown)}
+
+
+# The benchmarks run by run_benchmarks(), by name
+BENCHMARKS = {'echo' : bench_echo,
+              'store' : bench_store,
+              'find' : bench_find,
+              'association' : bench_association}
+
+
+def _git_revision():
+    """ Return the git revision of the source tree, None if unknown """
+    try:
+        output = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                    cwd=os.path.dirname(__file__),
+                                    stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return output.decode('ascii').strip()
+
+
+def run_benchmarks(names=None, engine_loops=0, options=None):
+    """
+    Start a loopback SCP and run the benchmarks against it
+
+    Parameters
+    ----------
+    names - list of str, optional
+        The names of the benchmarks to run, see BENCHMARKS (default: all)
+    engine_loops - int, optional
+        The number of engine loops the SCP serves associations with, 0 for a
+        pair of threads per association (default: 0)
+    options - dict, optional
+        {name : {keyword : value}} passed to each benchmark function
+
+    Returns
+    -------
+    dict
+        The results of each benchmark along with the details of the
+        revision and platform they were run on, suitable for json.dump()
+    """
+    names = names or sorted(BENCHMARKS.keys())
+    options = options or {}
+
+    scp = LoopbackSCP(engine_loops=engine_loops)
+    scp.start()
+
+    ae = AE(ae_title='BENCH-SCU', scu_sop_class=SOP_CLASSES)
+
+    results = {}
+    try:
+        for name in names:
+            logger.info("Running the '%s' benchmark" %name)
+            results[name] = BENCHMARKS[name](ae, scp.port,
+                                             **options.get(name, {}))
+    finally:
+        scp.stop()
+
+    return {'version' : '.'.join(__version__),
+            'revision' : _git_revision(),
+            'python' : platform.python_version(),
+            'platform' : platform.platform(),
+            'time' : time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'engine_loops' : engine_loops,
+            'results' : results}
+
+
+def compare(old, new):
+    """
+    Return the relative change (in %) of each numeric result in `new` from
+    the same result in `old`, both as returned by run_benchmarks()
+
+    Returns
+    -------
+    dict
+        {'benchmark.result.statistic' : change}
+    """
+    def flatten(results, prefix=''):
+        values = {}
+        for key, value in results.items():
+            if isinstance(value, dict):
+                values.update(flatten(value, prefix + key + '.'))
+            elif isinstance(value, (int, float)):
+                values[prefix + key] = value
+        return values
+
+    old = flatten(old['results'])
+    new = flatten(new['results'])
+
+    return {key : (new[key] - old[key]) / old[key] * 100
+                        for key in sorted(new) if old.get(key)}
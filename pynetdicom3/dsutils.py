@@ -1,7 +1,11 @@
 
 from io import StringIO, BytesIO
 import logging
+import os
+from struct import pack, unpack
+import zlib
 
+from pydicom.dataset import Dataset
 from pydicom.filebase import DicomBytesIO
 from pydicom.filereader import read_dataset
 from pydicom.filewriter import write_dataset, write_data_element
@@ -43,6 +47,186 @@ def decode(b, is_implicit_VR, is_little_endian):
     b.seek(0)
     return read_dataset(b, is_implicit_VR, is_little_endian)
 
+def read_file_meta(fp):
+    """
+    Read the preamble and File Meta Information of a DICOM Part 10 file,
+    leaving `fp` positioned at the start of the encoded data set
+    
+    Parameters
+    ----------
+    fp - file
+        The DICOM file, opened in binary mode
+        
+    Returns
+    -------
+    pydicom.Dataset
+        The File Meta Information
+        
+    Raises
+    ------
+    ValueError
+        If `fp` isn't a DICOM Part 10 file or has no File Meta Information
+        Group Length element
+    """
+    # 128 byte preamble followed by the 'DICM' prefix (PS3.10 7.1)
+    fp.seek(128)
+    if fp.read(4) != b'DICM':
+        raise ValueError("Not a DICOM Part 10 file, no 'DICM' prefix found")
+    
+    # The File Meta Information is always Explicit VR Little Endian and starts
+    #   with the (0002,0000) File Meta Information Group Length element
+    header = fp.read(12)
+    if len(header) != 12 or header[:6] != b'\x02\x00\x00\x00UL':
+        raise ValueError("No File Meta Information Group Length element found")
+    
+    group_length = unpack('<I', header[8:])[0]
+    meta = fp.read(group_length)
+    
+    return decode(BytesIO(header + meta), False, True)
+
+def read_sop_uids(fp, is_implicit_VR, is_little_endian, is_deflated=False):
+    """
+    Read the SOP Class UID and SOP Instance UID from the start of an encoded
+    data set without decoding the rest of it. `fp` is returned to its
+    original position afterwards
+    
+    Parameters
+    ----------
+    fp - file
+        The encoded data set, opened in binary mode
+    is_implicit_VR - bool
+        Is implicit or explicit VR
+    is_little_endian - bool
+        The byte ordering, little or big endian
+    is_deflated - bool, optional
+        The data set is deflated, as with the Deflated Explicit VR Little 
+        Endian transfer syntax, in which case only as much of it is inflated
+        as is needed to read the UIDs (default: False)
+        
+    Returns
+    -------
+    sop_class_uid, sop_instance_uid - pydicom.uid.UID or None
+        The UIDs, or None if not present in the data set
+    """
+    start = fp.tell()
+    
+    # Stop before the first element after (0008,0018) SOP Instance UID
+    stopped = []
+    def stop_when(tag, VR, length):
+        if tag > 0x00080018:
+            stopped.append(tag)
+            return True
+        
+        return False
+    
+    if not is_deflated:
+        ds = read_dataset(fp, is_implicit_VR, is_little_endian,
+                          stop_when=stop_when)
+    else:
+        # Inflate a chunk at a time until the element after the SOP Instance
+        #   UID has been reached or the data set ends
+        inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+        inflated = b''
+        while True:
+            chunk = fp.read(8192)
+            if chunk:
+                inflated += inflater.decompress(chunk)
+            else:
+                inflated += inflater.flush()
+            
+            ds = read_dataset(BytesIO(inflated), is_implicit_VR, 
+                              is_little_endian, stop_when=stop_when)
+            if stopped or not chunk:
+                break
+    
+    fp.seek(start)
+    
+    return ds.get('SOPClassUID'), ds.get('SOPInstanceUID')
+
+class SpooledDataset(object):
+    """
+    An encoded data set that is written to a file as its fragments are 
+    received, rather than being held in memory
+    
+    Used by the Storage SCP when ApplicationEntity.spool_c_store is True, in 
+    which case the AE.on_c_store() callback is passed the SpooledDataset 
+    instead of a decoded pydicom Dataset. The data set is only decoded if 
+    decode() is called.
+    
+    Parameters
+    ----------
+    command_set - pydicom.Dataset
+        The Command Set of the message the data set was sent with
+    fp - file
+        The file object to write the encoded data set to, opened in binary 
+        mode. It must also be readable and seekable for decode() to be used
+    path - str, optional
+        The path to `fp`, if it has one
+    delete - bool, optional
+        Delete the file at `path` when closed (default: False)
+        
+    Attributes
+    ----------
+    command_set - pydicom.Dataset
+        The Command Set of the message the data set was sent with
+    file - file
+        The file object the encoded data set is written to
+    path - str or None
+        The path to `file`, if it has one
+    delete - bool
+        If True then the file at `path` is deleted when closed. Set to False
+        to keep the file, or move it somewhere else before it's closed
+    transfer_syntax - pydicom.uid.UID or None
+        The transfer syntax the data set is encoded with, available once the
+        data set has been received
+    """
+    def __init__(self, command_set, fp, path=None, delete=False):
+        self.command_set = command_set
+        self.file = fp
+        self.path = path
+        self.delete = delete
+        self.transfer_syntax = None
+    
+    def write(self, b):
+        """ Write a fragment of the encoded data set to file """
+        return self.file.write(b)
+    
+    def decode(self, stop_before_pixels=False):
+        """
+        Decode the data set using pydicom
+        
+        Parameters
+        ----------
+        stop_before_pixels - bool, optional
+            Stop decoding before the (7FE0,0010) Pixel Data element 
+            (default: False)
+        
+        Returns
+        -------
+        pydicom.Dataset
+            The decoded data set
+        """
+        stop_when = None
+        if stop_before_pixels:
+            stop_when = lambda tag, VR, length: tag == 0x7FE00010
+        
+        self.file.seek(0)
+        return read_dataset(self.file,
+                            self.transfer_syntax.is_implicit_VR,
+                            self.transfer_syntax.is_little_endian,
+                            stop_when=stop_when)
+    
+    def close(self):
+        """ Close the file, deleting it if required """
+        self.file.close()
+        
+        if self.delete and self.path is not None:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                # Moved by the user
+                pass
+
 def encode(ds, is_implicit_VR, is_little_endian):
     """
     Given a pydicom Dataset, encode it to a byte stream
@@ -84,3 +268,65 @@ def encode_element(el, is_implicit_VR, is_little_endian):
     rawstr = f.parent.getvalue()
     f.close()
     return rawstr
+
+def encode_file_meta(sop_class_uid, sop_instance_uid, transfer_syntax):
+    """
+    Generate the preamble, 'DICM' prefix and File Meta Information needed to
+    turn an encoded data set into a DICOM Part 10 file (PS3.10 7.1)
+    
+    Parameters
+    ----------
+    sop_class_uid - pydicom.uid.UID or str
+        The SOP Class UID of the data set
+    sop_instance_uid - pydicom.uid.UID or str
+        The SOP Instance UID of the data set
+    transfer_syntax - pydicom.uid.UID or str
+        The transfer syntax the data set is encoded with
+        
+    Returns
+    -------
+    bytes
+        The encoded header, to be followed by the encoded data set
+    """
+    from pynetdicom3 import pynetdicom_uid_prefix, pynetdicom_version
+    
+    meta = Dataset()
+    meta.FileMetaInformationVersion = b'\x00\x01'
+    meta.MediaStorageSOPClassUID = sop_class_uid
+    meta.MediaStorageSOPInstanceUID = sop_instance_uid
+    meta.TransferSyntaxUID = transfer_syntax
+    meta.ImplementationClassUID = pynetdicom_uid_prefix
+    meta.ImplementationVersionName = pynetdicom_version
+    
+    # The File Meta Information is always Explicit VR Little Endian
+    encoded_meta = encode(meta, False, True)
+    
+    # (0002,0000) File Meta Information Group Length, UL
+    group_length = pack('<HH2sHI', 0x0002, 0x0000, b'UL', 4, len(encoded_meta))
+    
+    return b'\x00' * 128 + b'DICM' + group_length + encoded_meta
+
+def write_part10_file(filename, dataset_bytes, sop_class_uid,
+                      sop_instance_uid, transfer_syntax):
+    """
+    Write an encoded data set to a DICOM Part 10 file without decoding it,
+    by prepending the generated File Meta Information
+    
+    Parameters
+    ----------
+    filename - str
+        The path of the file to write
+    dataset_bytes - bytes
+        The encoded data set, as received in a C-STORE request
+    sop_class_uid - pydicom.uid.UID or str
+        The SOP Class UID of the data set
+    sop_instance_uid - pydicom.uid.UID or str
+        The SOP Instance UID of the data set
+    transfer_syntax - pydicom.uid.UID or str
+        The transfer syntax the data set is encoded with
+    """
+    header = encode_file_meta(sop_class_uid, sop_instance_uid, transfer_syntax)
+    
+    with open(filename, 'wb') as fp:
+        fp.write(header)
+        fp.write(dataset_bytes)
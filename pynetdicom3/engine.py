@@ -0,0 +1,520 @@
+# This module implements the association engine, which serves the
+# associations accepted by an SCP from a small number of selector loops
+# rather than running a pair of threads (Association and DUL) for each one.
+
+from collections import deque
+import logging
+import queue
+import selectors
+import threading
+import time
+
+from pynetdicom3.association import Association
+from pynetdicom3.fsm import MAX_SEND_BUFFERS
+from pynetdicom3.utils import SelectorWakeup
+
+logger = logging.getLogger('pynetdicom.engine')
+
+# How often (in seconds) each loop checks the ARTIM and idle timers of its
+#   associations
+TIMER_INTERVAL = 0.5
+
+# The maximum number of times an association is stepped before the loop moves
+#   on to the next one, so that a busy peer can't starve the others
+MAX_STEPS = 32
+
+# The most data (in bytes) an association may have waiting to be sent before
+#   the loop stops stepping it until the peer has read some of it
+MAX_PENDING_OUTPUT = 1024 * 1024
+
+
+class AssociationEngine(object):
+    """
+    Serves the associations accepted by the local AE from one or more
+    EngineLoops, each of which runs in a single thread. The number of threads
+    is therefore fixed by `loops` rather than growing with the number of
+    associations.
+
+    Accepted connections are handed to the loop currently serving the fewest
+    associations.
+
+    Parameters
+    ----------
+    local_ae - pynetdicom3.applicationentity.ApplicationEntity
+        The local AE instance
+    loops - int, optional
+        The number of selector loops to run (default: 1)
+
+    Attributes
+    ----------
+    ae - pynetdicom3.applicationentity.ApplicationEntity
+        The local AE
+    loops - list of pynetdicom3.engine.EngineLoop
+        The selector loops
+    """
+    def __init__(self, local_ae, loops=1):
+        if not isinstance(loops, int) or loops < 1:
+            raise ValueError("AssociationEngine requires at least one loop")
+
+        self.ae = local_ae
+        self.loops = [EngineLoop(local_ae, name='EngineLoop-%s' %ii)
+                                                    for ii in range(loops)]
+
+    def start(self):
+        """ Start running the engine loops """
+        for loop in self.loops:
+            loop.start()
+
+    def add(self, client_socket):
+        """
+        Serve a new connection from a peer AE
+
+        Parameters
+        ----------
+        client_socket - socket.socket
+            The accepted connection
+
+        Returns
+        -------
+        pynetdicom3.association.Association
+            The association served by the engine
+        """
+        loop = min(self.loops, key=lambda loop: len(loop.associations))
+
+        return loop.add(client_socket)
+
+    def stop(self):
+        """ Stop the engine loops, closing all their connections """
+        for loop in self.loops:
+            loop.stop()
+
+        for loop in self.loops:
+            if loop.is_alive():
+                loop.join()
+
+
+class EngineLoop(threading.Thread):
+    """
+    A single threaded selector loop that drives the DUL state machine and the
+    DIMSE service class SCPs of each of its associations.
+
+    The loop blocks on a selector until a connection has incoming data or
+    room for output that couldn't be sent straight away (see BufferedSocket),
+    another thread has queued a primitive for one of the associations or it's
+    time to check the ARTIM and idle timers. The DUL of each association with something
+    to do is then stepped until it runs out of events (see
+    DULServiceProvider._run_once() and Association._acceptor_step()).
+
+    Parameters
+    ----------
+    local_ae - pynetdicom3.applicationentity.ApplicationEntity
+        The local AE instance
+    name - str, optional
+        The name of the loop's thread
+
+    Attributes
+    ----------
+    ae - pynetdicom3.applicationentity.ApplicationEntity
+        The local AE
+    associations - list of pynetdicom3.association.Association
+        The associations currently served by the loop
+    """
+    def __init__(self, local_ae, name=''):
+        threading.Thread.__init__(self, name=name)
+        self.daemon = True
+
+        self.ae = local_ae
+        self.associations = []
+
+        # New associations and associations woken up by other threads, the
+        #   loop thread is the only one that touches the selector
+        self._incoming = queue.Queue()
+        self._woken = queue.Queue()
+
+        self._selector = selectors.DefaultSelector()
+        self._waker = SelectorWakeup(self._selector)
+
+        # The socket each association is registered under and the events
+        #   it's currently registered for
+        self._sockets = {}
+        self._events = {}
+        # Associations that still had work to do when their turn ended
+        self._ready = set()
+        # Associations that have stopped reading from their peers because
+        #   the AE's memory budget is used up, their sockets aren't watched
+        self._paused = set()
+
+        self._kill = False
+
+    def add(self, client_socket):
+        """
+        Create an Association for a new connection and start serving it
+
+        Parameters
+        ----------
+        client_socket - socket.socket
+            The accepted connection
+
+        Returns
+        -------
+        pynetdicom3.association.Association
+            The new association
+        """
+        sock = BufferedSocket(client_socket, self)
+        assoc = Association(self.ae,
+                            sock,
+                            max_pdu=self.ae.maximum_pdu_size,
+                            acse_timeout=self.ae.acse_timeout,
+                            dimse_timeout=self.ae.dimse_timeout,
+                            engine=self)
+        sock.assoc = assoc
+
+        self.associations.append(assoc)
+        self._incoming.put(assoc)
+        self._wakeup()
+
+        return assoc
+
+    def wakeup(self, assoc=None):
+        """
+        Called from other threads to let the loop know that `assoc` has
+        something to do, i.e. a primitive has been sent to its DUL
+
+        Parameters
+        ----------
+        assoc - pynetdicom3.association.Association, optional
+            The association to service
+        """
+        # The loop checks its own associations before going back to sleep
+        if threading.current_thread() is self:
+            return
+
+        if assoc is not None:
+            self._woken.put(assoc)
+
+        self._wakeup()
+
+    def stop(self):
+        """ Stop the loop """
+        self._kill = True
+        self._wakeup()
+
+    def run(self):
+        """ The main loop """
+        next_check = time.time() + TIMER_INTERVAL
+
+        while not self._kill:
+            # Don't block if an association still has work to do
+            timeout = max(next_check - time.time(), 0)
+            if self._ready:
+                timeout = 0
+            elif self._paused and \
+                            not self.ae._wait_for_memory(self._wakeup):
+                # The paused associations can be resumed straight away
+                timeout = 0
+
+            try:
+                events = self._selector.select(timeout)
+            except (OSError, ValueError):
+                events = []
+
+            ready = self._ready
+            self._ready = set()
+
+            for key, mask in events:
+                if self._waker.is_wakeup(key):
+                    self._waker.clear()
+                    continue
+
+                # Send what the peer now has room for, an association held
+                #   back by its unsent output gets another turn
+                if mask & selectors.EVENT_WRITE and key.data in self._sockets:
+                    self._sockets[key.data].flush()
+                    self._update_events(key.data)
+
+                ready.add(key.data)
+
+            ready.update(self._get_queued(self._incoming, register=True))
+            ready.update(self._get_queued(self._woken))
+            ready.update(self._get_resumed())
+
+            # Check the timers of every association
+            if time.time() >= next_check:
+                ready.update(self.associations)
+                next_check = time.time() + TIMER_INTERVAL
+
+            for assoc in ready:
+                # May have been finished during an earlier turn
+                if assoc in self._sockets:
+                    self._service(assoc)
+
+        for assoc in list(self._sockets):
+            self._finish(assoc)
+
+        self._selector.close()
+        self._waker.close()
+
+    def _get_queued(self, assoc_queue, register=False):
+        """
+        Return the associations waiting in `assoc_queue`, registering their
+        connections with the selector if `register` is True
+        """
+        associations = []
+        while True:
+            try:
+                assoc = assoc_queue.get(False)
+            except queue.Empty:
+                return associations
+
+            if register:
+                self._sockets[assoc] = assoc.dul.scu_socket
+                self._update_events(assoc)
+
+            associations.append(assoc)
+
+    def _check_paused(self, assoc):
+        """
+        Stop watching the association's connection if its DUL has stopped
+        reading from the peer, otherwise the selector would keep reporting 
+        the unread data
+        """
+        if assoc in self._paused or not assoc.dul._reading_paused():
+            return
+
+        self._paused.add(assoc)
+        self._update_events(assoc)
+
+    def _get_resumed(self):
+        """
+        Return the paused associations whose DULs can read from their peers
+        again, watching their connections once more
+        """
+        resumed = [assoc for assoc in self._paused
+                                    if not assoc.dul._reading_paused()]
+        for assoc in resumed:
+            self._paused.discard(assoc)
+            self._update_events(assoc)
+
+        return resumed
+
+    def _update_events(self, assoc):
+        """
+        Register the association's connection with the selector for reading
+        unless it's paused and for writing if it has output waiting to be
+        sent, unregistering it if neither
+        """
+        sock = self._sockets.get(assoc)
+        if sock is None:
+            return
+
+        events = 0
+        if assoc not in self._paused:
+            events |= selectors.EVENT_READ
+        if sock.pending:
+            events |= selectors.EVENT_WRITE
+
+        current = self._events.get(assoc, 0)
+        if events == current:
+            return
+
+        try:
+            if not events:
+                self._selector.unregister(sock)
+            elif not current:
+                self._selector.register(sock, events, assoc)
+            else:
+                self._selector.modify(sock, events, assoc)
+        except (KeyError, ValueError, OSError):
+            # Closed in the meantime, servicing it will find that out
+            return
+
+        self._events[assoc] = events
+
+    def _service(self, assoc):
+        """ Step the association's DUL and service class SCPs """
+        # Wait for the peer to read what's already been sent, the loop
+        #   services the association again once the connection is writable
+        if self._sockets[assoc].pending > MAX_PENDING_OUTPUT:
+            return
+
+        try:
+            for _ in range(MAX_STEPS):
+                has_event = assoc.dul._run_once()
+                has_output = assoc._acceptor_step()
+
+                if self._is_finished(assoc):
+                    self._finish(assoc)
+                    return
+
+                if not has_event and not has_output:
+                    self._check_paused(assoc)
+                    return
+
+            # Give the other associations a turn
+            self._ready.add(assoc)
+        except Exception as e:
+            logger.error("Engine loop failed to serve an association: %s" %e)
+            self._finish(assoc)
+
+    def _is_finished(self, assoc):
+        """ Return True if the association's DUL is done """
+        dul = assoc.dul
+        if dul.kill:
+            return True
+
+        # Back in Idle with nothing left to do
+        return (dul.state_machine.current_state == 'Sta1'
+                                        and dul.event_queue.empty())
+
+    def _finish(self, assoc):
+        """ Stop serving the association and close its connection """
+        sock = self._sockets.pop(assoc, None)
+        if sock is None:
+            return
+
+        if self._events.pop(assoc, 0):
+            try:
+                self._selector.unregister(sock)
+            except (KeyError, ValueError):
+                pass
+
+        sock.close()
+
+        assoc.dul.kill = True
+        assoc._Kill = True
+        assoc.is_established = False
+        assoc._engine_done = True
+        assoc._close_spooled()
+
+        self.associations.remove(assoc)
+        self._ready.discard(assoc)
+        self._paused.discard(assoc)
+
+        self.ae._association_ended(assoc)
+
+    def _wakeup(self):
+        """ Interrupt the loop's wait on the selector """
+        self._waker.wakeup()
+
+
+class BufferedSocket(object):
+    """
+    Presents an engine loop's non-blocking connection as the socket the DUL
+    reads from and its state machine actions send PDUs on. Whatever the
+    connection can't take straight away is kept and sent by the loop once
+    it's writable, so a peer that isn't reading never blocks the loop's other
+    associations.
+
+    Only the loop's own thread may use it.
+
+    Parameters
+    ----------
+    sock - socket.socket
+        The accepted connection, made non-blocking
+    loop - pynetdicom3.engine.EngineLoop
+        The loop serving the connection
+
+    Attributes
+    ----------
+    assoc - pynetdicom3.association.Association
+        The association using the connection
+    pending - int
+        The number of bytes waiting to be sent
+    """
+    def __init__(self, sock, loop):
+        sock.setblocking(False)
+        self.sock = sock
+        self.loop = loop
+        self.assoc = None
+        self.pending = 0
+        self._buffers = deque()
+        # Set once sending has failed, after which nothing more is kept
+        self._failed = False
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def recv(self, bufsize):
+        return self.sock.recv(bufsize)
+
+    def recv_into(self, buffer):
+        return self.sock.recv_into(buffer)
+
+    def sendall(self, data):
+        self.sendmsg([data])
+
+    def sendmsg(self, buffers):
+        """
+        Send as much of `buffers` as the connection will take, copying the
+        rest to be sent later by flush()
+
+        Returns
+        -------
+        int
+            The total length of `buffers`, as all of it has been dealt with
+        """
+        buffers = [memoryview(buffer).cast('B') for buffer in buffers]
+        total = sum(len(buffer) for buffer in buffers)
+        if self._failed:
+            return total
+
+        sent = 0
+        if not self._buffers:
+            sent = self._send(buffers)
+
+        for buffer in buffers:
+            if self._failed:
+                break
+
+            if sent >= len(buffer):
+                sent -= len(buffer)
+                continue
+
+            # The caller may reuse the buffer once this returns
+            self._buffers.append(bytes(buffer[sent:]))
+            self.pending += len(buffer) - sent
+            sent = 0
+
+        if self.pending:
+            self.loop._update_events(self.assoc)
+
+        return total
+
+    def flush(self):
+        """ Send as much of the waiting data as the connection will take """
+        while self._buffers:
+            buffers = [self._buffers[ii] for ii in 
+                        range(min(len(self._buffers), MAX_SEND_BUFFERS))]
+            sent = self._send(buffers)
+            if not sent:
+                return
+
+            self.pending -= sent
+            while sent:
+                if sent >= len(self._buffers[0]):
+                    sent -= len(self._buffers.popleft())
+                else:
+                    self._buffers[0] = self._buffers[0][sent:]
+                    sent = 0
+
+    def close(self):
+        """ Close the connection, discarding anything not yet sent """
+        self._buffers.clear()
+        self.pending = 0
+        self.sock.close()
+
+    def _send(self, buffers):
+        """ Return the number of bytes of `buffers` sent without blocking """
+        try:
+            if hasattr(self.sock, 'sendmsg'):
+                return self.sock.sendmsg(buffers)
+
+            return self.sock.send(buffers[0])
+        except (BlockingIOError, InterruptedError):
+            return 0
+        except OSError:
+            # The connection has failed, reading from it will find out
+            self._failed = True
+            self._buffers.clear()
+            self.pending = 0
+            return 0
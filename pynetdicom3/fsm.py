@@ -8,6 +8,43 @@ from pynetdicom3.utils import wrap_list
 
 logger = logging.getLogger('pynetdicom.sm')
 
+# The maximum number of buffers passed to a single sendmsg() call, must not
+#   be larger than the system's IOV_MAX
+MAX_SEND_BUFFERS = 512
+
+
+def send_buffers(sock, buffers):
+    """
+    Send all of `buffers` on `sock`, using a gather write where the socket
+    supports it so that the buffers don't have to be joined first
+    
+    Parameters
+    ----------
+    sock - socket.socket
+        The connection to the peer
+    buffers - list of bytes-like
+        The buffers to send, in order
+    """
+    if not hasattr(sock, 'sendmsg'):
+        for buffer in buffers:
+            sock.sendall(buffer)
+        return
+    
+    buffers = [memoryview(buffer) for buffer in buffers]
+    
+    # sendmsg() may not send everything, so skip past the buffers it did
+    #   send and trim any partially sent one before trying again
+    index = 0
+    while index < len(buffers):
+        sent = sock.sendmsg(buffers[index:index + MAX_SEND_BUFFERS])
+        
+        while index < len(buffers) and sent >= len(buffers[index]):
+            sent -= len(buffers[index])
+            index += 1
+        
+        if sent:
+            buffers[index] = buffers[index][sent:]
+
 
 class StateMachine:
     """
@@ -162,7 +199,7 @@ def AE_2(dul):
     dul.association.acse.debug_send_associate_rq(dul.pdu)
 
     bytestream = dul.pdu.Encode()
-    dul.scu_socket.send(bytestream)
+    dul.scu_socket.sendall(bytestream)
     
     return 'Sta5'
 
@@ -302,7 +339,7 @@ def AE_6(dul):
         # Callback
         dul.association.acse.debug_send_associate_rj(dul.pdu)
 
-        dul.scu_socket.send(dul.pdu.Encode())
+        dul.scu_socket.sendall(dul.pdu.Encode())
 
         dul.artim_timer.start()
 
@@ -343,7 +380,7 @@ def AE_7(dul):
     dul.association.acse.debug_send_associate_ac(dul.pdu)
     
     bytestream = dul.pdu.Encode()
-    dul.scu_socket.send(bytestream)
+    dul.scu_socket.sendall(bytestream)
     
     return 'Sta6'
 
@@ -375,7 +412,7 @@ def AE_8(dul):
     # Callback
     dul.association.acse.debug_send_associate_rj(dul.pdu)
     
-    dul.scu_socket.send(dul.pdu.Encode())
+    dul.scu_socket.sendall(dul.pdu.Encode())
     
     dul.artim_timer.start()
     
@@ -411,8 +448,7 @@ def DT_1(dul):
     # Callback
     dul.association.acse.debug_send_data_tf(dul.pdu)
     
-    bytestream = dul.pdu.Encode()
-    dul.scu_socket.send(bytestream)
+    send_buffers(dul.scu_socket, dul.pdu.encode_buffers())
     
     return 'Sta6'
 
@@ -437,7 +473,9 @@ def DT_2(dul):
     str
         Sta6, the next state of the state machine
     """
-    # Send P-DATA indication primitive to DUL
+    # Send P-DATA indication primitive to DUL, its data is counted against
+    #   the local AE's memory budget until the service user is done with it
+    dul.charge_memory(dul.primitive)
     dul.to_user_queue.put(dul.primitive)
 
     return 'Sta6'
@@ -472,7 +510,7 @@ def AR_1(dul):
     dul.association.acse.debug_send_release_rq(dul.pdu)
 
     bytestream = dul.pdu.Encode()
-    dul.scu_socket.send(bytestream)
+    dul.scu_socket.sendall(bytestream)
     
     return 'Sta7'
 
@@ -559,7 +597,7 @@ def AR_4(dul):
     # Callback
     dul.association.acse.debug_send_release_rp(dul.pdu)
     
-    dul.scu_socket.send(dul.pdu.Encode())
+    dul.scu_socket.sendall(dul.pdu.Encode())
     dul.artim_timer.start()
     
     return 'Sta13'
@@ -647,8 +685,7 @@ def AR_7(dul):
     # Callback
     dul.association.acse.debug_send_data_tf(dul.pdu)
     
-    bytestream = dul.pdu.Encode()
-    dul.scu_socket.send(bytestream)
+    send_buffers(dul.scu_socket, dul.pdu.encode_buffers())
     
     return 'Sta8'
 
@@ -709,7 +746,7 @@ def AR_9(dul):
     # Callback
     dul.association.acse.debug_send_release_rp(dul.pdu)
     
-    dul.scu_socket.send(dul.pdu.Encode())
+    dul.scu_socket.sendall(dul.pdu.Encode())
     
     return 'Sta11'
 
@@ -782,7 +819,7 @@ def AA_1(dul):
     # Callback
     dul.association.acse.debug_send_abort(dul.pdu)
     
-    dul.scu_socket.send(dul.pdu.Encode())
+    dul.scu_socket.sendall(dul.pdu.Encode())
     
     dul.artim_timer.restart()
     
@@ -962,7 +999,7 @@ def AA_7(dul):
     # Callback
     dul.association.acse.debug_send_abort(dul.pdu)
     
-    dul.scu_socket.send(dul.pdu.Encode())
+    dul.scu_socket.sendall(dul.pdu.Encode())
     
     return 'Sta13'
 
@@ -1007,7 +1044,7 @@ def AA_8(dul):
         dul.association.acse.debug_send_abort(dul.pdu)
         
         # Encode and send A-ABORT to peer
-        dul.scu_socket.send(dul.pdu.Encode())
+        dul.scu_socket.sendall(dul.pdu.Encode())
         # Issue A-P-ABORT to user
         dul.to_user_queue.put(dul.primitive)
         dul.artim_timer.start()
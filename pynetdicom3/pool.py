@@ -0,0 +1,240 @@
+
+# This module implements the association pool, which keeps associations with
+# peer AEs established between SCU operations so that repeated operations
+# against the same peer don't each have to connect and negotiate a new
+# association.
+
+from contextlib import contextmanager
+import logging
+import threading
+import time
+
+logger = logging.getLogger('pynetdicom.pool')
+
+
+class AssociationPool(object):
+    """
+    Hands out established associations with peer AEs, keeping them open once
+    they've been returned so they can be reused by the next checkout for the
+    same peer.
+
+    Associations are pooled by the peer's address, port and AE title, the
+    maximum PDU size and the local AE's SCU presentation contexts. An
+    association that's been idle for more than `echo_after` seconds is
+    checked with a C-ECHO before it's handed out (provided a Verification
+    presentation context was accepted), and one that's been idle for more
+    than `idle_timeout` seconds is released. Associations that have been
+    aborted or released are discarded.
+
+        pool = AssociationPool(ae)
+        with pool.association('192.168.2.1', 104, 'PACS') as assoc:
+            assoc.send_c_store(dataset)
+
+    Parameters
+    ----------
+    local_ae - pynetdicom3.applicationentity.ApplicationEntity
+        The local AE, used to request the associations
+    idle_timeout - float, optional
+        The time (in seconds) an association may be idle in the pool before
+        it's released. This should be less than the AE's network_timeout,
+        otherwise the association may be aborted by the DUL idle timer
+        first (default: 30)
+    echo_after - float or None, optional
+        The time (in seconds) an association may be idle in the pool before
+        it's checked with a C-ECHO when checked out, None to never check
+        (default: 5)
+    max_idle - int, optional
+        The maximum number of idle associations kept for each peer, any
+        more are released when returned (default: 4)
+
+    Attributes
+    ----------
+    ae - pynetdicom3.applicationentity.ApplicationEntity
+        The local AE
+    echo_after - float or None
+        The idle time before an association is checked with a C-ECHO
+    idle_timeout - float
+        The idle time before an association is released
+    max_idle - int
+        The maximum number of idle associations kept for each peer
+    """
+    def __init__(self, local_ae, idle_timeout=30, echo_after=5, max_idle=4):
+        self.ae = local_ae
+        self.idle_timeout = idle_timeout
+        self.echo_after = echo_after
+        self.max_idle = max_idle
+
+        # {key : [(association, time returned), ...]}, most recently
+        #   returned last
+        self._idle = {}
+        # {association : key} for the checked out associations
+        self._checked_out = {}
+        self._lock = threading.Lock()
+
+    def _key(self, addr, port, ae_title, max_pdu):
+        """ Return the key used to pool associations with the same peer """
+        contexts = tuple([(context.AbstractSyntax,
+                           tuple(context.TransferSyntax))
+                          for context in self.ae.presentation_contexts_scu])
+
+        return (addr, port, ae_title.strip(), max_pdu, contexts)
+
+    def checkout(self, addr, port, ae_title='ANY-SCP', max_pdu=16382):
+        """
+        Return an established association with the peer AE, reusing an idle
+        one from the pool if there is one, otherwise requesting a new one
+
+        The association must be given back with checkin() once the caller
+        is done with it, rather than being released.
+
+        Parameters
+        ----------
+        addr - str
+            The peer AE's TCP/IP address (IPv4)
+        port - int
+            The peer AE's listen port number
+        ae_title - str or bytes, optional
+            The peer AE's title
+        max_pdu - int, optional
+            The maximum PDV receive size in bytes to use when negotiating the
+            association
+
+        Returns
+        -------
+        assoc - pynetdicom3.association.Association
+            The association. If a new association was requested but it
+            wasn't established then it's returned anyway, check
+            `assoc.is_established`
+        """
+        if isinstance(ae_title, bytes):
+            ae_title = ae_title.decode('utf-8')
+
+        key = self._key(addr, port, ae_title, max_pdu)
+
+        while True:
+            with self._lock:
+                self._evict_expired()
+
+                idle = self._idle.get(key)
+                if not idle:
+                    break
+
+                assoc, returned = idle.pop()
+
+            if self._is_healthy(assoc, time.time() - returned):
+                with self._lock:
+                    self._checked_out[assoc] = key
+
+                return assoc
+
+            logger.info("Discarding a pooled association that failed its "
+                        "health check")
+            self._close(assoc)
+
+        assoc = self.ae.associate(addr, port, ae_title, max_pdu)
+        if assoc.is_established:
+            with self._lock:
+                self._checked_out[assoc] = key
+
+        return assoc
+
+    def checkin(self, assoc):
+        """
+        Return an association obtained from checkout() to the pool
+
+        Parameters
+        ----------
+        assoc - pynetdicom3.association.Association
+            The association to return
+        """
+        with self._lock:
+            key = self._checked_out.pop(assoc, None)
+            if key is not None and self._is_open(assoc):
+                idle = self._idle.setdefault(key, [])
+                if len(idle) < self.max_idle:
+                    idle.append((assoc, time.time()))
+                    return
+
+        if key is None:
+            logger.warning("Association returned to a pool it wasn't checked "
+                           "out from")
+
+        self._close(assoc)
+
+    @contextmanager
+    def association(self, addr, port, ae_title='ANY-SCP', max_pdu=16382):
+        """
+        Context manager that checks out an association with the peer AE and
+        returns it to the pool afterwards, see checkout() for the parameters
+
+        Yields
+        ------
+        assoc - pynetdicom3.association.Association
+            The association
+        """
+        assoc = self.checkout(addr, port, ae_title, max_pdu)
+        try:
+            yield assoc
+        finally:
+            if assoc.is_established:
+                self.checkin(assoc)
+
+    def close(self):
+        """ Release all the idle associations in the pool """
+        with self._lock:
+            idle = [assoc for associations in self._idle.values()
+                                        for assoc, _ in associations]
+            self._idle = {}
+
+        for assoc in idle:
+            self._close(assoc)
+
+    def _evict_expired(self):
+        """ Release the associations that have been idle too long """
+        now = time.time()
+        for key in list(self._idle.keys()):
+            keep = []
+            for assoc, returned in self._idle[key]:
+                if self._is_open(assoc) and \
+                                    now - returned <= self.idle_timeout:
+                    keep.append((assoc, returned))
+                else:
+                    # Releasing blocks on the peer, so do it in the background
+                    threading.Thread(target=self._close,
+                                     args=(assoc,), daemon=True).start()
+
+            if keep:
+                self._idle[key] = keep
+            else:
+                del self._idle[key]
+
+    def _is_healthy(self, assoc, idle_time):
+        """ Return True if the association can be handed out """
+        if not self._is_open(assoc):
+            return False
+
+        if self.echo_after is None or idle_time <= self.echo_after:
+            return True
+
+        # Only possible if Verification was one of the accepted contexts
+        for context in assoc.acse.context_manager.accepted:
+            if context.AbstractSyntax == '1.2.840.10008.1.1':
+                status = assoc.send_c_echo()
+                return status is not None and status.Type == 'Success'
+
+        return True
+
+    @staticmethod
+    def _is_open(assoc):
+        """ Return True if the association is still established """
+        return assoc.is_established and not assoc.is_aborted and \
+                            not assoc.is_released and assoc.is_alive()
+
+    @staticmethod
+    def _close(assoc):
+        """ Release the association if it's still established """
+        if AssociationPool._is_open(assoc):
+            try:
+                assoc.release()
+            except Exception as e:
+                logger.error("Failed to release a pooled association: %s" %e)
@@ -848,7 +848,7 @@ class P_DATA():
     
     Attributes
     ----------
-    presentation_data_value_list : list of [int, bytes]
+    presentation_data_value_list : list of [int, bytes or memoryview]
         Contains one or more Presentation Data Values (PDV), each consisting of
         a Presentation Context ID and User Data values. The User Data values are
         taken from the Abstract Syntax and encoded in the Transfer Syntax 
@@ -868,7 +868,8 @@ class P_DATA():
         if isinstance(value_list, list):
             for pdv in value_list:
                 if isinstance(pdv, list):
-                    if isinstance(pdv[0], int) and isinstance(pdv[1], bytes):
+                    if isinstance(pdv[0], int) and \
+                            isinstance(pdv[1], (bytes, bytearray, memoryview)):
                         pass
                     else:
                         raise TypeError("P_DATA.presentation_data_value_list " \
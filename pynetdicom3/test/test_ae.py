@@ -1,13 +1,24 @@
 #!/usr/bin/env python
 
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 import logging
+import os
+import shutil
+import signal
+import tempfile
 import threading
+import time
 import unittest
 from unittest.mock import patch
+import zlib
 
+from pydicom import read_file
 from pydicom.uid import UID, ImplicitVRLittleEndian
 
 from pynetdicom3 import AE
+from pynetdicom3.dsutils import SpooledDataset, read_file_meta, \
+                               read_sop_uids, write_part10_file
 from pynetdicom3 import VerificationSOPClass, StorageSOPClassList, \
     QueryRetrieveSOPClassList
 
@@ -15,6 +26,9 @@ logger = logging.getLogger('pynetdicom')
 handler = logging.StreamHandler()
 logger.setLevel(logging.CRITICAL)
 
+DATASET_PATH = os.path.join(os.path.dirname(__file__), 'dicom_files',
+                            'RTImageStorage.dcm')
+
 """
     Initialisation
     --------------
@@ -112,6 +126,14 @@ class AEStorageSCP(threading.Thread):
         self.ae.stop()
 
 
+def stop_scp(scp):
+    """ Stop `scp` if the test hasn't already, so the port is freed """
+    try:
+        scp.stop()
+    except SystemExit:
+        pass
+
+
 class TestAEGoodCallbacks(unittest.TestCase):
     def test_on_c_echo_called(self):
         """ Check that SCP AE.on_c_echo() was called """
@@ -161,6 +183,491 @@ class TestAEGoodCallbacks(unittest.TestCase):
     def test_on_association_abort_called(self): pass
 
 
+class TestAssociationSendFile(unittest.TestCase):
+    def test_send_c_store_file(self):
+        """ Check a Part 10 file is streamed to the Storage SCP """
+        scp = AEStorageSCP()
+        self.addCleanup(stop_scp, scp)
+        datasets = []
+        def on_c_store(dataset):
+            datasets.append(dataset)
+            return 0x0000
+        scp.ae.on_c_store = on_c_store
+        
+        ae = AE(scu_sop_class=StorageSOPClassList,
+                transfer_syntax=[ImplicitVRLittleEndian])
+        assoc = ae.associate('localhost', 11112, max_pdu=16382)
+        with patch('pynetdicom3.association.read_file') as mock:
+            status = assoc.send_c_store_file(DATASET_PATH)
+            
+        # The data set was sent without being decoded
+        mock.assert_not_called()
+        self.assertEqual(status.Type, 'Success')
+        
+        ref = read_file(DATASET_PATH)
+        self.assertEqual(datasets[0].SOPInstanceUID, ref.SOPInstanceUID)
+        self.assertEqual(datasets[0].PixelData, ref.PixelData)
+        
+        self.assertRaises(ValueError, assoc.send_c_store_file, __file__)
+        
+        assoc.release()
+        
+        self.assertRaises(SystemExit, scp.stop)
+
+    def test_read_sop_uids_deflated(self):
+        """ Check the UIDs are read from a deflated data set """
+        ref = read_file(DATASET_PATH)
+        with open(DATASET_PATH, 'rb') as fp:
+            read_file_meta(fp)
+            encoded = fp.read()
+        
+        deflater = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+        fp = BytesIO(deflater.compress(encoded) + deflater.flush())
+        self.assertEqual(read_sop_uids(fp, True, True, True),
+                         (ref.SOPClassUID, ref.SOPInstanceUID))
+        self.assertEqual(fp.tell(), 0)
+        
+        # Too short to reach the element after the SOP Instance UID
+        deflater = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+        short = encoded[:encoded.index(b'\x08\x00\x18\x00') + 200]
+        fp = BytesIO(deflater.compress(short) + deflater.flush())
+        self.assertEqual(read_sop_uids(fp, True, True, True)[1],
+                         ref.SOPInstanceUID)
+
+
+class TestAESpoolCStore(unittest.TestCase):
+    def test_spooled_dataset(self):
+        """ Check the C-STORE data set is spooled to a temporary file """
+        scp = AEStorageSCP()
+        self.addCleanup(stop_scp, scp)
+        scp.ae.spool_c_store = True
+        received = []
+        def on_c_store(dataset):
+            self.assertTrue(os.path.exists(dataset.path))
+            self.assertEqual(dataset.command_set.MessageID, 3)
+            received.append((dataset.path, dataset.decode()))
+            return 0x0000
+        scp.ae.on_c_store = on_c_store
+        
+        ae = AE(scu_sop_class=StorageSOPClassList,
+                transfer_syntax=[ImplicitVRLittleEndian])
+        assoc = ae.associate('localhost', 11112)
+        status = assoc.send_c_store_file(DATASET_PATH, msg_id=3)
+        self.assertEqual(status.Type, 'Success')
+        
+        path, dataset = received[0]
+        self.assertEqual(dataset.PixelData, read_file(DATASET_PATH).PixelData)
+        
+        # Removed once the callback returns
+        self.assertFalse(os.path.exists(path))
+        
+        assoc.release()
+        
+        self.assertRaises(SystemExit, scp.stop)
+
+    def test_spool_sink(self):
+        """ Check the data set is spooled to a user supplied sink """
+        scp = AEStorageSCP()
+        self.addCleanup(stop_scp, scp)
+        scp.ae.spool_c_store = True
+        sink = BytesIO()
+        sink.close = lambda: None
+        scp.ae.on_c_store_spool = \
+                    lambda command_set: SpooledDataset(command_set, sink)
+        scp.ae.on_c_store = lambda dataset: 0x0000
+        
+        ae = AE(scu_sop_class=StorageSOPClassList,
+                transfer_syntax=[ImplicitVRLittleEndian])
+        assoc = ae.associate('localhost', 11112)
+        status = assoc.send_c_store_file(DATASET_PATH)
+        self.assertEqual(status.Type, 'Success')
+        
+        with open(DATASET_PATH, 'rb') as fp:
+            read_file_meta(fp)
+            self.assertEqual(sink.getvalue(), fp.read())
+        
+        assoc.release()
+        
+        self.assertRaises(SystemExit, scp.stop)
+
+
+class TestAECStoreRaw(unittest.TestCase):
+    def test_on_c_store_raw(self):
+        """ Check the encoded data set is written as a Part 10 file """
+        scp = AEStorageSCP()
+        self.addCleanup(stop_scp, scp)
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'received.dcm')
+        def on_c_store_raw(context, command_set, dataset_bytes):
+            write_part10_file(path, dataset_bytes,
+                              command_set.AffectedSOPClassUID,
+                              command_set.AffectedSOPInstanceUID,
+                              context.TransferSyntax[0])
+            return 0x0000
+        scp.ae.on_c_store_raw = on_c_store_raw
+        
+        ae = AE(scu_sop_class=StorageSOPClassList,
+                transfer_syntax=[ImplicitVRLittleEndian])
+        assoc = ae.associate('localhost', 11112)
+        ref = read_file(DATASET_PATH)
+        status = assoc.send_c_store_file(DATASET_PATH)
+        self.assertEqual(status.Type, 'Success')
+        
+        dataset = read_file(path)
+        self.assertEqual(dataset.file_meta.MediaStorageSOPInstanceUID,
+                         ref.SOPInstanceUID)
+        self.assertEqual(dataset.file_meta.TransferSyntaxUID,
+                         ImplicitVRLittleEndian)
+        self.assertEqual(dataset.PixelData, ref.PixelData)
+        
+        assoc.release()
+        shutil.rmtree(directory)
+        
+        self.assertRaises(SystemExit, scp.stop)
+
+
+class TestAssociationPipelined(unittest.TestCase):
+    def test_async_ops_negotiation(self):
+        """ Check the Asynchronous Operations Window is negotiated """
+        scp = AEVerificationSCP()
+        self.addCleanup(stop_scp, scp)
+        scp.ae.maximum_operations_performed = 4
+        
+        ae = AE(scu_sop_class=[VerificationSOPClass])
+        ae.maximum_operations_invoked = 8
+        assoc = ae.associate('localhost', 11112)
+        self.assertEqual(assoc.max_operations_invoked, 4)
+        self.assertEqual(assoc.max_operations_performed, 1)
+        
+        statuses = list(assoc.send_c_echo_pipelined(10, msg_id=5))
+        self.assertEqual(sorted([msg_id for msg_id, _ in statuses]),
+                         list(range(5, 15)))
+        self.assertTrue(all([status.Type == 'Success' 
+                                            for _, status in statuses]))
+        
+        assoc.release()
+        
+        self.assertRaises(SystemExit, scp.stop)
+
+    def test_no_async_ops_negotiation(self):
+        """ Check only one operation is outstanding without negotiation """
+        scp = AEVerificationSCP()
+        self.addCleanup(stop_scp, scp)
+        
+        ae = AE(scu_sop_class=[VerificationSOPClass])
+        assoc = ae.associate('localhost', 11112)
+        self.assertEqual(assoc.max_operations_invoked, 1)
+        
+        statuses = list(assoc.send_c_echo_pipelined(3))
+        self.assertEqual([msg_id for msg_id, _ in statuses], [1, 2, 3])
+        
+        assoc.release()
+        
+        self.assertRaises(SystemExit, scp.stop)
+
+    def test_message_id_wraps(self):
+        """ Check the Message IDs wrap from 65535 to 1, never using 0 """
+        scp = AEVerificationSCP()
+        self.addCleanup(stop_scp, scp)
+        
+        ae = AE(scu_sop_class=[VerificationSOPClass])
+        assoc = ae.associate('localhost', 11112)
+        
+        statuses = list(assoc.send_c_echo_pipelined(3, msg_id=65534))
+        self.assertEqual([msg_id for msg_id, _ in statuses], [65534, 65535, 1])
+        
+        assoc.release()
+        
+        self.assertRaises(SystemExit, scp.stop)
+
+    def test_send_c_store_pipelined(self):
+        """ Check the datasets are all stored with pipelined requests """
+        scp = AEStorageSCP()
+        self.addCleanup(stop_scp, scp)
+        scp.ae.maximum_operations_performed = 0
+        received = []
+        def on_c_store(dataset):
+            received.append(dataset.SOPInstanceUID)
+            return 0x0000
+        scp.ae.on_c_store = on_c_store
+        
+        ae = AE(scu_sop_class=StorageSOPClassList,
+                transfer_syntax=[ImplicitVRLittleEndian])
+        ae.maximum_operations_invoked = 3
+        assoc = ae.associate('localhost', 11112)
+        self.assertEqual(assoc.max_operations_invoked, 3)
+        
+        datasets = []
+        for ii in range(5):
+            dataset = read_file(DATASET_PATH)
+            dataset.SOPInstanceUID = '1.2.3.%s' %ii
+            datasets.append(dataset)
+        
+        results = list(assoc.send_c_store_pipelined(datasets))
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all([status.Type == 'Success' 
+                                            for _, status in results]))
+        self.assertEqual(received, ['1.2.3.%s' %ii for ii in range(5)])
+        
+        assoc.release()
+        
+        self.assertRaises(SystemExit, scp.stop)
+
+
+class TestAssociationSlowSCP(unittest.TestCase):
+    def test_no_dimse_timeout(self):
+        """ Check a slow response is waited for when there's no timeout """
+        scp = AEStorageSCP()
+        self.addCleanup(stop_scp, scp)
+        def on_c_store(dataset):
+            time.sleep(0.3)
+            return 0x0000
+        scp.ae.on_c_store = on_c_store
+        
+        ae = AE(scu_sop_class=StorageSOPClassList,
+                transfer_syntax=[ImplicitVRLittleEndian])
+        self.assertEqual(ae.dimse_timeout, 0)
+        assoc = ae.associate('localhost', 11112)
+        
+        status = assoc.send_c_store(read_file(DATASET_PATH))
+        self.assertEqual(status.Type, 'Success')
+        
+        status = assoc.send_c_store_file(DATASET_PATH)
+        self.assertEqual(status.Type, 'Success')
+        
+        assoc.release()
+        
+        self.assertRaises(SystemExit, scp.stop)
+
+    def test_slow_c_echo(self):
+        """ Check send_c_echo() waits for a slow C-ECHO response """
+        scp = AEVerificationSCP()
+        self.addCleanup(stop_scp, scp)
+        scp.ae.on_c_echo = lambda: time.sleep(0.3)
+        
+        ae = AE(scu_sop_class=[VerificationSOPClass])
+        assoc = ae.associate('localhost', 11112)
+        
+        status = assoc.send_c_echo()
+        self.assertEqual(status.Type, 'Success')
+        
+        assoc.release()
+        
+        self.assertRaises(SystemExit, scp.stop)
+
+
+class TestAEExecutor(unittest.TestCase):
+    def test_executor_dispatch(self):
+        """ Check the SCPs run on the executor and respond in order """
+        scp = AEStorageSCP()
+        self.addCleanup(stop_scp, scp)
+        scp.ae.maximum_operations_performed = 0
+        scp.ae.executor = ThreadPoolExecutor(max_workers=2)
+        received = []
+        threads = set()
+        def on_c_store(dataset):
+            received.append(dataset.SOPInstanceUID)
+            threads.add(threading.current_thread().name)
+            return 0x0000
+        scp.ae.on_c_store = on_c_store
+        
+        ae = AE(scu_sop_class=StorageSOPClassList,
+                transfer_syntax=[ImplicitVRLittleEndian])
+        ae.maximum_operations_invoked = 4
+        assoc = ae.associate('localhost', 11112)
+        
+        datasets = []
+        for ii in range(6):
+            dataset = read_file(DATASET_PATH)
+            dataset.SOPInstanceUID = '1.2.3.%s' %ii
+            datasets.append(dataset)
+        
+        results = list(assoc.send_c_store_pipelined(datasets))
+        self.assertEqual([dataset.SOPInstanceUID for dataset, _ in results],
+                         ['1.2.3.%s' %ii for ii in range(6)])
+        self.assertTrue(all([status.Type == 'Success' 
+                                            for _, status in results]))
+        self.assertEqual(received, ['1.2.3.%s' %ii for ii in range(6)])
+        self.assertTrue(all([name.startswith('ThreadPoolExecutor') 
+                                            for name in threads]))
+        
+        assoc.release()
+        scp.ae.executor.shutdown()
+        
+        self.assertRaises(SystemExit, scp.stop)
+
+
+class AEWorkersVerificationSCP(threading.Thread):
+    def __init__(self, workers, maximum_associations=2):
+        self.ae = AE(port=11112, scp_sop_class=[VerificationSOPClass])
+        # The workers are forked with the AE as it is when started
+        self.ae.maximum_associations = maximum_associations
+        self.workers = workers
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.start()
+        
+    def run(self):
+        self.ae.start(workers=self.workers)
+        
+    def stop(self):
+        self.ae.stop()
+
+
+class TestAEWorkers(unittest.TestCase):
+    def test_workers_serve(self):
+        """ Check associations are served by the worker processes """
+        scp = AEWorkersVerificationSCP(2)
+        self.addCleanup(stop_scp, scp)
+        time.sleep(0.5)
+        self.assertEqual(len(scp.ae._workers), 2)
+        
+        ae = AE(scu_sop_class=[VerificationSOPClass])
+        for ii in range(4):
+            assoc = ae.associate('localhost', 11112)
+            self.assertTrue(assoc.is_established)
+            self.assertEqual(assoc.send_c_echo().Type, 'Success')
+            assoc.release()
+        
+        self.assertRaises(SystemExit, scp.stop)
+        self.assertEqual(scp.ae._workers, {})
+
+    def test_worker_restarted(self):
+        """ Check a dead worker process is replaced """
+        scp = AEWorkersVerificationSCP(2)
+        self.addCleanup(stop_scp, scp)
+        time.sleep(0.5)
+        
+        pid = list(scp.ae._workers)[0]
+        os.kill(pid, signal.SIGKILL)
+        time.sleep(0.5)
+        self.assertFalse(pid in scp.ae._workers)
+        self.assertEqual(len(scp.ae._workers), 2)
+        
+        ae = AE(scu_sop_class=[VerificationSOPClass])
+        assoc = ae.associate('localhost', 11112)
+        self.assertTrue(assoc.is_established)
+        assoc.release()
+        
+        self.assertRaises(SystemExit, scp.stop)
+
+    def test_maximum_associations_shared(self):
+        """ Check maximum_associations applies across the workers """
+        scp = AEWorkersVerificationSCP(2, maximum_associations=1)
+        self.addCleanup(stop_scp, scp)
+        time.sleep(0.5)
+        
+        ae = AE(scu_sop_class=[VerificationSOPClass])
+        assocs = [ae.associate('localhost', 11112) for ii in range(3)]
+        self.assertEqual(len([assoc for assoc in assocs 
+                                            if assoc.is_established]), 1)
+        
+        for assoc in assocs:
+            if assoc.is_established:
+                assoc.release()
+        
+        self.assertRaises(SystemExit, scp.stop)
+
+
+class TestAEAccept(unittest.TestCase):
+    def test_connection_burst(self):
+        """ Check a burst of connections is accepted without delay """
+        scp = AEVerificationSCP()
+        self.addCleanup(stop_scp, scp)
+        scp.ae.maximum_associations = 20
+        time.sleep(0.2)
+        self.assertTrue(scp.ae.listen_backlog > 1)
+        
+        ae = AE(scu_sop_class=[VerificationSOPClass])
+        results = []
+        def associate():
+            assoc = ae.associate('localhost', 11112)
+            results.append(assoc.is_established)
+            if assoc.is_established:
+                assoc.release()
+        
+        threads = [threading.Thread(target=associate) for ii in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(results, [True] * 10)
+        
+        self.assertRaises(SystemExit, scp.stop)
+
+    def test_ended_associations_removed(self):
+        """ Check associations are removed from the AE once they end """
+        scp = AEVerificationSCP()
+        self.addCleanup(stop_scp, scp)
+        
+        ae = AE(scu_sop_class=[VerificationSOPClass])
+        assoc = ae.associate('localhost', 11112)
+        self.assertEqual(len(ae.active_associations), 1)
+        time.sleep(0.2)
+        self.assertEqual(len(scp.ae.active_associations), 1)
+        
+        assoc.release()
+        assoc.join()
+        time.sleep(0.2)
+        self.assertEqual(ae.active_associations, [])
+        self.assertEqual(scp.ae.active_associations, [])
+        
+        self.assertRaises(SystemExit, scp.stop)
+
+
+class TestAssociationContexts(unittest.TestCase):
+    def test_context_index(self):
+        """ Check the accepted contexts are indexed once established """
+        scp = AEStorageSCP()
+        self.addCleanup(stop_scp, scp)
+        
+        ae = AE(scu_sop_class=StorageSOPClassList,
+                transfer_syntax=[ImplicitVRLittleEndian])
+        assoc = ae.associate('localhost', 11112)
+        self.assertTrue(assoc.is_established)
+        
+        accepted = assoc.acse.presentation_contexts_accepted
+        self.assertEqual(len(assoc._contexts_by_id), len(accepted))
+        for context in accepted:
+            self.assertEqual(assoc._get_context(context.AbstractSyntax),
+                             (context.ID, context.TransferSyntax[0]))
+            self.assertEqual(assoc._get_context(context.AbstractSyntax,
+                                                context.TransferSyntax[0]),
+                             (context.ID, context.TransferSyntax[0]))
+        
+        self.assertEqual(assoc._get_context('1.2.3.4'), (None, None))
+        self.assertEqual(assoc._get_context(accepted[0].AbstractSyntax,
+                                            UID('1.2.840.10008.1.2.1')),
+                         (None, None))
+        
+        assoc.release()
+
+        self.assertRaises(SystemExit, scp.stop)
+
+    def test_scu_round_trip(self):
+        """ Check the context index is used to send requests by UID value """
+        scp = AEVerificationSCP()
+        self.addCleanup(stop_scp, scp)
+
+        ae = AE(scu_sop_class=[VerificationSOPClass])
+        assoc = ae.associate('localhost', 11112)
+        self.assertTrue(assoc.is_established)
+
+        # pydicom UIDs with a dictionary name are found by their value
+        context_id, _ = assoc._get_context('1.2.840.10008.1.1')
+        self.assertTrue(context_id is not None)
+        self.assertEqual(assoc._get_context(UID('1.2.840.10008.1.1')),
+                         assoc._get_context('1.2.840.10008.1.1'))
+
+        status = assoc.send_c_echo()
+        self.assertEqual(status.Type, 'Success')
+
+        assoc.release()
+
+        self.assertRaises(SystemExit, scp.stop)
+
+
 class TestAEGoodAssociation(unittest.TestCase):
     def test_associate_establish_release(self):
         """ Check SCU Association with SCP """
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+
+import asyncio
+import logging
+import os
+import threading
+import unittest
+
+from pydicom import read_file
+from pydicom.uid import JPEGBaseLineLossy8bit
+
+from pynetdicom3 import AE
+from pynetdicom3 import VerificationSOPClass, StorageSOPClassList
+
+logger = logging.getLogger('pynetdicom')
+handler = logging.StreamHandler()
+logger.setLevel(logging.CRITICAL)
+
+DATASET_PATH = os.path.join(os.path.dirname(__file__), 'dicom_files',
+                            'RTImageStorage.dcm')
+
+
+class AEVerificationSCP(threading.Thread):
+    def __init__(self):
+        self.ae = AE(port=11112, scp_sop_class=[VerificationSOPClass])
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.start()
+
+    def run(self):
+        self.ae.start()
+
+    def stop(self):
+        self.ae.stop()
+
+
+def stop_scp(scp):
+    """ Stop `scp` if the test hasn't already, so the port is freed """
+    try:
+        scp.stop()
+    except SystemExit:
+        pass
+
+
+class TestAsyncAssociation(unittest.TestCase):
+    def test_echo_release(self):
+        """ Check an asyncio SCU with a threaded SCP """
+        scp = AEVerificationSCP()
+        self.addCleanup(stop_scp, scp)
+
+        async def run():
+            ae = AE(scu_sop_class=[VerificationSOPClass])
+            assoc = await ae.associate_async('localhost', 11112)
+            self.assertTrue(assoc.is_established)
+            self.assertEqual(ae.active_associations, [assoc.assoc])
+
+            status = await assoc.send_c_echo()
+            self.assertEqual(status.Type, 'Success')
+
+            await assoc.release()
+            self.assertTrue(assoc.is_released)
+            self.assertFalse(assoc.is_established)
+            self.assertEqual(ae.active_associations, [])
+
+        asyncio.run(run())
+
+        self.assertRaises(SystemExit, scp.stop)
+
+    def test_not_established(self):
+        """ Check requesting an association with no peer and using it """
+        async def run():
+            ae = AE(scu_sop_class=[VerificationSOPClass])
+            assoc = await ae.associate_async('localhost', 11112)
+            self.assertFalse(assoc.is_established)
+
+            with self.assertRaises(RuntimeError):
+                await assoc.send_c_echo()
+
+        asyncio.run(run())
+
+    def test_c_store_compressed(self):
+        """ Check a compressed dataset gets a status like any other """
+        dataset = read_file(DATASET_PATH)
+        dataset.file_meta.TransferSyntaxUID = JPEGBaseLineLossy8bit
+
+        async def run():
+            ae = AE(scu_sop_class=StorageSOPClassList)
+            assoc = await ae.associate_async('localhost', 11112)
+            status = await assoc.send_c_store(dataset)
+            self.assertEqual(status.Type, 'Failure')
+            self.assertEqual(status.Description, 'Error: Cannot understand')
+
+        asyncio.run(run())
+
+    def test_async_scp(self):
+        """ Check associations served by ae.start_async() """
+        async def run():
+            scp = AE(port=11112, scp_sop_class=[VerificationSOPClass])
+            server = await scp.start_async()
+            try:
+                ae = AE(scu_sop_class=[VerificationSOPClass])
+                for ii in range(2):
+                    assoc = await ae.associate_async('localhost', 11112)
+                    self.assertTrue(assoc.is_established)
+                    self.assertEqual(len(scp.active_associations), 1)
+
+                    status = await assoc.send_c_echo()
+                    self.assertEqual(status.Type, 'Success')
+
+                    await assoc.release()
+                    self.assertTrue(assoc.is_released)
+
+                    # Give the SCP time to see the connection close
+                    await asyncio.sleep(0.1)
+                    self.assertEqual(scp.active_associations, [])
+
+                assoc = await ae.associate_async('localhost', 11112)
+                await assoc.abort()
+                self.assertTrue(assoc.is_aborted)
+
+                await asyncio.sleep(0.1)
+                self.assertEqual(scp.active_associations, [])
+            finally:
+                server.close()
+                await server.wait_closed()
+
+        asyncio.run(run())
+
+    def test_async_ops_window(self):
+        """ Check the Asynchronous Operations Window is proposed """
+        async def run():
+            scp = AE(port=11112, scp_sop_class=[VerificationSOPClass])
+            scp.maximum_operations_performed = 4
+            server = await scp.start_async()
+            try:
+                ae = AE(scu_sop_class=[VerificationSOPClass])
+                ae.maximum_operations_invoked = 8
+                assoc = await ae.associate_async('localhost', 11112)
+                self.assertTrue(assoc.is_established)
+                self.assertEqual(assoc.assoc.max_operations_invoked, 4)
+
+                await assoc.release()
+            finally:
+                server.close()
+                await server.wait_closed()
+
+        asyncio.run(run())
+
+    def test_async_scp_executor(self):
+        """ Check the SCP callbacks don't run on the event loop's thread """
+        threads = []
+
+        async def run():
+            scp = AE(port=11112, scp_sop_class=[VerificationSOPClass])
+            scp.on_c_echo = lambda: threads.append(threading.current_thread())
+            server = await scp.start_async()
+            try:
+                ae = AE(scu_sop_class=[VerificationSOPClass])
+                assoc = await ae.associate_async('localhost', 11112)
+                status = await assoc.send_c_echo()
+                self.assertEqual(status.Type, 'Success')
+
+                await assoc.release()
+            finally:
+                server.close()
+                await server.wait_closed()
+
+        asyncio.run(run())
+
+        self.assertEqual(len(threads), 1)
+        self.assertFalse(threads[0] is threading.current_thread())
+
+    def test_async_scp_no_sop(self):
+        """ Check the server isn't started without SCP SOP classes """
+        async def run():
+            scp = AE(port=11112, scu_sop_class=[VerificationSOPClass])
+            self.assertEqual(await scp.start_async(), None)
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    unittest.main()
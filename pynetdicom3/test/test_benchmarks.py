@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+
+import logging
+import unittest
+
+from pynetdicom3.benchmarks import compare, make_dataset, run_benchmarks
+
+logger = logging.getLogger('pynetdicom')
+handler = logging.StreamHandler()
+logger.setLevel(logging.CRITICAL)
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_run(self):
+        """ Check a quick run of every benchmark """
+        options = {'echo' : {'count' : 5},
+                   'store' : {'sizes' : [1024], 'volume' : 0},
+                   'find' : {'count' : 1},
+                   'association' : {'count' : 2}}
+        results = run_benchmarks(options=options)
+
+        self.assertEqual(sorted(results['results'].keys()),
+                         ['association', 'echo', 'find', 'store'])
+        self.assertEqual(results['results']['echo']['count'], 5)
+        self.assertEqual(results['results']['store']['1024']['count'], 10)
+        self.assertEqual(results['results']['store']['1024']['failed'], 0)
+        self.assertEqual(results['results']['find']['pending'], 1000)
+        self.assertEqual(results['results']['association']['setup']['count'],
+                         2)
+
+    def test_make_dataset(self):
+        """ Check the synthetic datasets are the requested size """
+        ds = make_dataset(1001, 3)
+        self.assertEqual(len(ds.PixelData), 1002)
+        self.assertNotEqual(ds.SOPInstanceUID,
+                            make_dataset(1001, 4).SOPInstanceUID)
+
+    def test_compare(self):
+        """ Check the relative change of each result """
+        old = {'results' : {'echo' : {'mean_ms' : 2.0, 'count' : 10}}}
+        new = {'results' : {'echo' : {'mean_ms' : 1.0, 'count' : 10}}}
+        self.assertEqual(compare(old, new), {'echo.count' : 0.0,
+                                             'echo.mean_ms' : -50.0})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,10 @@
 #!/usr/bin/env python
 
+from io import BytesIO
 import logging
+import tempfile
+import threading
+import time
 import unittest
 from unittest.mock import patch
 
@@ -9,6 +13,8 @@ from pydicom.dataset import Dataset
 
 from pynetdicom3.DIMSEmessages import *
 from pynetdicom3.DIMSEparameters import *
+from pynetdicom3.DIMSEprovider import DIMSEServiceProvider, STREAM_QUEUE_DEPTH
+from pynetdicom3.DULprovider import PrimitiveQueue
 from pynetdicom3.utils import wrap_list
 
 
@@ -186,7 +192,7 @@ class TestPrimitive_C_STORE(unittest.TestCase):
         dimse_msg = C_STORE_RQ()
         dimse_msg.primitive_to_message(primitive)
         
-        pdvs = dimse_msg.Encode(1, 16382)
+        pdvs = list(dimse_msg.Encode(1, 16382))
             
         # Command Set
         ref = b'\x03\x00\x00\x00\x00\x04\x00\x00\x00\xae\x00\x00\x00\x00\x00\x02' \
@@ -209,6 +215,62 @@ class TestPrimitive_C_STORE(unittest.TestCase):
               b'\x31\x30\x31'
         self.assertEqual(pdvs[1].presentation_data_value_list[0][1], ref)
   
+    def test_conversion_rq_file(self):
+        """ Check a -RQ with a file Data Set is read one fragment at a time """
+        primitive = C_STORE_ServiceParameters()
+        primitive.MessageID = 7
+        primitive.AffectedSOPClassUID = '1.2.840.10008.5.1.4.1.1.2'
+        primitive.AffectedSOPInstanceUID = '1.2.3.4'
+        primitive.Priority = 0x02
+        
+        data = bytes(range(256)) * 20
+        with tempfile.TemporaryFile() as fp:
+            fp.write(data)
+            fp.seek(0)
+            primitive.DataSet = fp
+            
+            dimse_msg = C_STORE_RQ()
+            dimse_msg.primitive_to_message(primitive)
+            
+            p_data = dimse_msg.Encode(1, 1006)
+            
+            # Command Set, nothing has been read from the Data Set yet
+            pdv = next(p_data).presentation_data_value_list[0][1]
+            self.assertEqual(pdv[0:1], b'\x03')
+            self.assertEqual(fp.tell(), 0)
+            
+            # Only the next fragment is read ahead
+            pdvs = [next(p_data).presentation_data_value_list[0][1]]
+            self.assertEqual(fp.tell(), 2000)
+            
+            pdvs += [pp.presentation_data_value_list[0][1] for pp in p_data]
+        
+        self.assertEqual([pdv[0:1] for pdv in pdvs], [b'\x00'] * 5 + [b'\x02'])
+        self.assertEqual(b''.join(pdv[1:] for pdv in pdvs), data)
+
+    def test_conversion_rq_lazy(self):
+        """ Check the P-DATA are produced as they're consumed """
+        primitive = C_STORE_ServiceParameters()
+        primitive.MessageID = 7
+        primitive.AffectedSOPClassUID = '1.2.840.10008.5.1.4.1.1.2'
+        primitive.AffectedSOPInstanceUID = '1.2.392.200036.9116.2.6.1.48'
+        primitive.Priority = 0x02
+        
+        data = bytes(range(256)) * 2000
+        primitive.DataSet = BytesIO(data)
+        
+        dimse_msg = C_STORE_RQ()
+        dimse_msg.primitive_to_message(primitive)
+        
+        p_data = dimse_msg.Encode(1, 16382)
+        self.assertFalse(isinstance(p_data, list))
+        
+        pdvs = [pp.presentation_data_value_list[0][1] for pp in p_data]
+        self.assertEqual([pdv[0:1] for pdv in pdvs], 
+                         [b'\x03'] + [b'\x00'] * 31 + [b'\x02'])
+        self.assertTrue(all([isinstance(pdv, bytes) for pdv in pdvs]))
+        self.assertEqual(b''.join(pdv[1:] for pdv in pdvs[1:]), data)
+
     def test_conversion_rsp(self):
         """ Check conversion to a -RSP PDU produces the correct output """
         primitive = C_STORE_ServiceParameters()
@@ -220,7 +282,7 @@ class TestPrimitive_C_STORE(unittest.TestCase):
         dimse_msg = C_STORE_RSP()
         dimse_msg.primitive_to_message(primitive)
         
-        pdvs = dimse_msg.Encode(1, 16382)
+        pdvs = list(dimse_msg.Encode(1, 16382))
         
         # Command Set
         ref = b'\x03\x00\x00\x00\x00\x04\x00\x00\x00\x4c\x00\x00\x00\x00\x00\x02' \
@@ -351,7 +413,7 @@ class TestPrimitive_C_FIND(unittest.TestCase):
         dimse_msg = C_FIND_RQ()
         dimse_msg.primitive_to_message(primitive)
         
-        pdvs = dimse_msg.Encode(1, 16382)
+        pdvs = list(dimse_msg.Encode(1, 16382))
         
         ## Command Set
         # \x03 Message Control Header Byte
@@ -411,7 +473,7 @@ class TestPrimitive_C_FIND(unittest.TestCase):
         dimse_msg = C_FIND_RSP()
         dimse_msg.primitive_to_message(primitive)
         
-        pdvs = dimse_msg.Encode(1, 16382)
+        pdvs = list(dimse_msg.Encode(1, 16382))
         
         # Command Set
         ref = b'\x03\x00\x00\x00\x00\x04\x00\x00\x00\x4a\x00\x00\x00\x00\x00\x02' \
@@ -559,7 +621,7 @@ class TestPrimitive_C_GET(unittest.TestCase):
         dimse_msg = C_GET_RQ()
         dimse_msg.primitive_to_message(primitive)
         
-        pdvs = dimse_msg.Encode(1, 16382)
+        pdvs = list(dimse_msg.Encode(1, 16382))
         
         # Command Set
         ref = b'\x03\x00\x00\x00\x00\x04\x00\x00\x00\x4a\x00\x00\x00\x00\x00\x02' \
@@ -595,7 +657,7 @@ class TestPrimitive_C_GET(unittest.TestCase):
         dimse_msg = C_GET_RSP()
         dimse_msg.primitive_to_message(primitive)
         
-        pdvs = dimse_msg.Encode(1, 16382)
+        pdvs = list(dimse_msg.Encode(1, 16382))
         
         # Command Set
         ref = b'\x03\x00\x00\x00\x00\x04\x00\x00\x00\x72\x00\x00\x00\x00\x00\x02' \
@@ -749,7 +811,7 @@ class TestPrimitive_C_MOVE(unittest.TestCase):
         dimse_msg = C_MOVE_RQ()
         dimse_msg.primitive_to_message(primitive)
         
-        pdvs = dimse_msg.Encode(1, 16382)
+        pdvs = list(dimse_msg.Encode(1, 16382))
         
         # Command Set
         ref = b'\x03\x00\x00\x00\x00\x04\x00\x00\x00\x62\x00\x00\x00\x00\x00\x02' \
@@ -786,7 +848,7 @@ class TestPrimitive_C_MOVE(unittest.TestCase):
         dimse_msg = C_MOVE_RSP()
         dimse_msg.primitive_to_message(primitive)
         
-        pdvs = dimse_msg.Encode(1, 16382)
+        pdvs = list(dimse_msg.Encode(1, 16382))
         
         # Command Set
         ref = b'\x03\x00\x00\x00\x00\x04\x00\x00\x00\x72\x00\x00\x00\x00\x00\x02' \
@@ -878,7 +940,7 @@ class TestPrimitive_C_ECHO(unittest.TestCase):
         dimse_msg = C_ECHO_RQ()
         dimse_msg.primitive_to_message(primitive)
         
-        pdvs = dimse_msg.Encode(1, 16382)
+        pdvs = list(dimse_msg.Encode(1, 16382))
             
         # Command Set
         ref = b'\x03\x00\x00\x00\x00\x04\x00\x00\x00\x38\x00\x00\x00\x00\x00\x02' \
@@ -899,7 +961,7 @@ class TestPrimitive_C_ECHO(unittest.TestCase):
         dimse_msg = C_ECHO_RSP()
         dimse_msg.primitive_to_message(primitive)
         
-        pdvs = dimse_msg.Encode(1, 16382)
+        pdvs = list(dimse_msg.Encode(1, 16382))
         
         # Command Set
         ref = b'\x03\x00\x00\x00\x00\x04\x00\x00\x00\x42\x00\x00\x00\x00\x00\x02' \
@@ -911,5 +973,276 @@ class TestPrimitive_C_ECHO(unittest.TestCase):
         self.assertEqual(pdvs[0].presentation_data_value_list[0][1], ref)
 
 
+class TestMessageConversion(unittest.TestCase):
+    def test_class_command_set_unchanged(self):
+        """ Check converting a primitive doesn't alter the class Command Set """
+        reference = [elem.tag for elem in C_STORE_RQ.command_set]
+        
+        primitive = C_STORE_ServiceParameters()
+        primitive.MessageID = 7
+        primitive.AffectedSOPClassUID = '1.2.840.10008.5.1.4.1.1.2'
+        primitive.AffectedSOPInstanceUID = '1.2.3.4'
+        primitive.Priority = 0x02
+        primitive.DataSet = BytesIO()
+        
+        dimse_msg = C_STORE_RQ()
+        dimse_msg.primitive_to_message(primitive)
+        
+        self.assertEqual([elem.tag for elem in C_STORE_RQ.command_set],
+                         reference)
+        self.assertFalse('MoveOriginatorMessageID' in dimse_msg.command_set)
+        self.assertEqual(dimse_msg.command_set.CommandField, 0x0001)
+
+    def test_cancel_rq(self):
+        """ Check a C-CANCEL-RQ converts to and from a primitive """
+        primitive = C_FIND_ServiceParameters()
+        primitive.MessageIDBeingRespondedTo = 4
+        
+        dimse_msg = C_CANCEL_RQ()
+        dimse_msg.primitive_to_message(primitive)
+        self.assertEqual(dimse_msg.command_set.CommandField, 0x0FFF)
+        self.assertEqual(dimse_msg.command_set.CommandDataSetType, 0x0101)
+        
+        primitive = dimse_msg.message_to_primitive()
+        self.assertTrue(isinstance(primitive, C_FIND_ServiceParameters))
+        self.assertEqual(primitive.MessageIDBeingRespondedTo, 4)
+
+
+class TestCommandSetCodec(unittest.TestCase):
+    def test_encode(self):
+        """ Check the Command Set codec matches pydicom's encoding """
+        primitive = C_MOVE_ServiceParameters()
+        primitive.MessageID = 7
+        primitive.AffectedSOPClassUID = '1.2.840.10008.5.1.4.1.2.1.2'
+        primitive.Priority = 0x02
+        primitive.MoveDestination = 'MOVE_SCP'
+        primitive.Identifier = BytesIO()
+        
+        dimse_msg = C_MOVE_RQ()
+        dimse_msg.primitive_to_message(primitive)
+        
+        self.assertEqual(encode_command_set(dimse_msg.command_set),
+                         encode(dimse_msg.command_set, True, True))
+
+    def test_round_trip(self):
+        """ Check decoding an encoded Command Set """
+        primitive = C_GET_ServiceParameters()
+        primitive.MessageIDBeingRespondedTo = 5
+        primitive.AffectedSOPClassUID = '1.2.840.10008.5.1.4.1.2.1.3'
+        primitive.Status = 0xFF00
+        primitive.NumberOfRemainingSuboperations = 3
+        primitive.NumberOfCompletedSuboperations = 1
+        primitive.NumberOfFailedSuboperations = 0
+        primitive.NumberOfWarningSuboperations = 0
+        primitive.Identifier = BytesIO()
+        
+        dimse_msg = C_GET_RSP()
+        dimse_msg.primitive_to_message(primitive)
+        
+        encoded = encode_command_set(dimse_msg.command_set)
+        command_set = decode_command_set(encoded)
+        
+        self.assertEqual(command_set, dimse_msg.command_set)
+        self.assertEqual(list(command_set),
+                         list(decode(BytesIO(encoded), True, True)))
+        self.assertTrue(isinstance(command_set.AffectedSOPClassUID, UID))
+
+    def test_decode_unknown_element(self):
+        """ Check an unknown element falls back to pydicom """
+        ds = Dataset()
+        ds.CommandField = 0x8030
+        ds.MessageIDBeingRespondedTo = 1
+        ds.CommandDataSetType = 0x0101
+        ds.Status = 0x0000
+        ds.add_new(0x00005010, 'SH', 'ACR-NEMA')
+        encoded = encode(ds, True, True)
+        
+        command_set = decode_command_set(encoded)
+        self.assertEqual(list(command_set),
+                         list(decode(BytesIO(encoded), True, True)))
+
+
+class DummyDUL(object):
+    """ Collects the P-DATA sent and returns those queued for receiving """
+    def __init__(self):
+        self.sent = []
+        self.received = []
+        self.released = 0
+        self.to_provider_queue = PrimitiveQueue()
+
+    def Send(self, primitive):
+        self.sent.append(primitive)
+
+    def Peek(self):
+        return self.received[0] if self.received else None
+
+    def Receive(self, wait=False, timeout=None):
+        return self.received.pop(0) if self.received else None
+
+    def is_alive(self):
+        return True
+
+    def release_memory(self, nbytes=None):
+        self.released += nbytes
+
+
+class SlowDUL(DummyDUL):
+    """ Sends the queued P-DATA from a thread of its own, one at a time """
+    def __init__(self):
+        DummyDUL.__init__(self)
+        self.max_depth = 0
+        self._thread = threading.Thread(target=self._send_queued)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def Send(self, primitive):
+        self.to_provider_queue.put(primitive)
+        self.max_depth = max(self.max_depth, self.to_provider_queue.qsize())
+
+    def _send_queued(self):
+        while True:
+            self.sent.append(self.to_provider_queue.get())
+            time.sleep(0.001)
+
+
+class TestPDVPacking(unittest.TestCase):
+    def echo_rsp(self, msg_id):
+        primitive = C_ECHO_ServiceParameters()
+        primitive.MessageIDBeingRespondedTo = msg_id
+        primitive.AffectedSOPClassUID = '1.2.840.10008.1.1'
+        primitive.Status = 0x0000
+        
+        return primitive
+
+    def test_command_and_data_set(self):
+        """ Check a small Data Set is sent with its Command Set """
+        dul = DummyDUL()
+        dimse = DIMSEServiceProvider(dul)
+        
+        primitive = C_STORE_ServiceParameters()
+        primitive.MessageID = 7
+        primitive.AffectedSOPClassUID = '1.2.840.10008.5.1.4.1.1.2'
+        primitive.AffectedSOPInstanceUID = '1.2.392.200036.9116.2.6.1.48'
+        primitive.Priority = 0x02
+        primitive.DataSet = BytesIO(b'\x00' * 100)
+        
+        dimse.Send(primitive, 1, 16382)
+        
+        self.assertEqual(len(dul.sent), 1)
+        pdvs = dul.sent[0].presentation_data_value_list
+        self.assertEqual([pdv[1][0:1] for pdv in pdvs], [b'\x03', b'\x02'])
+
+    def test_queue_depth(self):
+        """ Check an in-memory Data Set is only encoded as it's sent """
+        dul = SlowDUL()
+        dimse = DIMSEServiceProvider(dul)
+        
+        primitive = C_STORE_ServiceParameters()
+        primitive.MessageID = 7
+        primitive.AffectedSOPClassUID = '1.2.840.10008.5.1.4.1.1.2'
+        primitive.AffectedSOPInstanceUID = '1.2.392.200036.9116.2.6.1.48'
+        primitive.Priority = 0x02
+        data_set = BytesIO(b'\x00' * 100000)
+        primitive.DataSet = data_set
+        
+        dimse.Send(primitive, 1, 1000)
+        
+        self.assertTrue(len(dul.sent) + dul.to_provider_queue.qsize() > 100)
+        self.assertTrue(dul.max_depth <= STREAM_QUEUE_DEPTH)
+        
+        # The Data Set's buffer is no longer exported
+        data_set.write(b'\x00')
+
+    def test_flush_delay(self):
+        """ Check held back messages are sent once the delay has passed """
+        dul = DummyDUL()
+        dimse = DIMSEServiceProvider(dul)
+        
+        dimse.Send(self.echo_rsp(1), 1, 16382, flush=False, delay=0.05)
+        dimse.Send(self.echo_rsp(2), 1, 16382, flush=False, delay=0.05)
+        self.assertEqual(dul.sent, [])
+        
+        time.sleep(0.5)
+        self.assertEqual(len(dul.sent), 1)
+        self.assertEqual(len(dul.sent[0].presentation_data_value_list), 2)
+        
+        # Nothing is sent twice once flushed
+        dimse.Send(self.echo_rsp(3), 1, 16382, flush=False, delay=0.05)
+        dimse.flush()
+        time.sleep(0.2)
+        self.assertEqual(len(dul.sent), 2)
+
+    def test_max_pdu(self):
+        """ Check the PDV items in each P-DATA fit within the max PDU """
+        dul = DummyDUL()
+        dimse = DIMSEServiceProvider(dul)
+        
+        for ii in range(20):
+            dimse.Send(self.echo_rsp(ii), 1, 400, flush=False)
+        dimse.flush()
+        
+        self.assertTrue(len(dul.sent) > 1)
+        for pdata in dul.sent:
+            length = sum([len(pdv[1]) + 5 
+                            for pdv in pdata.presentation_data_value_list])
+            self.assertTrue(length <= 400)
+
+    def test_flush(self):
+        """ Check messages are held back until flushed """
+        dul = DummyDUL()
+        dimse = DIMSEServiceProvider(dul)
+        
+        dimse.Send(self.echo_rsp(1), 1, 16382, flush=False)
+        dimse.Send(self.echo_rsp(2), 1, 16382, flush=False)
+        self.assertEqual(dul.sent, [])
+        
+        dimse.Send(self.echo_rsp(3), 1, 16382)
+        self.assertEqual(len(dul.sent), 1)
+        self.assertEqual(len(dul.sent[0].presentation_data_value_list), 3)
+        
+        dimse.flush()
+        self.assertEqual(len(dul.sent), 1)
+
+    def test_receive_packed(self):
+        """ Check several messages in one P-DATA are all received """
+        dul = DummyDUL()
+        dimse = DIMSEServiceProvider(dul)
+        
+        for ii in range(3):
+            dimse.Send(self.echo_rsp(ii + 1), 1, 16382, flush=False)
+        dimse.flush()
+        
+        dul.received = dul.sent
+        msg_ids = []
+        for ii in range(3):
+            rsp, context_id = dimse.Receive(False)
+            self.assertEqual(context_id, 1)
+            msg_ids.append(rsp.MessageIDBeingRespondedTo)
+        
+        self.assertEqual(msg_ids, [1, 2, 3])
+        self.assertEqual(dimse.Receive(False), (None, None))
+
+    def test_receive_releases_memory(self):
+        """ Check memory is released as messages complete, except for the 
+        PDVs left over for the next message """
+        dul = DummyDUL()
+        dimse = DIMSEServiceProvider(dul)
+        
+        for ii in range(2):
+            dimse.Send(self.echo_rsp(ii + 1), 1, 16382, flush=False)
+        dimse.flush()
+        
+        dul.received = dul.sent
+        pdvs = dul.sent[0].presentation_data_value_list
+        total = sum([len(pdv[1]) + 5 for pdv in pdvs])
+        
+        dimse.Receive(False)
+        self.assertEqual(dul.released, len(pdvs[0][1]) + 5)
+        self.assertFalse(dimse.is_receiving())
+        
+        dimse.Receive(False)
+        self.assertEqual(dul.released, total)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,362 @@
+#!/usr/bin/env python
+
+import logging
+import socket
+import threading
+import time
+import unittest
+
+from pynetdicom3 import AE, VerificationSOPClass
+from pynetdicom3.DULprovider import DULServiceProvider, ReceiveBuffer, \
+    PrimitiveQueue, pdu_length_allowed
+from pynetdicom3.fsm import send_buffers
+from pynetdicom3.primitives import P_DATA
+
+logger = logging.getLogger('pynetdicom')
+handler = logging.StreamHandler()
+logger.setLevel(logging.CRITICAL)
+
+a_release_rq = b"\x05\x00\x00\x00\x00\x04\x00\x00\x00\x00"
+a_release_rp = b"\x06\x00\x00\x00\x00\x04\x00\x00\x00\x00"
+
+
+def p_data_tf(length):
+    """ Return a P-DATA-TF PDU with a single PDV of `length` bytes """
+    pdv = b'\x01\x03' + b'\x00' * (length - 2)
+    header = b'\x04\x00' + (length + 4).to_bytes(4, 'big')
+    return header + length.to_bytes(4, 'big') + pdv
+
+
+class TestReceiveBuffer(unittest.TestCase):
+    def setUp(self):
+        self.local, self.remote = socket.socketpair()
+
+    def tearDown(self):
+        self.local.close()
+        self.remote.close()
+
+    def test_several_pdus(self):
+        """ Check several PDUs received in a single read """
+        buffer = ReceiveBuffer()
+        self.remote.sendall(a_release_rq + a_release_rp + a_release_rq)
+
+        self.assertFalse(buffer.has_pdu())
+        self.assertEqual(buffer.recv(self.local), 30)
+
+        self.assertEqual(buffer.pdu_type, 0x05)
+        self.assertEqual(buffer.next_pdu(), a_release_rq)
+        self.assertEqual(buffer.pdu_type, 0x06)
+        self.assertEqual(buffer.next_pdu(), a_release_rp)
+        self.assertEqual(buffer.next_pdu(), a_release_rq)
+        self.assertEqual(buffer.next_pdu(), None)
+        self.assertEqual(buffer.pdu_type, None)
+
+    def test_partial_pdu(self):
+        """ Check a PDU received over several reads """
+        buffer = ReceiveBuffer()
+        pdus = a_release_rq + a_release_rp
+
+        for ii in range(len(pdus)):
+            self.remote.sendall(pdus[ii:ii + 1])
+            self.assertEqual(buffer.recv(self.local), 1)
+
+            if ii == 9:
+                self.assertEqual(buffer.next_pdu(), a_release_rq)
+            elif ii == 19:
+                self.assertEqual(buffer.next_pdu(), a_release_rp)
+            else:
+                self.assertEqual(buffer.next_pdu(), None)
+
+    def test_wrap(self):
+        """ Check PDUs that straddle the end of the buffer """
+        buffer = ReceiveBuffer(size=32)
+        pdu = p_data_tf(12)
+
+        # Keep the socket reads unaligned with the PDU boundaries
+        stream = pdu * 20
+        received = []
+        for ii in range(0, len(stream), 13):
+            chunk = stream[ii:ii + 13]
+            self.remote.sendall(chunk)
+
+            nbytes = 0
+            while nbytes < len(chunk):
+                nbytes += buffer.recv(self.local)
+                while buffer.has_pdu():
+                    received.append(buffer.next_pdu())
+
+        self.assertEqual(received, [pdu] * 20)
+
+    def test_p_data_view(self):
+        """ Check P-DATA-TF PDUs are views that survive the buffer's reuse """
+        buffer = ReceiveBuffer(size=32)
+        pdu = p_data_tf(12)
+
+        self.remote.sendall(pdu + a_release_rq)
+        buffer.recv(self.local)
+        held = buffer.next_pdu()
+        self.assertIsInstance(held, memoryview)
+        self.assertEqual(held, pdu)
+        self.assertIsInstance(buffer.next_pdu(), bytes)
+
+        # Fill the buffer again while the first PDU is still in use
+        other = p_data_tf(20)[:-18] + b'\xff' * 18
+        for _ in range(4):
+            self.remote.sendall(other)
+            buffer.recv(self.local)
+            view = buffer.next_pdu()
+            self.assertEqual(view, other)
+            view.release()
+
+        self.assertEqual(held, pdu)
+
+    def test_large_pdu(self):
+        """ Check a PDU larger than the buffer """
+        buffer = ReceiveBuffer(size=64)
+        pdu = p_data_tf(1000)
+        self.remote.sendall(pdu + a_release_rq)
+
+        while not buffer.has_pdu():
+            buffer.recv(self.local)
+
+        self.assertEqual(buffer.next_pdu(), pdu)
+
+        while not buffer.has_pdu():
+            buffer.recv(self.local)
+
+        self.assertEqual(buffer.next_pdu(), a_release_rq)
+
+    def test_closed(self):
+        """ Check a closed connection reads nothing """
+        buffer = ReceiveBuffer()
+        self.remote.close()
+        self.assertEqual(buffer.recv(self.local), 0)
+
+    def test_clear(self):
+        """ Check clearing the buffer """
+        buffer = ReceiveBuffer()
+        self.remote.sendall(a_release_rq + a_release_rp[:4])
+        buffer.recv(self.local)
+
+        buffer.clear()
+        self.assertFalse(buffer.has_pdu())
+        self.assertEqual(buffer.pdu_type, None)
+
+    def test_oversized_pdu(self):
+        """ Check no room is made for a PDU longer than the maximum """
+        buffer = ReceiveBuffer(size=64)
+        buffer.max_pdu = 1000
+
+        # Only the header of a ~4 GiB P-DATA-TF
+        self.remote.sendall(b'\x04\x00\xff\xff\xff\xff')
+        buffer.recv(self.local)
+        self.assertTrue(buffer.is_oversized())
+
+        self.remote.sendall(b'\x00' * 10)
+        buffer.recv(self.local)
+        self.assertTrue(buffer._pdu is None)
+        self.assertFalse(buffer.has_pdu())
+
+        buffer.clear()
+        self.assertFalse(buffer.is_oversized())
+
+    def test_maximum_pdu(self):
+        """ Check a PDU of exactly the maximum length is received """
+        buffer = ReceiveBuffer(size=64)
+        pdu = p_data_tf(996)
+        buffer.max_pdu = 1000
+        self.remote.sendall(pdu)
+
+        while not buffer.has_pdu():
+            self.assertFalse(buffer.is_oversized())
+            buffer.recv(self.local)
+
+        self.assertEqual(buffer.next_pdu(), pdu)
+
+
+class TestPDULengthAllowed(unittest.TestCase):
+    def test_p_data(self):
+        """ Check P-DATA-TF PDUs are limited by the local maximum """
+        self.assertTrue(pdu_length_allowed(0x04, 16382, 16382))
+        self.assertFalse(pdu_length_allowed(0x04, 16383, 16382))
+        self.assertTrue(pdu_length_allowed(0x04, 16383, 0))
+        self.assertFalse(pdu_length_allowed(0x04, 0xffffffff, 0))
+
+    def test_other(self):
+        """ Check other PDUs aren't limited by the local maximum """
+        self.assertTrue(pdu_length_allowed(0x01, 20000, 16382))
+        self.assertFalse(pdu_length_allowed(0x01, 0xffffffff, 16382))
+
+
+class TestPrimitiveQueue(unittest.TestCase):
+    def test_wait_for_put(self):
+        """ Check a waiting thread is woken when an item is put """
+        queue_ = PrimitiveQueue()
+        changes = queue_.changes
+        timer = threading.Timer(0.05, queue_.put, ['primitive'])
+        timer.start()
+        
+        start = time.time()
+        self.assertTrue(queue_.wait(changes, 5))
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual(queue_.queue[0], 'primitive')
+        timer.join()
+
+    def test_wait_for_get(self):
+        """ Check a waiting thread is woken when an item is taken """
+        queue_ = PrimitiveQueue()
+        queue_.put('primitive')
+        changes = queue_.changes
+        timer = threading.Timer(0.05, queue_.get)
+        timer.start()
+        
+        self.assertTrue(queue_.wait(changes, 5))
+        self.assertTrue(queue_.empty())
+        timer.join()
+
+    def test_already_changed(self):
+        """ Check there's no wait if the queue has already changed """
+        queue_ = PrimitiveQueue()
+        changes = queue_.changes
+        queue_.put('primitive')
+        self.assertTrue(queue_.wait(changes, 5))
+        
+        queue_.interrupt()
+        self.assertTrue(queue_.wait(changes + 1))
+
+    def test_timeout(self):
+        """ Check the wait times out if nothing changes """
+        queue_ = PrimitiveQueue()
+        self.assertFalse(queue_.wait(queue_.changes, 0.01))
+
+    def test_wait_below(self):
+        """ Check a waiting thread is woken when the queue is drained """
+        queue_ = PrimitiveQueue()
+        self.assertTrue(queue_.wait_below(1))
+        
+        queue_.put('primitive')
+        self.assertFalse(queue_.wait_below(1, 0.01))
+        
+        timer = threading.Timer(0.05, queue_.get)
+        timer.start()
+        start = time.time()
+        self.assertTrue(queue_.wait_below(1, 5))
+        self.assertLess(time.time() - start, 1)
+        timer.join()
+
+
+class ShortWriteSocket(object):
+    """ A socket that only sends a few bytes at a time """
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+        self.sent = b''
+        self.calls = 0
+
+    def sendmsg(self, buffers):
+        self.calls += 1
+        data = b''.join(buffers)[:self.nbytes]
+        self.sent += data
+        return len(data)
+
+
+class TestSendBuffers(unittest.TestCase):
+    def test_gather_write(self):
+        """ Check all the buffers are sent with a single sendmsg() """
+        local, remote = socket.socketpair()
+        send_buffers(local, [b'\x04\x00', memoryview(b'\x00\x01'), b'\x02'])
+        self.assertEqual(remote.recv(10), b'\x04\x00\x00\x01\x02')
+
+        local.close()
+        remote.close()
+
+    def test_short_writes(self):
+        """ Check partial sends are completed """
+        buffers = [b'\x00' * 6, b'\x01' * 10, b'', b'\x02' * 3]
+        for nbytes in (1, 4, 6, 7, 100):
+            sock = ShortWriteSocket(nbytes)
+            send_buffers(sock, buffers)
+            self.assertEqual(sock.sent, b''.join(buffers))
+
+        self.assertEqual(sock.calls, 1)
+
+
+class TestMemoryBudget(unittest.TestCase):
+    def setUp(self):
+        self.ae = AE(scu_sop_class=[VerificationSOPClass])
+        self.dul = DULServiceProvider(local_ae=self.ae)
+
+    def tearDown(self):
+        self.dul._close_selector()
+
+    def test_charge_and_release(self):
+        """ Check P-DATA passed up are counted until released """
+        pdata = P_DATA()
+        pdata.presentation_data_value_list = [[1, b'\x03' + b'\x00' * 99]]
+
+        self.dul.charge_memory(pdata)
+        self.assertEqual(self.ae._memory_used, 105)
+        self.assertFalse(self.ae._memory_exhausted())
+
+        self.ae.memory_budget = 100
+        self.assertTrue(self.ae._memory_exhausted())
+
+        self.dul.release_memory(50)
+        self.assertEqual(self.ae._memory_used, 55)
+        self.assertFalse(self.ae._memory_exhausted())
+
+        # Once the association has ended nothing more is counted
+        self.dul.release_memory()
+        self.assertEqual(self.ae._memory_used, 0)
+        self.dul.charge_memory(pdata)
+        self.assertEqual(self.ae._memory_used, 0)
+
+    def test_reading_paused(self):
+        """ Check data transfer is paused while the budget is used up """
+        self.ae.memory_budget = 100
+        self.ae._reserve_memory(100)
+        self.assertFalse(self.dul._reading_paused())
+
+        self.dul.state_machine.current_state = 'Sta6'
+        self.assertTrue(self.dul._reading_paused())
+
+        self.ae._release_memory(1)
+        self.assertFalse(self.dul._reading_paused())
+
+    def test_wait_for_memory(self):
+        """ Check the waiters are called once memory is released """
+        called = []
+        callback = lambda: called.append(1)
+        self.assertFalse(self.ae._wait_for_memory(callback))
+        
+        self.ae.memory_budget = 100
+        self.ae._reserve_memory(150)
+        self.assertTrue(self.ae._wait_for_memory(callback))
+        self.assertTrue(self.ae._wait_for_memory(callback))
+        
+        # Still used up
+        self.ae._release_memory(50)
+        self.assertEqual(called, [])
+        
+        self.ae._release_memory(1)
+        self.assertEqual(called, [1])
+        self.ae._release_memory(1)
+        self.assertEqual(called, [1])
+
+    def test_paused_wait(self):
+        """ Check a paused DUL sleeps until memory is released """
+        self.ae.memory_budget = 100
+        self.ae._reserve_memory(100)
+        self.dul.state_machine.current_state = 'Sta6'
+        self.assertTrue(self.dul._reading_paused())
+        
+        timer = threading.Timer(0.2, self.ae._release_memory, [1])
+        timer.start()
+        start = time.time()
+        self.dul._wait_for_event()
+        self.assertTrue(time.time() - start > 0.15)
+        self.assertFalse(self.dul._reading_paused())
+        timer.join()
+
+
+if __name__ == "__main__":
+    unittest.main()
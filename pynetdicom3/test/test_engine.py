@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+
+import logging
+import socket
+import threading
+import time
+import unittest
+
+from pynetdicom3 import AE
+from pynetdicom3 import VerificationSOPClass
+from pynetdicom3.engine import AssociationEngine, BufferedSocket
+
+logger = logging.getLogger('pynetdicom')
+handler = logging.StreamHandler()
+logger.setLevel(logging.CRITICAL)
+
+
+class AEEngineVerificationSCP(threading.Thread):
+    def __init__(self, engine_loops=1):
+        self.ae = AE(port=11112, scp_sop_class=[VerificationSOPClass])
+        self.engine_loops = engine_loops
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.start()
+
+    def run(self):
+        self.ae.start(engine_loops=self.engine_loops)
+
+    def stop(self):
+        self.ae.stop()
+
+
+def stop_scp(scp):
+    """ Stop `scp` if the test hasn't already, so the port is freed """
+    try:
+        scp.stop()
+    except SystemExit:
+        pass
+
+
+class TestAssociationEngine(unittest.TestCase):
+    def test_bad_loops(self):
+        """ Engine should fail if not given at least one loop """
+        ae = AE(port=11112, scp_sop_class=[VerificationSOPClass])
+        self.assertRaises(ValueError, AssociationEngine, ae, 0)
+        self.assertRaises(ValueError, AssociationEngine, ae, 'a')
+
+    def test_echo_release(self):
+        """ Check associations served by the engine """
+        scp = AEEngineVerificationSCP(engine_loops=2)
+        self.addCleanup(stop_scp, scp)
+
+        ae = AE(scu_sop_class=[VerificationSOPClass])
+        for ii in range(3):
+            assoc = ae.associate('localhost', 11112)
+            self.assertTrue(assoc.is_established)
+            self.assertTrue(scp.ae.active_associations[0].engine in
+                                                    scp.ae._engine.loops)
+
+            status = assoc.send_c_echo()
+            self.assertEqual(status.Type, 'Success')
+
+            assoc.release()
+            self.assertTrue(assoc.is_released)
+
+            # Give the engine time to close the connection
+            time.sleep(0.5)
+            self.assertEqual(scp.ae.active_associations, [])
+
+        # No threads were started for the associations
+        loops = [tt for tt in threading.enumerate() 
+                                        if tt.name.startswith('EngineLoop')]
+        self.assertEqual(len(loops), 2)
+
+        self.assertRaises(SystemExit, scp.stop)
+
+    def test_abort(self):
+        """ Check aborted associations are cleaned up by the engine """
+        scp = AEEngineVerificationSCP()
+        self.addCleanup(stop_scp, scp)
+
+        ae = AE(scu_sop_class=[VerificationSOPClass])
+        assoc = ae.associate('localhost', 11112)
+        self.assertTrue(assoc.is_established)
+
+        assoc.abort()
+        self.assertTrue(assoc.is_aborted)
+
+        time.sleep(0.5)
+        self.assertEqual(scp.ae.active_associations, [])
+
+        self.assertRaises(SystemExit, scp.stop)
+
+
+class DummyLoop(object):
+    """ Records the associations whose selector events need updating """
+    def __init__(self):
+        self.updated = []
+
+    def _update_events(self, assoc):
+        self.updated.append(assoc)
+
+
+class TestBufferedSocket(unittest.TestCase):
+    def setUp(self):
+        self.local, self.remote = socket.socketpair()
+        self.loop = DummyLoop()
+        self.sock = BufferedSocket(self.local, self.loop)
+        self.sock.assoc = 'assoc'
+
+    def tearDown(self):
+        self.sock.close()
+        self.remote.close()
+
+    def _read_all(self, length):
+        """ Read `length` bytes from the peer, flushing the local socket """
+        data = b''
+        self.remote.settimeout(5)
+        while len(data) < length:
+            self.sock.flush()
+            data += self.remote.recv(65536)
+
+        return data
+
+    def test_send(self):
+        """ Check data is sent straight away if the connection has room """
+        self.assertEqual(self.sock.sendmsg([b'\x01\x02', b'\x03']), 3)
+        self.assertEqual(self.sock.pending, 0)
+        self.assertEqual(self.loop.updated, [])
+        self.assertEqual(self._read_all(3), b'\x01\x02\x03')
+
+    def test_full(self):
+        """ Check a full connection never blocks and keeps the rest """
+        data = bytes(range(256)) * 4096 * 8
+        start = time.time()
+        self.sock.sendall(data)
+        self.assertTrue(time.time() - start < 1)
+
+        self.assertTrue(self.sock.pending > 0)
+        self.assertEqual(self.loop.updated, ['assoc'])
+
+        # Sent after anything still waiting
+        self.sock.sendall(b'\xff')
+        self.assertEqual(self._read_all(len(data) + 1), data + b'\xff')
+        self.assertEqual(self.sock.pending, 0)
+
+    def test_closed_peer(self):
+        """ Check nothing is kept once the peer has gone """
+        self.remote.close()
+        self.sock.sendall(b'\x00' * 1024)
+        self.sock.sendall(b'\x00' * 1024)
+        self.assertEqual(self.sock.pending, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
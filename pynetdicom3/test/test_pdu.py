@@ -912,6 +912,31 @@ class TestPDU_P_DATA_TF(unittest.TestCase):
         self.assertEqual(primitive.presentation_data_value_list, [[1, p_data_tf[11:]]])
         self.assertTrue(isinstance(primitive.presentation_data_value_list, list))
         
+    def test_encode_buffers(self):
+        """ Check encoding the PDU for a gather write """
+        pdu = P_DATA_TF_PDU()
+        pdu.Decode(p_data_tf)
+        
+        buffers = pdu.encode_buffers()
+        self.assertEqual(len(buffers), 2)
+        self.assertEqual(b''.join(buffers), p_data_tf)
+        
+        # The presentation data value isn't copied
+        self.assertTrue(buffers[1] is pdu.PDVs[0].presentation_data_value)
+        
+    def test_decode_no_copy(self):
+        """ Check the decoded PDVs are views of the encoded PDU """
+        bytestream = bytearray(p_data_tf)
+        pdu = P_DATA_TF_PDU()
+        pdu.Decode(bytestream)
+        
+        pdv = pdu.PDVs[0].presentation_data_value
+        self.assertTrue(isinstance(pdv, memoryview))
+        self.assertEqual(pdv, p_data_tf[11:])
+        
+        bytestream[11] = 0x02
+        self.assertEqual(pdv[0], 0x02)
+        
     def test_from_primitive(self):
         """ Check converting PDU to primitive """
         orig_pdu = P_DATA_TF_PDU()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+import logging
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from pynetdicom3 import AE
+from pynetdicom3 import VerificationSOPClass
+from pynetdicom3.pool import AssociationPool
+
+logger = logging.getLogger('pynetdicom')
+handler = logging.StreamHandler()
+logger.setLevel(logging.CRITICAL)
+
+
+class AEVerificationSCP(threading.Thread):
+    def __init__(self):
+        self.ae = AE(port=11112, scp_sop_class=[VerificationSOPClass])
+        self.ae.maximum_associations = 10
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.start()
+
+    def run(self):
+        self.ae.start()
+
+    def stop(self):
+        self.ae.stop()
+
+
+def stop_scp(scp):
+    """ Stop `scp` if the test hasn't already, so the port is freed """
+    try:
+        scp.stop()
+    except SystemExit:
+        pass
+
+
+class TestAssociationPool(unittest.TestCase):
+    def test_reuse(self):
+        """ Check a returned association is handed out again """
+        scp = AEVerificationSCP()
+        self.addCleanup(stop_scp, scp)
+
+        ae = AE(scu_sop_class=[VerificationSOPClass])
+        pool = AssociationPool(ae)
+
+        with pool.association('localhost', 11112) as assoc:
+            self.assertTrue(assoc.is_established)
+            self.assertEqual(assoc.send_c_echo().Type, 'Success')
+
+        with pool.association('localhost', 11112) as other:
+            self.assertTrue(other is assoc)
+
+            # Checked out associations aren't shared
+            with pool.association('localhost', 11112) as third:
+                self.assertFalse(third is assoc)
+
+        # Different peer AE titles use different associations
+        with pool.association('localhost', 11112, 'OTHER') as other:
+            self.assertFalse(other is assoc)
+
+        pool.close()
+        self.assertFalse(assoc.is_established)
+
+        self.assertRaises(SystemExit, scp.stop)
+
+    def test_idle_timeout(self):
+        """ Check associations idle for too long are released """
+        scp = AEVerificationSCP()
+        self.addCleanup(stop_scp, scp)
+
+        ae = AE(scu_sop_class=[VerificationSOPClass])
+        pool = AssociationPool(ae, idle_timeout=0.1)
+
+        with pool.association('localhost', 11112) as assoc:
+            pass
+
+        time.sleep(0.2)
+        with pool.association('localhost', 11112) as other:
+            self.assertFalse(other is assoc)
+
+        pool.close()
+
+        self.assertRaises(SystemExit, scp.stop)
+
+    def test_aborted(self):
+        """ Check aborted associations are discarded """
+        scp = AEVerificationSCP()
+        self.addCleanup(stop_scp, scp)
+
+        ae = AE(scu_sop_class=[VerificationSOPClass])
+        pool = AssociationPool(ae)
+
+        with pool.association('localhost', 11112) as assoc:
+            pass
+
+        assoc.abort()
+        with pool.association('localhost', 11112) as other:
+            self.assertFalse(other is assoc)
+            self.assertTrue(other.is_established)
+
+        pool.close()
+
+        self.assertRaises(SystemExit, scp.stop)
+
+    def test_echo_health_check(self):
+        """ Check idle associations are checked with a C-ECHO """
+        scp = AEVerificationSCP()
+        self.addCleanup(stop_scp, scp)
+
+        ae = AE(scu_sop_class=[VerificationSOPClass])
+        pool = AssociationPool(ae, echo_after=0)
+
+        with pool.association('localhost', 11112) as assoc:
+            pass
+
+        with patch.object(assoc, 'send_c_echo', return_value=None) as mock:
+            with pool.association('localhost', 11112) as other:
+                self.assertFalse(other is assoc)
+
+        mock.assert_called_with()
+
+        pool.close()
+
+        self.assertRaises(SystemExit, scp.stop)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+import logging
+import unittest
+
+from pydicom.uid import UID
+
+from pynetdicom3.SOPclass import StorageServiceClass, \
+    QueryRetrieveFindServiceClass, VerificationServiceClass, CTImageStorage, \
+    PatientRootQueryRetrieveInformationModelFind, VerificationSOPClass, \
+    UID2SOPClass, class_factory, register_sop_class
+
+logger = logging.getLogger('pynetdicom')
+handler = logging.StreamHandler()
+logger.setLevel(logging.CRITICAL)
+
+
+class TestCode2Status(unittest.TestCase):
+    def test_single_codes(self):
+        """ Check statuses with a single code are found """
+        sop_class = CTImageStorage()
+        self.assertTrue(sop_class.Code2Status(0x0000) is 
+                                            StorageServiceClass.Success)
+        self.assertTrue(sop_class.Code2Status(0xB007) is 
+                    StorageServiceClass.DataSetDoesNotMatchSOPClassWarning)
+
+    def test_code_ranges(self):
+        """ Check statuses with a range of codes are found """
+        sop_class = CTImageStorage()
+        for code in [0xA700, 0xA7AB, 0xA7FF]:
+            self.assertTrue(sop_class.Code2Status(code) is 
+                                        StorageServiceClass.OutOfResources)
+        self.assertTrue(sop_class.Code2Status(0xCFFF) is 
+                                        StorageServiceClass.CannotUnderstand)
+
+    def test_unknown_codes(self):
+        """ Check unknown codes return None """
+        sop_class = CTImageStorage()
+        for code in [0x0001, 0xA800, 0xD000, 0xFFFF, None]:
+            self.assertEqual(sop_class.Code2Status(code), None)
+
+    def test_per_service_class(self):
+        """ Check each service class uses its own statuses """
+        sop_class = PatientRootQueryRetrieveInformationModelFind()
+        self.assertTrue(sop_class.Code2Status(0xFF01) is 
+                            QueryRetrieveFindServiceClass.PendingWarning)
+        self.assertEqual(CTImageStorage().Code2Status(0xFF01), None)
+
+
+class TestUID2SOPClass(unittest.TestCase):
+    def test_known_uids(self):
+        """ Check the generated SOP classes are found by UID """
+        self.assertTrue(UID2SOPClass('1.2.840.10008.1.1') is 
+                                                        VerificationSOPClass)
+        self.assertTrue(UID2SOPClass('1.2.840.10008.5.1.4.1.1.2') is 
+                                                        CTImageStorage)
+
+    def test_unknown_uid(self):
+        """ Check unknown UIDs return None """
+        self.assertEqual(UID2SOPClass('1.2.3.4'), None)
+
+    def test_register_sop_class(self):
+        """ Check private SOP classes can be registered """
+        sop_class = class_factory('PrivateStorage', '1.2.826.0.1.3680043.9.1', 
+                                  StorageServiceClass)
+        register_sop_class(sop_class)
+        self.assertTrue(UID2SOPClass('1.2.826.0.1.3680043.9.1') is sop_class)
+
+    def test_register_pydicom_uid(self):
+        """ Check SOP classes with a named pydicom UID are found by value """
+        sop_class = class_factory('OtherVerification', 
+                                  UID('1.2.840.10008.1.1'), 
+                                  VerificationServiceClass)
+        register_sop_class(sop_class)
+        try:
+            self.assertTrue(UID2SOPClass('1.2.840.10008.1.1') is sop_class)
+            self.assertTrue(UID2SOPClass(UID('1.2.840.10008.1.1')) is 
+                                                                sop_class)
+        finally:
+            register_sop_class(VerificationSOPClass)
+        
+        self.assertTrue(UID2SOPClass('1.2.840.10008.1.1') is 
+                                                        VerificationSOPClass)
+
+
+if __name__ == "__main__":
+    unittest.main()
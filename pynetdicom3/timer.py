@@ -59,6 +59,22 @@ class Timer:
 
         return False
 
+    @property
+    def remaining(self):
+        """ Return the number of seconds until the timer expires
+
+        Returns
+        -------
+        float or None
+            The number of seconds remaining (0 if already expired), or None if
+            the timer isn't running or has no timeout
+        """
+        if self._start_time is None or self._max_number_seconds is None:
+            return None
+
+        elapsed = time.time() - self._start_time
+        return max(self._max_number_seconds - elapsed, 0)
+
     def set_timeout(self, timeout_seconds):
         """ Set the number of seconds before the timer expires
         
@@ -1,6 +1,8 @@
 
 from io import BytesIO
 import logging
+import selectors
+import socket
 import unicodedata
 
 from pydicom.uid import UID
@@ -9,27 +11,83 @@ logger = logging.getLogger('pynetdicom.utils')
 
 def fragment(max_pdu, str):
     """
-    Convert the given str into fragments, each of maximum size `max_pdu`
+    Convert the given str into fragments, each of maximum size `max_pdu`. The
+    fragments are memoryview slices of `str`, so the data isn't copied
     
-    Returns
-    -------
-    fragments : list of str
-        The fragmented string
+    If `str` is a BytesIO then its buffer is exported until the generator is
+    exhausted or closed and all the fragments it yielded have been released,
+    during which time writing to or resizing the BytesIO raises BufferError
+    
+    Yields
+    ------
+    fragment : memoryview
+        The next fragment of the string
     """
     if isinstance(str, BytesIO):
-        str = str.getvalue()
-    s = str
-    fragments = []
+        str = str.getbuffer()
+    s = memoryview(str)
+    maxsize = max_pdu - 6
+    
+    try:
+        # An empty str is a single empty fragment
+        yield s[:maxsize]
+        
+        for offset in range(maxsize, len(s), maxsize):
+            yield s[offset:offset + maxsize]
+    finally:
+        # The fragments keep the buffer exported for as long as they're used
+        s.release()
+        if isinstance(str, memoryview):
+            str.release()
+
+def fragment_file(max_pdu, fp):
+    """
+    Read the binary file object `fp` from its current position as fragments,
+    each of maximum size `max_pdu`. Unlike fragment() only one fragment is
+    held in memory at a time
+    
+    Yields
+    ------
+    fragment : bytes
+        The next fragment read from `fp`
+    """
     maxsize = max_pdu - 6
     
     while 1:
-        fragments.append(s[:maxsize])
-        s = s[maxsize:]
-        if len(s) <= maxsize:
-            if len(s) > 0:
-                fragments.append(s)
-                
-            return fragments
+        s = fp.read(maxsize)
+        if not s:
+            return
+        
+        yield s
+
+def uid_value(uid):
+    """
+    Return the dotted value of `uid` as a plain str, suitable for use as a 
+    dict key. str() can't be used as for a pydicom UID with a dictionary name
+    it returns the name rather than the value
+    
+    Parameters
+    ----------
+    uid - str or pydicom.uid.UID
+        The UID, anything else is returned unchanged
+    """
+    if isinstance(uid, str):
+        return str.__str__(uid)
+    
+    return uid
+
+def pdata_length(pdata):
+    """
+    Return the total length of the PDV items of the P-DATA primitive `pdata`,
+    each of which has a 4 byte length and 1 byte context ID as well as its
+    data
+
+    Returns
+    -------
+    length : int
+        The length of the PDV items in bytes
+    """
+    return sum([len(pdv[1]) + 5 for pdv in pdata.presentation_data_value_list])
 
 def correct_ambiguous_vr(dataset, transfer_syntax):
     
@@ -174,6 +232,50 @@ def wrap_list(lst, prefix='  ', delimiter='  ', items_per_line=16, max_size=512)
     return lines
 
 
+class SelectorWakeup(object):
+    """
+    A socket pair registered with a selector so that other threads can 
+    interrupt a wait on it
+    
+    Parameters
+    ----------
+    selector - selectors.BaseSelector
+        The selector, the receiving socket is registered with it for 
+        EVENT_READ
+    """
+    def __init__(self, selector):
+        self._recv, self._send = socket.socketpair()
+        self._recv.setblocking(False)
+        self._send.setblocking(False)
+        selector.register(self._recv, selectors.EVENT_READ, self)
+
+    def is_wakeup(self, key):
+        """ Return True if the selector key `key` is for the wakeup socket """
+        return key.fileobj is self._recv
+
+    def wakeup(self):
+        """ Interrupt the wait on the selector """
+        try:
+            self._send.send(b'\x00')
+        except OSError:
+            # Either the socket buffer is full and a wakeup is already pending
+            #   or the socket pair has been closed
+            pass
+
+    def clear(self):
+        """ Discard any pending wakeup bytes """
+        try:
+            while self._recv.recv(4096):
+                pass
+        except OSError:
+            pass
+
+    def close(self):
+        """ Close the socket pair """
+        self._recv.close()
+        self._send.close()
+
+
 class PresentationContext(object):
     """
     Provides a nice interface for the A-ASSOCIATE Presentation Context item.